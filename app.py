@@ -2,12 +2,14 @@
 import os
 import io
 import logging
-import qrcode
-import csv
-import zipfile
-import textwrap
 import tempfile
-from io import BytesIO, StringIO
+import json
+import base64
+import time
+import uuid
+import atexit
+import hmac
+from io import BytesIO
 from datetime import datetime
 from functools import wraps
 from urllib.parse import quote as url_encode
@@ -16,21 +18,36 @@ from whatsapp import send_guest_card
 
 from flask import (
     Flask, render_template, request, redirect, url_for, flash,
-    session, jsonify, send_file, make_response, current_app
+    session, jsonify, send_file, make_response, current_app, Response
 )
 from werkzeug.utils import secure_filename
 from dotenv import dotenv_values, load_dotenv
-from PIL import Image, ImageDraw, ImageFont
-from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill
-from openpyxl.formatting.rule import CellIsRule
+from sqlalchemy import select, update, or_, and_, bindparam
 from sqlalchemy.sql import func
 from sqlalchemy.exc import IntegrityError
 
-# Supabase client
-from supabase import create_client, Client
-
-from models import Guest, init_db, get_db_session
+from models import Guest, CheckinEvent, CardRender, SendOutbox, MessageStatus, Job, init_db, get_db_session
+from checkin import checkin_index, record_checkin, apply_scan_batch
+from attendance import AttendanceFeed
+from stats import guest_stats
+from search import find_guests, ensure_search_index, search_cache, SEARCH_LIMIT, SEARCH_LIMIT_MAX, CACHE_TTL
+from importer import parse_guest_csv, import_guests
+from jobs import job_queue
+from qr import qr_png, qr_png_batch
+from storage import create_storage, LocalStorage
+from zipstream import stream_zip
+from sender import SendEngine, is_retryable
+from outbox import outbox, ClaimLost
+from media_cache import media_cache
+from exports import (
+    guest_report_xlsx, export_query, stream_csv, stream_parquet, parquet_available,
+    XLSX_MIMETYPE, EXPORT_MIMETYPES,
+)
+from webhooks import status_buffer, parse_statuses, verify_signature, delivery_counts
+from cards import (
+    CardRenderPool, get_card_renderer, assets_fingerprint, card_fingerprint,
+    stored_fingerprints, save_fingerprints, variant_path, CARD_VARIANTS, TEMPLATE_PATH, FONT_PATH,
+)
 
 # ---------------------------------------------------------------------------
 # Environment Loading
@@ -38,6 +55,9 @@ from models import Guest, init_db, get_db_session
 flask_env = os.getenv('FLASK_ENV', 'production')
 WHATSAPP_PHONE_NUMBER_ID = os.getenv("WHATSAPP_PHONE_NUMBER_ID")
 WHATSAPP_ACCESS_TOKEN = os.getenv("WHATSAPP_ACCESS_TOKEN")
+WHATSAPP_APP_SECRET = os.getenv("WHATSAPP_APP_SECRET")          # signs status callbacks
+WHATSAPP_VERIFY_TOKEN = os.getenv("WHATSAPP_VERIFY_TOKEN")      # answers Meta's subscription handshake
+WHATSAPP_WEBHOOK_RECORD = os.getenv("WHATSAPP_WEBHOOK_RECORD")  # optional JSONL file of raw callbacks, for webhook_replay.py
 
 if flask_env == 'development':
     current_env_file = '.env.development'
@@ -74,10 +94,11 @@ SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_KEY")  # service_role key (not anon k
 QR_BUCKET = os.getenv("SUPABASE_QR_BUCKET", "qr-codes")
 CARDS_BUCKET = os.getenv("SUPABASE_CARDS_BUCKET", "guest-cards")
 
-supabase: Client = None
-if SUPABASE_URL and SUPABASE_KEY:
-    supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
-    logging.info("Supabase client initialized.")
+LOCAL_STORAGE_DIR = os.getenv("LOCAL_STORAGE_DIR")  # stand-in bucket folders when Supabase isn't configured
+
+storage = create_storage(SUPABASE_URL, SUPABASE_KEY, LOCAL_STORAGE_DIR)
+if storage:
+    logging.info(f"Object storage initialized ({type(storage).__name__}).")
 else:
     logging.warning("SUPABASE_URL or SUPABASE_SERVICE_KEY not set — storage features disabled.")
 
@@ -102,9 +123,13 @@ logging.info(f"Using database: {DATABASE_URL}")
 
 ADMIN_USERNAME = os.environ.get("ADMIN_USERNAME", "admin")
 ADMIN_PASSWORD = os.environ.get("ADMIN_PASSWORD", "WedSy#01")
+EXPORT_API_TOKEN = os.environ.get("EXPORT_API_TOKEN")   # lets scripts call /export/guests.* with a Bearer header
 
 with app.app_context():
     init_db(app)
+    with get_db_session() as db:
+        ensure_search_index(db)
+        checkin_index.load(db)
 
 # ---------------------------------------------------------------------------
 # Supabase Storage Helpers
@@ -116,33 +141,18 @@ def upload_to_supabase(bucket: str, filename: str, data: bytes, content_type: st
     Returns the public URL of the uploaded file.
     Overwrites if file already exists (upsert=True).
     """
-    if not supabase:
-        raise RuntimeError("Supabase client not initialized. Check SUPABASE_URL and SUPABASE_SERVICE_KEY.")
-
-    supabase.storage.from_(bucket).upload(
-        path=filename,
-        file=data,
-        file_options={"content-type": content_type, "upsert": "true"},
-    )
-    public_url = supabase.storage.from_(bucket).get_public_url(filename)
-    return public_url
-
-
-def delete_from_supabase(bucket: str, filename: str):
-    """Delete a file from a Supabase Storage bucket. Silently ignores missing files."""
-    if not supabase:
-        return
-    try:
-        supabase.storage.from_(bucket).remove([filename])
-    except Exception as e:
-        logging.warning(f"Could not delete {filename} from {bucket}: {e}")
+    return _require_storage().upload(bucket, filename, data, content_type)
 
 
 def download_from_supabase(bucket: str, filename: str) -> bytes:
     """Download a file from Supabase Storage and return its bytes."""
-    if not supabase:
-        raise RuntimeError("Supabase client not initialized.")
-    return supabase.storage.from_(bucket).download(filename)
+    return _require_storage().download(bucket, filename)
+
+
+def _require_storage():
+    if not storage:
+        raise RuntimeError("Supabase client not initialized. Check SUPABASE_URL and SUPABASE_SERVICE_KEY.")
+    return storage
 
 
 def qr_filename_from_guest(guest) -> str:
@@ -155,24 +165,20 @@ def card_filename_from_guest(guest) -> str:
     return f"GUEST-{guest.visual_id:04d}-{sanitized}.png"
 
 
+def card_paths_from_guest(guest) -> list:
+    """Storage keys of every stored rendition of the guest's card (print master first); none without a number."""
+    if guest.visual_id is None:
+        return []
+    return [variant_path(card_filename_from_guest(guest), variant) for variant in CARD_VARIANTS]
+
+
 # ---------------------------------------------------------------------------
 # QR Code Generation
 # ---------------------------------------------------------------------------
 
 def generate_qr_bytes(data: str) -> bytes:
     """Generate a QR code and return it as PNG bytes (no disk write)."""
-    qr = qrcode.QRCode(
-        version=1,
-        error_correction=qrcode.constants.ERROR_CORRECT_H,
-        box_size=10,
-        border=4,
-    )
-    qr.add_data(data)
-    qr.make(fit=True)
-    img = qr.make_image(fill_color="black", back_color="white")
-    buf = BytesIO()
-    img.save(buf, format="PNG")
-    return buf.getvalue()
+    return qr_png(data)
 
 
 # ---------------------------------------------------------------------------
@@ -239,6 +245,52 @@ def get_next_visual_id(db_session):
     return 1 if max_id is None else int(max_id) + 1
 
 
+def backfill_visual_ids(db_session) -> int:
+    """Number every guest missing a visual_id after the current max, in one UPDATE."""
+    base = select(func.coalesce(func.max(Guest.visual_id), 0)).scalar_subquery()
+    ranked = (
+        select(Guest.id.label("id"),
+               (func.row_number().over(order_by=Guest.id) + base).label("new_visual_id"))
+        .where(Guest.visual_id.is_(None))
+        .subquery()
+    )
+    result = db_session.execute(
+        update(Guest)
+        .where(Guest.id == ranked.c.id)
+        .values(visual_id=ranked.c.new_visual_id)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount:
+        db_session.commit()
+    return result.rowcount
+
+
+def guest_to_dict(g) -> dict:
+    return {
+        "id": g.id, "visual_id": g.visual_id, "name": g.name, "phone": g.phone,
+        "qr_code_url": g.qr_code_url, "has_entered": g.has_entered,
+        "entry_time": g.entry_time.strftime('%Y-%m-%d %H:%M:%S') if g.entry_time else 'N/A',
+        "card_type": g.card_type, "group_size": g.group_size,
+        "checked_in_count": g.checked_in_count or 0,
+    }
+
+
+def encode_cursor(values) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """[last sort value, last visual_id] from encode_cursor; None if the cursor is not one."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        return None
+    if not (isinstance(values, list) and len(values) == 2
+            and all(v is None or isinstance(v, (str, int, float)) for v in values)):
+        return None
+    return values
+
+
 # ---------------------------------------------------------------------------
 # Auth
 # ---------------------------------------------------------------------------
@@ -260,15 +312,73 @@ def login_required(f):
 @app.route('/')
 @login_required
 def view_all():
+    # Rows are fetched page by page from /guests_page as the table scrolls.
     with get_db_session() as db:
-        guests = db.query(Guest).order_by(Guest.visual_id).all()
-        missing = [g for g in guests if g.visual_id is None]
-        for g in missing:
-            g.visual_id = get_next_visual_id(db)
-            db.add(g)
-        if missing:
-            db.commit()
-        return render_template('guests.html', guests=guests, current_environment=flask_env)
+        backfill_visual_ids(db)
+    return render_template('guests.html', current_environment=flask_env)
+
+
+GUEST_SORTS = {"visual_id": Guest.visual_id, "name": Guest.name}
+GUEST_PAGE_SIZE = 50
+GUEST_PAGE_MAX = 200
+
+
+@app.route('/guests_page')
+@login_required
+def guests_page():
+    """
+    One page of the guest list, keyset-paginated on (sort column, visual_id).
+    Query args: cursor, limit, sort (visual_id|name), order (asc|desc),
+    q, card_type, entered (yes|no).
+    """
+    sort = request.args.get('sort', 'visual_id')
+    if sort not in GUEST_SORTS:
+        sort = 'visual_id'
+    descending = request.args.get('order', 'asc') == 'desc'
+    limit = min(max(request.args.get('limit', GUEST_PAGE_SIZE, type=int), 1), GUEST_PAGE_MAX)
+    cursor = request.args.get('cursor', '')
+    if cursor:
+        cursor = decode_cursor(cursor)
+        if cursor is None:
+            return jsonify(success=False, message="Invalid cursor."), 400
+    query = request.args.get('q', '').strip()
+    card_type = request.args.get('card_type', '').strip().lower()
+    entered = request.args.get('entered', '').strip().lower()
+
+    col = GUEST_SORTS[sort]
+    after = (lambda a, b: a < b) if descending else (lambda a, b: a > b)
+
+    with get_db_session() as db:
+        q = db.query(Guest)
+        if query:
+            q = q.filter(Guest.name.ilike(f'%{query}%') | Guest.phone.ilike(f'%{query}%'))
+        if card_type:
+            q = q.filter(Guest.card_type == card_type)
+        if entered == 'yes':
+            q = q.filter(Guest.has_entered.is_(True))
+        elif entered == 'no':
+            q = q.filter(~Guest.has_entered.is_(True))
+
+        if cursor:
+            last_value, last_visual_id = cursor
+            if sort == 'visual_id':
+                q = q.filter(after(Guest.visual_id, last_visual_id))
+            else:
+                q = q.filter(or_(after(col, last_value),
+                                 and_(col == last_value, after(Guest.visual_id, last_visual_id))))
+
+        order = [col.desc(), Guest.visual_id.desc()] if descending else [col.asc(), Guest.visual_id.asc()]
+        if sort == 'visual_id':
+            order = order[:1]
+        guests = q.order_by(*order).limit(limit + 1).all()
+
+        next_cursor = None
+        if len(guests) > limit:
+            guests = guests[:limit]
+            last = guests[-1]
+            next_cursor = encode_cursor([getattr(last, sort), last.visual_id])
+
+        return jsonify(guests=[guest_to_dict(g) for g in guests], next_cursor=next_cursor)
 
 
 @app.route('/login', methods=['GET', 'POST'])
@@ -327,6 +437,7 @@ def add_guest():
             )
             db.add(guest)
             db.commit()
+            checkin_index.put(guest)
             flash(f"Guest '{name or phone}' added. Card: {card_type.title()}, entries: {group_size}.", "success")
             return redirect(url_for('view_all'))
 
@@ -343,70 +454,19 @@ def upload_csv():
             flash("No file selected.", "danger")
             return redirect(request.url)
 
-        stream = StringIO(file.stream.read().decode("utf-8"))
-        reader = csv.DictReader(stream)
-        added = skipped = 0
-
-        def get_row(row, *keys):
-            for k in keys:
-                v = row.get(k) or row.get(k.lower()) or row.get(k.capitalize())
-                if v:
-                    return v.strip()
-            return ""
-
-        def normalize(raw):
-            raw = (raw or "").strip().lower()
-            if raw in ["s", "single"]: return "single"
-            if raw in ["d", "double"]: return "double"
-            if raw in ["f", "family", "group"]: return "family"
-            return "single"
+        rows, skipped = parse_guest_csv(file.stream.read().decode("utf-8"))
 
         with get_db_session() as db:
-            for row in reader:
-                name = get_row(row, "name", "Name")
-                phone = get_row(row, "phone", "Phone")
-                if not phone:
-                    skipped += 1
-                    continue
-
-                card_type = normalize(get_row(row, "Card Type", "card_type", "type"))
-
-                if card_type == "single":
-                    group_size = 1
-                elif card_type == "double":
-                    group_size = 2
-                else:
-                    try:
-                        group_size = max(1, int(get_row(row, "Allowed", "allowed", "Size", "size", "Group Size", "group_size")))
-                    except:
-                        group_size = 1
+            inserted, skipped_existing = import_guests(db, rows)
+            if inserted:
+                checkin_index.load(db)
+        added, skipped = len(inserted), skipped + skipped_existing
 
-                if db.query(Guest).filter_by(phone=phone).first():
-                    skipped += 1
-                    continue
+        if inserted:
+            job_queue.enqueue("publish_qr", qr_code_ids=[row["qr_code_id"] for row in inserted])
 
-                visual_id = get_next_visual_id(db)
-                qr_id = f"GUEST-{visual_id:04d}"
-                qr_fname = f"{qr_id}-{get_safe_filename_name_part(name or 'GUEST')}.png"
-
-                try:
-                    qr_bytes = generate_qr_bytes(qr_id)
-                    qr_url = upload_to_supabase(QR_BUCKET, qr_fname, qr_bytes)
-                except Exception as e:
-                    current_app.logger.warning(f"QR upload failed for {name}: {e}")
-                    qr_url = ""
-
-                db.add(Guest(
-                    name=name, phone=phone, qr_code_id=qr_id,
-                    qr_code_url=qr_url, visual_id=visual_id,
-                    card_type=card_type, group_size=group_size, checked_in_count=0
-                ))
-                db.flush()
-                added += 1
-
-            db.commit()
-
-        flash(f"CSV processed — Added: {added}, Skipped: {skipped}", "success")
+        flash(f"CSV processed — Added: {added}, Skipped: {skipped}. "
+              f"QR codes are being generated in the background — progress is shown below.", "success")
         return redirect(url_for('view_all'))
 
     return render_template('upload_csv.html')
@@ -423,30 +483,38 @@ def update_status():
 
     with get_db_session() as db:
         try:
-            guest = db.query(Guest).filter_by(qr_code_id=qr_code_id).first()
-            if not guest:
+            # Served from the warm index; only a cache miss goes to the database.
+            entry = checkin_index.lookup(db, qr_code_id)
+            if not entry:
                 return jsonify(success=False, message="Guest not found.")
 
-            remaining = guest.group_size - guest.checked_in_count
-            if remaining <= 0:
+            if entry["checked_in_count"] >= entry["group_size"]:
+                # Another worker or an admin edit may have changed the card since it was cached.
+                entry = checkin_index.refresh(db, qr_code_id)
+                if not entry:
+                    return jsonify(success=False, message="Guest not found.")
+
+            result = None
+            if entry["checked_in_count"] < entry["group_size"]:
+                result = record_checkin(db, qr_code_id)
+            if result is None:
+                checkin_index.refresh(db, qr_code_id)
                 return jsonify(
                     success=False, already_entered=True,
                     message="All allowed entries have already checked in.",
-                    guest={"visual_id": guest.visual_id, "name": guest.name,
-                           "card_type": (guest.card_type or "").title(), "remaining_entries": 0}
+                    guest={"visual_id": entry["visual_id"], "name": entry["name"],
+                           "card_type": (entry["card_type"] or "").title(), "remaining_entries": 0}
                 )
 
-            guest.checked_in_count = (guest.checked_in_count or 0) + 1
-            if guest.checked_in_count >= guest.group_size:
-                guest.has_entered = True
-                guest.entry_time = datetime.now()
-
-            db.commit()
+            checked_in_count, group_size = result
+            checkin_index.set_count(qr_code_id, checked_in_count)
+            if checked_in_count >= group_size:
+                attendance_feed.publish({"entered_guests": 1, "not_entered_guests": -1})
             return jsonify(
                 success=True, message="Check-in successful.",
-                guest={"visual_id": guest.visual_id, "name": guest.name,
-                       "card_type": (guest.card_type or "").title(),
-                       "remaining_entries": guest.group_size - guest.checked_in_count}
+                guest={"visual_id": entry["visual_id"], "name": entry["name"],
+                       "card_type": (entry["card_type"] or "").title(),
+                       "remaining_entries": group_size - checked_in_count}
             )
         except Exception as e:
             db.rollback()
@@ -454,116 +522,132 @@ def update_status():
             return jsonify(success=False, message=f"An error occurred: {e}")
 
 
+# -------------------- offline scanner sync --------------------
+@app.route('/checkin_manifest')
+@login_required
+def checkin_manifest():
+    """Compact guest list the scanner page caches so it can validate scans offline."""
+    with get_db_session() as db:
+        # Scanners poll this every MANIFEST_REFRESH_MS; pick up other workers' check-ins.
+        checkin_index.load(db)
+    return jsonify(generated_at=datetime.now().isoformat(timespec='seconds'),
+                   guests=checkin_index.manifest())
+
+
+@app.route('/sync_checkins', methods=['POST'])
+@login_required
+def sync_checkins():
+    """Apply a device's queued offline scans in one transaction; safe to resend."""
+    data = request.get_json() or {}
+    scans = data.get("scans") or []
+    device_id = str(data.get("device_id") or "")[:64]
+    if not isinstance(scans, list):
+        return jsonify(success=False, message="scans must be a list."), 400
+
+    for _ in range(2):
+        with get_db_session() as db:
+            try:
+                results = apply_scan_batch(db, device_id, scans)
+                newly_entered = sum(1 for r in results if r["status"] == "admitted"
+                                    and not r["duplicate"] and r["remaining_entries"] == 0)
+                attendance_feed.publish({"entered_guests": newly_entered,
+                                         "not_entered_guests": -newly_entered})
+                # Current totals, other gates' admissions included, for the device's cached manifest.
+                counts = db.execute(select(Guest.qr_code_id, Guest.checked_in_count)
+                                    .where(Guest.qr_code_id.in_({r["qr_code_id"] for r in results}))).all()
+                return jsonify(
+                    success=True, results=results,
+                    admitted=sum(1 for r in results if r["status"] == "admitted" and not r["duplicate"]),
+                    counts={qr: count or 0 for qr, count in counts},
+                )
+            except IntegrityError:
+                # Another sync of the same queue won the race; retrying reports those scans as duplicates.
+                db.rollback()
+            except Exception as e:
+                db.rollback()
+                current_app.logger.exception(f"Error syncing check-ins from device {device_id}: {e}")
+                return jsonify(success=False, message=f"An error occurred: {e}")
+
+    return jsonify(success=False, message="Could not apply scans, please retry.")
+
+
 @app.route('/search_guests')
 @login_required
 def search_guests():
+    """Ranked, capped search for the dashboard search box (cached briefly per query)."""
     query = request.args.get('q', '').strip()
+    limit = min(max(request.args.get('limit', SEARCH_LIMIT, type=int), 1), SEARCH_LIMIT_MAX)
     with get_db_session() as db:
-        if query:
-            guests = db.query(Guest).filter(
-                (Guest.name.ilike(f'%{query}%')) | (Guest.phone.ilike(f'%{query}%'))
-            ).order_by(Guest.visual_id).all()
-        else:
-            guests = db.query(Guest).order_by(Guest.visual_id).all()
+        engine = db.get_bind()
+        key = (query.lower(), limit)
+        results = search_cache.get(engine, key)
+        if results is None:
+            results = [guest_to_dict(g) for g in find_guests(db, query, limit)]
+            search_cache.put(engine, key, results)
 
-        return jsonify([{
-            "visual_id": g.visual_id, "name": g.name, "phone": g.phone,
-            "qr_code_url": g.qr_code_url, "has_entered": g.has_entered,
-            "entry_time": g.entry_time.strftime('%Y-%m-%d %H:%M:%S') if g.entry_time else 'N/A',
-            "card_type": g.card_type
-        } for g in guests])
+    response = jsonify(results)
+    response.headers['Cache-Control'] = f'private, max-age={CACHE_TTL}'
+    return response
 
 
 # -------------------- download_excel --------------------
 @app.route('/download_excel')
 @login_required
 def download_excel():
-    with get_db_session() as db:
-        guests = db.query(Guest).all()
+    """The guest report as .xlsx, streamed while it is written (see exports.guest_report_xlsx)."""
+    return Response(guest_report_xlsx(), mimetype=XLSX_MIMETYPE,
+                    headers={"Content-Disposition": "attachment; filename=guest_report.xlsx"})
+
+
+# -------------------- export_guests --------------------
+def _export_token_ok() -> bool:
+    supplied = request.headers.get('Authorization', '')
+    return bool(EXPORT_API_TOKEN) and hmac.compare_digest(supplied, f"Bearer {EXPORT_API_TOKEN}")
+
+
+@app.route('/export/guests.<fmt>')
+def export_guests(fmt):
+    """
+    Guest rows as CSV or Parquet, streamed from the database cursor.
+    Query args: columns (comma-separated), entered (yes|no), card_type,
+    whatsapp (sent|failed|pending), q. Open to a logged-in admin, or to
+    scripts sending "Authorization: Bearer $EXPORT_API_TOKEN".
+    """
+    if not (session.get('logged_in') or _export_token_ok()):
+        if request.headers.get('Authorization'):
+            return "Invalid export token.", 401
+        flash('Please log in first.', 'warning')
+        return redirect(url_for('login'))
+    if fmt not in EXPORT_MIMETYPES:
+        return f"Unknown format {fmt!r}; use csv or parquet.", 404
+    if fmt == "parquet" and not parquet_available():
+        return "Parquet export needs pyarrow installed on the server.", 501
+
+    columns = [c.strip() for c in request.args.get('columns', '').split(',') if c.strip()]
+    try:
+        columns, stmt = export_query(
+            columns or None, entered=request.args.get('entered', ''), card_type=request.args.get('card_type', ''),
+            whatsapp=request.args.get('whatsapp', ''), q=request.args.get('q', ''),
+        )
+    except ValueError as e:
+        return str(e), 400
 
-        def ct(g): return (g.card_type or "").strip().lower()
-
-        total_guests = len(guests)
-        single_cards = sum(1 for g in guests if ct(g) == "single")
-        double_cards = sum(1 for g in guests if ct(g) == "double")
-        family_cards = sum(1 for g in guests if ct(g) == "family")
-        total_family_allowed = sum(g.group_size for g in guests if ct(g) == "family")
-        entered_guests = sum(1 for g in guests if bool(g.has_entered))
-
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Guest Report"
-        ws["A1"] = "Guest Summary Report"
-        ws["A1"].font = Font(size=14, bold=True)
-
-        summary_data = [
-            ("Total Guests", total_guests), ("Single Cards", single_cards),
-            ("Double Cards", double_cards), ("Family Cards", family_cards),
-            ("Total Allowed by Family Cards", total_family_allowed),
-            ("Guests Entered", entered_guests), ("Guests Not Entered", total_guests - entered_guests),
-        ]
-
-        row = 3
-        for label, value in summary_data:
-            ws[f"A{row}"] = label
-            ws[f"B{row}"] = value
-            ws[f"A{row}"].font = Font(bold=True)
-            row += 1
-
-        table_start = row + 1
-        headers = ["ID", "Name", "Phone", "QR Code ID", "Has Entered", "Entry Time", "Visual ID", "Card Type", "Group Size"]
-        for col, header in enumerate(headers, start=1):
-            ws.cell(row=table_start, column=col, value=header).font = Font(bold=True)
-
-        for i, g in enumerate(guests, start=table_start + 1):
-            ws.cell(i, 1, g.id); ws.cell(i, 2, g.name); ws.cell(i, 3, g.phone)
-            ws.cell(i, 4, g.qr_code_id)
-            ws.cell(i, 5, "Entered" if g.has_entered else "Not Entered")
-            ws.cell(i, 6, g.entry_time.strftime('%Y-%m-%d %H:%M:%S') if g.entry_time else "")
-            ws.cell(i, 7, g.visual_id); ws.cell(i, 8, g.card_type); ws.cell(i, 9, g.group_size)
-
-        first_data_row = table_start + 1
-        last_data_row = table_start + len(guests)
-        if last_data_row >= first_data_row:
-            rng = f"E{first_data_row}:E{last_data_row}"
-            ws.conditional_formatting.add(rng, CellIsRule(operator="equal", formula=['"Entered"'],
-                fill=PatternFill(start_color="C6EFCE", end_color="C6EFCE", fill_type="solid")))
-            ws.conditional_formatting.add(rng, CellIsRule(operator="equal", formula=['"Not Entered"'],
-                fill=PatternFill(start_color="FFC7CE", end_color="FFC7CE", fill_type="solid")))
-
-        for column in ws.columns:
-            max_length = max((len(str(cell.value)) for cell in column if cell.value), default=0)
-            ws.column_dimensions[column[0].column_letter].width = max_length + 2
-
-        output = BytesIO()
-        wb.save(output)
-        output.seek(0)
-        return send_file(output, as_attachment=True, download_name="guest_report.xlsx",
-                         mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+    body = stream_csv(columns, stmt) if fmt == "csv" else stream_parquet(columns, stmt)
+    return Response(body, mimetype=EXPORT_MIMETYPES[fmt],
+                    headers={"Content-Disposition": f"attachment; filename=guests.{fmt}"})
 
 
 # -------------------- zip_qr_codes_web --------------------
 @app.route('/zip_qr_codes_web')
 @login_required
 def zip_qr_codes_web():
-    """Download all QR codes as a zip by streaming them from Supabase."""
     with get_db_session() as db:
-        guests = db.query(Guest).all()
-
-    memory_file = BytesIO()
-    with zipfile.ZipFile(memory_file, 'w') as zf:
-        for guest in guests:
-            if not guest.qr_code_url:
-                continue
-            try:
-                fname = qr_filename_from_guest(guest)
-                data = download_from_supabase(QR_BUCKET, fname)
-                zf.writestr(fname, data)
-            except Exception as e:
-                current_app.logger.warning(f"Could not fetch QR for {guest.name}: {e}")
-
-    memory_file.seek(0)
-    return send_file(memory_file, download_name='qr_codes.zip', as_attachment=True, mimetype='application/zip')
+        guests = db.query(Guest).filter(Guest.qr_code_url != None, Guest.qr_code_url != "").all()
+        paths = [qr_filename_from_guest(g) for g in guests]
+    if not paths:
+        flash("No QR codes found. Please generate them first.", "warning")
+        return redirect(url_for('view_all'))
+    return _zip_response(QR_BUCKET, paths, "qr_codes.zip")
 
 
 # -------------------- edit_guest --------------------
@@ -612,6 +696,7 @@ def edit_guest(guest_id):
                 guest.card_type = new_card_type
                 guest.group_size = new_group_size
                 db.commit()
+                checkin_index.put(guest)
                 flash('Guest updated successfully.', 'success')
                 return redirect(url_for('view_all'))
 
@@ -640,14 +725,15 @@ def delete_guest(guest_id):
                 flash("Guest not found.", "danger")
                 return redirect(url_for('view_all'))
 
-            # Delete QR from Supabase
-            delete_from_supabase(QR_BUCKET, qr_filename_from_guest(guest))
-            # Delete card from Supabase
-            delete_from_supabase(CARDS_BUCKET, card_filename_from_guest(guest))
-
+            qr_code_id = guest.qr_code_id
+            files = {QR_BUCKET: [qr_filename_from_guest(guest)], CARDS_BUCKET: card_paths_from_guest(guest)}
+            db.query(CardRender).filter(CardRender.guest_id == guest.id).delete()
+            db.query(SendOutbox).filter(SendOutbox.guest_id == guest.id).delete()
             db.delete(guest)
             db.commit()
-            flash('Guest and associated files deleted.', 'success')
+            checkin_index.discard(qr_code_id)
+            _purge_files(files)
+            flash('Guest deleted; their QR code and card are being removed from storage.', 'success')
         except Exception as e:
             db.rollback()
             flash(f'Error deleting guest: {e}', 'danger')
@@ -660,109 +746,155 @@ def delete_guest(guest_id):
 @app.route('/regenerate_qr_codes')
 @login_required
 def regenerate_qr_codes():
+    job_queue.enqueue("regenerate_qr")
+    flash("Regenerating QR codes in the background — progress is shown below.", "info")
+    return redirect(url_for('view_all'))
+
+
+@job_queue.handler("publish_qr")
+def publish_qr_job(ctx):
+    """
+    Render and upload QR codes for freshly imported guests, then store their
+    URLs in one batch. Guests that already have a URL are left alone, so a
+    requeued run only does what is still missing.
+    """
+    with get_db_session() as db:
+        guests = db.execute(select(Guest.qr_code_id, Guest.name)
+                            .where(Guest.qr_code_id.in_(ctx.params["qr_code_ids"]),
+                                   or_(Guest.qr_code_url == None, Guest.qr_code_url == ""))).all()
+    names = {f"{qr_id}-{get_safe_filename_name_part(name or 'GUEST')}.png": (qr_id, name) for qr_id, name in guests}
+    pngs = qr_png_batch([qr_id for qr_id, _ in names.values()])
+    urls, failed = [], []
+    ctx.progress(0, len(names), "Uploading QR codes", force=True)
+    for done, (qr_fname, url, error) in enumerate(_require_storage().upload_many(QR_BUCKET, zip(names, pngs)), 1):
+        qr_id, name = names[qr_fname]
+        if error:
+            logging.warning(f"QR upload failed for {qr_fname}: {error}")
+            failed.append({"name": name, "error": str(error)})
+        else:
+            urls.append({"_qr": qr_id, "url": url})
+        ctx.progress(done, len(names))
+
+    if urls:
+        with get_db_session() as db:
+            db.connection().execute(
+                update(Guest.__table__)
+                .where(Guest.__table__.c.qr_code_id == bindparam("_qr"))
+                .values(qr_code_url=bindparam("url")),
+                urls,
+            )
+            db.commit()
+    ctx.progress(len(names), len(names), force=True)
+    return {"published": len(urls), "failed": failed}
+
+
+@job_queue.handler("regenerate_qr")
+def regenerate_qr_job(ctx):
     with get_db_session() as db:
         try:
+            backfill_visual_ids(db)
             guests = db.query(Guest).all()
-            for guest in guests:
-                if guest.visual_id is None:
-                    guest.visual_id = get_next_visual_id(db)
-                qr_id = f"GUEST-{guest.visual_id:04d}"
-                qr_fname = qr_filename_from_guest(guest)
-                qr_bytes = generate_qr_bytes(qr_id)
-                qr_url = upload_to_supabase(QR_BUCKET, qr_fname, qr_bytes)
+            qr_ids = [f"GUEST-{guest.visual_id:04d}" for guest in guests]
+            uploads = zip([qr_filename_from_guest(g) for g in guests], qr_png_batch(qr_ids))
+            results = _require_storage().upload_many(QR_BUCKET, uploads)
+            failed = []
+            for i, (guest, qr_id, (_, qr_url, error)) in enumerate(zip(guests, qr_ids, results)):
+                ctx.progress(i, len(guests), f"QR for {guest.name}")
+                if error:
+                    failed.append({"name": guest.name, "error": str(error)})
+                    continue
                 guest.qr_code_id = qr_id
                 guest.qr_code_url = qr_url
             db.commit()
-            flash("QR codes regenerated.", "success")
-        except Exception as e:
+            checkin_index.load(db)
+        except Exception:
             db.rollback()
-            flash(f"Error regenerating QR codes: {e}", "danger")
-            current_app.logger.error(f"Error regenerating QR codes: {e}", exc_info=True)
+            raise
 
-    return redirect(url_for('view_all'))
+    ctx.progress(len(guests), len(guests), force=True)
+    return {"regenerated": len(guests) - len(failed), "failed": failed}
 
 
 # -------------------- generate_guest_cards --------------------
 @app.route('/generate_guest_cards')
 @login_required
 def generate_guest_cards():
-    CARD_W, CARD_H = 1240, 1748
-    NAME_CENTER_Y = 550
-    NAME_X = 550
-    QR_SIZE = 175
-    QR_Y = CARD_H - QR_SIZE - 180
-    QR_X = 750
-    CARD_TYPE_Y = CARD_H - 45 - 355
-    CARD_TYPE_X = 770
-    VISUAL_ID_FONT_SIZE = 35
-    VISUAL_ID_MARGIN_BOTTOM = 75
-    VISUAL_ID_MARGIN_RIGHT = 25
-
-    template_path = os.path.join("static", "Card Template.jpg")
-    font_path = os.path.join("static", "fonts", "Roboto-Bold.ttf")
-
-    if not os.path.exists(template_path):
+    if not os.path.exists(TEMPLATE_PATH):
         flash("Card template not found at static/Card Template.jpg", "danger")
         return redirect(url_for('view_all'))
-    if not os.path.exists(font_path):
+    if not os.path.exists(FONT_PATH):
         flash("Font file not found at static/fonts/Roboto-Bold.ttf", "danger")
         return redirect(url_for('view_all'))
 
-    name_font = ImageFont.truetype(font_path, 50)
-    card_type_font = ImageFont.truetype(font_path, 35)
-    visual_id_font = ImageFont.truetype(font_path, VISUAL_ID_FONT_SIZE)
+    job_queue.enqueue("generate_cards")
+    flash("Generating guest cards in the background — progress is shown below.", "info")
+    return redirect(url_for('view_all'))
+
 
+@job_queue.handler("generate_cards")
+def generate_cards_job(ctx):
+    """
+    Render every card whose fingerprint changed on the process pool. Workers
+    draw the QR from qr_code_id themselves and encode every CARD_VARIANTS
+    rendition; finished files stream into the storage uploader so network I/O
+    overlaps with the drawing. A card counts as generated once all of its
+    renditions are stored.
+    """
     with get_db_session() as db:
         guests = db.query(Guest).all()
+        stored = stored_fingerprints(db)
+
+    # No QR or no card number yet (regenerate_qr assigns both): skip just those guests.
+    skipped = [g.name for g in guests if not g.qr_code_id or g.visual_id is None]
+    assets = assets_fingerprint()
+    wanted = {g.id: (card_fingerprint(g, assets), card_filename_from_guest(g))
+              for g in guests if g.qr_code_id and g.visual_id is not None}
+    guests = [g for g in guests if g.id in wanted and stored.get(g.id) != wanted[g.id]]
+    unchanged = len(wanted) - len(guests)
+    by_id = {g.id: g for g in guests}
+    generated, failed, rendered_rows = 0, [], []
+
+    specs = ((g.id, {"name": g.name, "card_type": g.card_type, "visual_id": g.visual_id,
+                     "qr_code_id": g.qr_code_id}) for g in guests)
+
+    owner = {}                   # storage path -> guest id
+    stored_variants = {}         # guest id -> renditions uploaded so far
+    upload_failed = set()
+
+    def rendered_cards():
+        for done, (guest_id, variants, error) in enumerate(CardRenderPool(variants=CARD_VARIANTS).render(specs), 1):
+            guest = by_id[guest_id]
+            ctx.progress(done, len(guests), f"Rendered card for {guest.name}")
+            if error:
+                failed.append({"name": guest.name, "error": str(error)})
+                logging.error(f"Card gen error for guest {guest.visual_id}: {error}")
+                continue
+            for variant, data in variants.items():
+                path = variant_path(wanted[guest_id][1], variant)
+                owner[path] = guest_id
+                yield path, data, CARD_VARIANTS[variant]["content_type"]
+
+    ctx.progress(0, len(guests), "Rendering cards", force=True)
+    for path, _, error in _require_storage().upload_many(CARDS_BUCKET, rendered_cards()):
+        guest = by_id[owner[path]]
+        if error:
+            if guest.id not in upload_failed:
+                upload_failed.add(guest.id)
+                failed.append({"name": guest.name, "error": str(error)})
+            logging.error(f"Card upload error for guest {guest.visual_id} ({path}): {error}")
+            continue
+        stored_variants[guest.id] = stored_variants.get(guest.id, 0) + 1
+        if stored_variants[guest.id] == len(CARD_VARIANTS) and guest.id not in upload_failed:
+            generated += 1
+            rendered_rows.append({"guest_id": guest.id, "fingerprint": wanted[guest.id][0],
+                                  "filename": wanted[guest.id][1]})
 
-        for guest in guests:
-            try:
-                if not guest.qr_code_url:
-                    flash(f"No QR URL for {guest.name}. Skipping.", "warning")
-                    continue
-
-                # Download QR from Supabase
-                qr_data = download_from_supabase(QR_BUCKET, qr_filename_from_guest(guest))
-                qr_img = Image.open(BytesIO(qr_data)).resize((QR_SIZE, QR_SIZE))
-
-                img = Image.open(template_path).convert("RGB")
-                draw = ImageDraw.Draw(img)
-
-                # Name
-                wrapped = textwrap.fill((guest.name or "").upper(), width=20)
-                lines = wrapped.split('\n')
-                line_h = name_font.getbbox("A")[3] + 10
-                start_y = NAME_CENTER_Y - (line_h * len(lines)) // 2
-                for i, line in enumerate(lines):
-                    draw.text((NAME_X, start_y + i * line_h), line, font=name_font, fill="#000000")
-
-                # QR
-                img.paste(qr_img, (QR_X, QR_Y))
-
-                # Card type
-                draw.text((CARD_TYPE_X, CARD_TYPE_Y), (guest.card_type or "").upper(),
-                          font=card_type_font, fill="#CC3332")
-
-                # Visual ID
-                vis_text = f"NO. {guest.visual_id:04d}"
-                box = draw.textbbox((0, 0), vis_text, font=visual_id_font)
-                vis_w = box[2] - box[0]
-                vis_h = box[3] - box[1]
-                draw.text((CARD_W - vis_w - VISUAL_ID_MARGIN_RIGHT, CARD_H - vis_h - VISUAL_ID_MARGIN_BOTTOM),
-                          vis_text, font=visual_id_font, fill="#CC3332")
-
-                # Save to bytes and upload to Supabase
-                buf = BytesIO()
-                img.save(buf, format="PNG")
-                card_bytes = buf.getvalue()
-                upload_to_supabase(CARDS_BUCKET, card_filename_from_guest(guest), card_bytes)
-
-            except Exception as e:
-                flash(f"Failed card for {guest.name}: {e}", "danger")
-                current_app.logger.error(f"Card gen error for guest {guest.visual_id}: {e}", exc_info=True)
+    with get_db_session() as db:
+        save_fingerprints(db, rendered_rows)
+        db.commit()
 
-    flash("Guest invitation cards generated successfully.", "success")
-    return redirect(url_for('view_all'))
+    ctx.progress(len(guests), len(guests), force=True)
+    return {"generated": generated, "unchanged": unchanged, "skipped": skipped, "failed": failed}
 
 
 # -------------------- download_card_by_id --------------------
@@ -776,48 +908,15 @@ def download_card_by_id(visual_id):
                 flash("Guest not found.", "danger")
                 return redirect(url_for('view_all'))
 
-            template_path = os.path.join("static", "Card Template.jpg")
-            font_path = os.path.join("static", "fonts", "Roboto-Bold.ttf")
-
-            if not os.path.exists(template_path):
+            if not os.path.exists(TEMPLATE_PATH):
                 flash("Card template missing.", "danger")
                 return redirect(url_for('view_all'))
-            if not os.path.exists(font_path):
+            if not os.path.exists(FONT_PATH):
                 flash("Font file missing.", "danger")
                 return redirect(url_for('view_all'))
 
-            # Download QR from Supabase
-            qr_data = download_from_supabase(QR_BUCKET, qr_filename_from_guest(guest))
-            qr_img = Image.open(BytesIO(qr_data)).resize((175, 175))
-
-            img = Image.open(template_path).convert("RGB")
-            draw = ImageDraw.Draw(img)
-
-            CARD_W, CARD_H = 1240, 1748
-            name_font = ImageFont.truetype(font_path, 50)
-            card_type_font = ImageFont.truetype(font_path, 35)
-            visual_id_font = ImageFont.truetype(font_path, 35)
-
-            wrapped = textwrap.fill((guest.name or "").upper(), width=20)
-            lines = wrapped.split('\n')
-            line_h = name_font.getbbox("A")[3] + 10
-            start_y = 550 - (line_h * len(lines)) // 2
-            for i, line in enumerate(lines):
-                draw.text((550, start_y + i * line_h), line, font=name_font, fill="#000000")
-
-            img.paste(qr_img, (750, CARD_H - 175 - 180))
-            draw.text((770, CARD_H - 45 - 355), (guest.card_type or "").upper(),
-                      font=card_type_font, fill="#CC3332")
-
-            vis_text = f"NO. {guest.visual_id:04d}"
-            box = draw.textbbox((0, 0), vis_text, font=visual_id_font)
-            draw.text((CARD_W - (box[2]-box[0]) - 25, CARD_H - (box[3]-box[1]) - 75),
-                      vis_text, font=visual_id_font, fill="#CC3332")
-
-            buf = BytesIO()
-            img.save(buf, format="PNG")
-            buf.seek(0)
-            return send_file(buf, as_attachment=True,
+            card_bytes = get_card_renderer().render(guest.name, guest.card_type, guest.visual_id, guest.qr_code_id)
+            return send_file(BytesIO(card_bytes), as_attachment=True,
                              download_name=f"Guest-{guest.visual_id:04d}.png",
                              mimetype="image/png")
 
@@ -831,44 +930,122 @@ def download_card_by_id(visual_id):
 @app.route('/download_all_cards')
 @login_required
 def download_all_cards():
-    """Stream all guest cards from Supabase into a zip."""
     with get_db_session() as db:
-        guests = db.query(Guest).all()
-
-    zip_buffer = BytesIO()
-    count = 0
-    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
-        for guest in guests:
-            try:
-                fname = card_filename_from_guest(guest)
-                data = download_from_supabase(CARDS_BUCKET, fname)
-                zf.writestr(fname, data)
-                count += 1
-            except Exception as e:
-                current_app.logger.warning(f"Could not fetch card for {guest.name}: {e}")
-
-    if count == 0:
+        paths = [card_filename_from_guest(g) for g in db.query(Guest).filter(Guest.visual_id != None)]
+    if not paths:
         flash("No invitation cards found. Please generate them first.", "warning")
         return redirect(url_for('view_all'))
+    return _zip_response(CARDS_BUCKET, paths, "invitation_cards.zip")
+
 
-    zip_buffer.seek(0)
-    return send_file(zip_buffer, download_name="invitation_cards.zip", as_attachment=True)
+def _zip_response(bucket, paths, download_name):
+    """
+    Stream a zip of the bucket objects: entries are written as the concurrent
+    prefetch in download_many delivers them, so the first bytes go out at once
+    and memory stays at the prefetch window whatever the guest count.
+    """
+    store = _require_storage()
+
+    def entries():
+        missing = []
+        for fname, data, error in store.download_many(bucket, paths):
+            if error:
+                logging.warning(f"Could not fetch {fname} for {download_name}: {error}")
+                missing.append(fname)
+                continue
+            yield fname, data
+        if missing:
+            yield "MISSING.txt", ("\n".join(missing) + "\n").encode("utf-8")
+
+    return Response(stream_zip(entries()), mimetype="application/zip",
+                    headers={"Content-Disposition": f"attachment; filename={download_name}"})
+
+
+# -------------------- local object storage --------------------
+@app.route('/local_storage/<bucket>/<path:filename>')
+def local_storage_file(bucket, filename):
+    """Serves LocalStorage objects at their public URLs (development without Supabase)."""
+    if not isinstance(storage, LocalStorage):
+        return "Not found", 404
+    try:
+        path = storage.path_for(bucket, filename)
+    except ValueError:
+        return "Not found", 404
+    if not os.path.exists(path):
+        return "Not found", 404
+    return send_file(path)
+
+
+# -------------------- WhatsApp status webhook --------------------
+@app.route('/whatsapp/webhook', methods=['GET'])
+def whatsapp_webhook_verify():
+    """Meta's subscription handshake: echo hub.challenge when the verify token matches."""
+    if (request.args.get('hub.mode') == 'subscribe' and WHATSAPP_VERIFY_TOKEN
+            and request.args.get('hub.verify_token') == WHATSAPP_VERIFY_TOKEN):
+        return request.args.get('hub.challenge', ''), 200
+    return "Forbidden", 403
+
+
+@app.route('/whatsapp/webhook', methods=['POST'])
+def whatsapp_webhook():
+    """
+    Delivery-status callbacks from Meta. Only checks the signature and buffers
+    the statuses; status_buffer writes them in batches, so a burst of callbacks
+    costs a few commits instead of one each.
+    """
+    body = request.get_data()
+    if not verify_signature(body, request.headers.get('X-Hub-Signature-256'), WHATSAPP_APP_SECRET):
+        return "Invalid signature", 403
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        return "Invalid JSON", 400
+    if WHATSAPP_WEBHOOK_RECORD:
+        with open(WHATSAPP_WEBHOOK_RECORD, 'ab') as f:
+            f.write(body.replace(b"\n", b"") + b"\n")
+    status_buffer.add(parse_statuses(payload))
+    return "", 200
+
+
+atexit.register(status_buffer.flush)
+
+
+# -------------------- background jobs --------------------
+@app.route('/jobs')
+@login_required
+def list_jobs():
+    active = request.args.get('active') == '1'
+    return jsonify(jobs=job_queue.recent(limit=10, active_only=active))
+
+
+@app.route('/jobs/<job_id>')
+@login_required
+def job_status(job_id):
+    job = job_queue.get(job_id)
+    if not job:
+        return jsonify(success=False, message="Job not found."), 404
+    return jsonify(job)
 
 
 # -------------------- guest_report --------------------
+attendance_feed = AttendanceFeed(guest_stats)
+
+
 @app.route('/guest_report_data')
 @login_required
 def guest_report_data():
     with get_db_session() as db:
-        total = db.query(Guest).count()
-        return jsonify({
-            "total_guests": total,
-            "single_cards": db.query(Guest).filter_by(card_type='single').count(),
-            "double_cards": db.query(Guest).filter_by(card_type='double').count(),
-            "family_cards": db.query(Guest).filter_by(card_type='family').count(),
-            "entered_guests": db.query(Guest).filter_by(has_entered=True).count(),
-            "not_entered_guests": total - db.query(Guest).filter_by(has_entered=True).count(),
-        })
+        return jsonify(guest_stats(db))
+
+
+@app.route('/guest_report_stream')
+@login_required
+def guest_report_stream():
+    """Server-sent events: one snapshot, then counter deltas as guests check in."""
+    return Response(
+        attendance_feed.stream(), mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
 
 
 @app.route('/guest_report')
@@ -883,23 +1060,64 @@ def guest_report():
 def clear_all_data():
     with get_db_session() as db:
         try:
-            guests = db.query(Guest).all()
-
-            # Delete all files from Supabase storage
-            for guest in guests:
-                delete_from_supabase(QR_BUCKET, qr_filename_from_guest(guest))
-                delete_from_supabase(CARDS_BUCKET, card_filename_from_guest(guest))
+            files = {QR_BUCKET: [], CARDS_BUCKET: []}
+            for guest in db.query(Guest):
+                files[QR_BUCKET].append(qr_filename_from_guest(guest))
+                files[CARDS_BUCKET].extend(card_paths_from_guest(guest))
 
             num_deleted = db.query(Guest).delete()
+            db.query(CheckinEvent).delete()
+            db.query(CardRender).delete()
+            db.query(SendOutbox).delete()
+            db.query(MessageStatus).delete()
             db.commit()
-            flash(f"Successfully deleted {num_deleted} guests.", "success")
+            checkin_index.clear()
         except Exception as e:
             db.rollback()
-            flash(f"An error occurred while clearing data: {e}", "danger")
-            current_app.logger.error(f"Error clearing all data: {e}", exc_info=True)
+            flash(f"Error clearing data: {e}", "danger")
+            current_app.logger.error(f"Error clearing data: {e}", exc_info=True)
+            return redirect(url_for('view_all'))
 
+    _purge_files(files)
+    flash(f"Deleted {num_deleted} guests. Their stored files are being removed in the background.", "success")
     return redirect(url_for('view_all'))
 
+
+# -------------------- storage purge --------------------
+def _purge_files(files: dict):
+    """Queue removal of {bucket: [paths]} whose guests are already gone from the database."""
+    files = {bucket: paths for bucket, paths in files.items() if paths}
+    if storage and files:
+        job_queue.enqueue("purge_files", files=files)
+
+
+@job_queue.handler("purge_files")
+def purge_files_job(ctx):
+    """Delete stored files in large concurrent batches; failures are reported per file."""
+    files = ctx.params["files"]
+    with get_db_session() as db:
+        # A guest added since the purge was queued may have been given a freed-up filename
+        live = set()
+        for guest in db.query(Guest):
+            live.add(qr_filename_from_guest(guest))
+            live.update(card_paths_from_guest(guest))
+
+    total = sum(len(paths) for paths in files.values())
+    summary = {"deleted": 0, "missing": 0, "failed": []}
+    done = 0
+    ctx.progress(0, total, "Deleting stored files", force=True)
+    for bucket, paths in files.items():
+        report = _require_storage().delete_many(bucket, [p for p in paths if p not in live])
+        summary["deleted"] += len(report["deleted"])
+        summary["missing"] += len(report["missing"])
+        for failure in report["failed"]:
+            logging.warning(f"Could not delete {failure['path']} from {bucket}: {failure['error']}")
+            summary["failed"].append({"bucket": bucket, **failure})
+        done += len(paths)
+        ctx.progress(done, total, f"Cleared {bucket}", force=True)
+    return summary
+
+
 @app.route('/send_cards', methods=['GET', 'POST'])
 @login_required
 def send_cards():
@@ -909,22 +1127,38 @@ def send_cards():
     """
     with get_db_session() as db:
         guests = db.query(Guest).order_by(Guest.visual_id).all()
- 
-        total = len(guests)
-        sent = sum(1 for g in guests if g.whatsapp_sent)
-        failed = sum(1 for g in guests if g.whatsapp_error and not g.whatsapp_sent)
-        pending = total - sent
+        stats = guest_stats(db)
+        thumbs = _card_thumbnails(db, guests)
  
         return render_template(
             'send_cards.html',
             guests=guests,
-            total=total,
-            sent=sent,
-            failed=failed,
-            pending=pending,
+            thumbs=thumbs,
+            total=stats["total_guests"],
+            sent=stats["whatsapp_sent"],
+            failed=stats["whatsapp_failed"],
+            pending=stats["whatsapp_pending"],
+            media=media_cache.counts(db),
+            delivery=delivery_counts(db),
         )
  
  
+def _card_thumbnails(db, guests) -> dict:
+    """{guest_id: thumbnail URL} for guests whose stored card is current; the rest have nothing to show yet."""
+    if not storage or not os.path.exists(TEMPLATE_PATH) or not os.path.exists(FONT_PATH):
+        return {}
+    assets = assets_fingerprint()
+    stored = stored_fingerprints(db)
+    thumbs = {}
+    for guest in guests:
+        if not guest.qr_code_id or guest.visual_id is None:
+            continue
+        fname = card_filename_from_guest(guest)
+        if stored.get(guest.id) == (card_fingerprint(guest, assets), fname):
+            thumbs[guest.id] = storage.public_url(CARDS_BUCKET, variant_path(fname, "thumb"))
+    return thumbs
+
+
 @app.route('/send_card_single/<int:guest_id>', methods=['POST'])
 @login_required
 def send_card_single(guest_id):
@@ -942,22 +1176,15 @@ def send_card_single(guest_id):
             return jsonify(success=False, message="Guest has no valid phone number.")
  
         try:
-            # Download guest card from Supabase
-            card_fname = card_filename_from_guest(guest)
-            try:
-                card_bytes = download_from_supabase(CARDS_BUCKET, card_fname)
-            except Exception:
-                # Card not generated yet — generate it on the fly
-                card_bytes = _generate_card_bytes(guest)
-                if card_bytes:
-                    upload_to_supabase(CARDS_BUCKET, card_fname, card_bytes)
+            card_fname = os.path.basename(variant_path(card_filename_from_guest(guest), "send"))
+            card_bytes = _current_card_bytes(guest)
  
             if not card_bytes:
                 return jsonify(success=False, message="Could not generate or retrieve guest card.")
  
             # Send via WhatsApp
             from whatsapp import send_guest_card as wa_send
-            wa_send(
+            response = wa_send(
                 to=phone,
                 guest_name=guest.name or "Guest",
                 visual_id=guest.visual_id,
@@ -966,9 +1193,15 @@ def send_card_single(guest_id):
                 filename=card_fname,
             )
  
+            now = datetime.now()
             guest.whatsapp_sent = True
-            guest.whatsapp_sent_at = datetime.now()
+            guest.whatsapp_sent_at = now
             guest.whatsapp_error = None
+            # Recorded like a one-guest campaign so delivery statuses can be matched to the guest
+            messages = (response or {}).get("messages") or [{}]
+            db.add(SendOutbox(campaign_id=f"single-{uuid.uuid4().hex}", guest_id=guest.id, status="sent",
+                              attempts=1, message_id=messages[0].get("id"), next_attempt_at=now,
+                              created_at=now, sent_at=now))
             db.commit()
  
             return jsonify(
@@ -990,122 +1223,167 @@ def send_card_single(guest_id):
 @login_required
 def send_cards_bulk():
     """
-    Send cards to all unsent guests (or all if resend=true).
-    Returns a JSON stream of results — called via AJAX.
+    Start a send campaign to all unsent guests (or all if resend=true) — called via AJAX.
+    Guests go into the send outbox first; returns the job id, which the dashboard
+    polls at /jobs/<id> for progress and results.
     """
     resend = request.json.get('resend', False) if request.is_json else False
- 
     with get_db_session() as db:
-        if resend:
-            guests = db.query(Guest).order_by(Guest.visual_id).all()
-        else:
-            guests = db.query(Guest).filter(
-                (Guest.whatsapp_sent == False) | (Guest.whatsapp_sent == None)
-            ).order_by(Guest.visual_id).all()
- 
-    results = {"total": len(guests), "sent": 0, "failed": 0, "errors": []}
- 
-    from whatsapp import send_guest_card as wa_send
- 
-    for guest in guests:
+        q = db.query(Guest.id)
+        if not resend:
+            q = q.filter((Guest.whatsapp_sent == False) | (Guest.whatsapp_sent == None))
+        campaign_id, queued = outbox.create_campaign(db, [gid for gid, in q.order_by(Guest.visual_id)],
+                                                     live=_live_campaigns(db))
+        db.commit()
+    job_id = job_queue.enqueue("send_cards_bulk", campaign=campaign_id)
+    return jsonify(success=True, job_id=job_id, campaign=campaign_id, queued=queued)
+
+
+def _live_campaigns(db) -> set:
+    """Campaigns whose send job is still queued or running (requeue_stale brings back a dead worker's job)."""
+    params = db.execute(select(Job.params).where(Job.kind == "send_cards_bulk",
+                                                 Job.status.in_(("queued", "running")))).scalars()
+    return {json.loads(p or "{}").get("campaign") for p in params}
+
+
+SEND_STATUS_BATCH = 20      # outbox results written per batch
+SEND_RETRY_POLL = 5         # seconds between checks while only delayed retries remain
+
+
+@job_queue.handler("send_cards_bulk")
+def send_cards_bulk_job(ctx):
+    """
+    Work through a campaign's outbox rows. Rows are claimed in small batches, so
+    a restarted job (or a second one on the same campaign) carries on with
+    whatever is still pending and never touches a row another worker holds.
+    """
+    campaign = ctx.params["campaign"]
+    outbox.recover(campaign)
+    claims = {}                 # row_id -> claim token
+
+    def claimed_rows():
+        while True:
+            token, rows = outbox.claim(campaign)
+            if not rows:
+                return
+            for row_id, guest_id in rows:
+                claims[row_id] = token
+                yield (row_id, guest_id), (row_id, guest_id)
+
+    def prepare(row):
+        row_id, guest_id = row
+        with get_db_session() as db:
+            guest = db.get(Guest, guest_id)
+            if guest is None:
+                raise ValueError("Guest not found.")
+            db.expunge(guest)
         phone = to_whatsapp_number(guest.phone)
         if not phone:
-            results["failed"] += 1
-            results["errors"].append({"name": guest.name, "error": "No phone number"})
-            continue
- 
-        try:
-            card_fname = card_filename_from_guest(guest)
-            try:
-                card_bytes = download_from_supabase(CARDS_BUCKET, card_fname)
-            except Exception:
-                card_bytes = _generate_card_bytes(guest)
-                if card_bytes:
-                    upload_to_supabase(CARDS_BUCKET, card_fname, card_bytes)
- 
-            if not card_bytes:
-                raise ValueError("Could not retrieve or generate card image.")
- 
-            wa_send(
-                to=phone,
-                guest_name=guest.name or "Guest",
-                visual_id=guest.visual_id,
-                card_type=guest.card_type,
-                image_bytes=card_bytes,
-                filename=card_fname,
-            )
- 
-            with get_db_session() as db2:
-                g = db2.get(Guest, guest.id)
-                if g:
-                    g.whatsapp_sent = True
-                    g.whatsapp_sent_at = datetime.now()
-                    g.whatsapp_error = None
-                    db2.commit()
- 
-            results["sent"] += 1
- 
-        except Exception as e:
-            error_msg = str(e)
-            with get_db_session() as db2:
-                g = db2.get(Guest, guest.id)
-                if g:
-                    g.whatsapp_sent = False
-                    g.whatsapp_error = error_msg[:500]
-                    db2.commit()
-            results["failed"] += 1
-            results["errors"].append({"name": guest.name, "error": error_msg})
-            current_app.logger.error(f"Bulk send failed for {guest.name}: {e}")
- 
-    return jsonify(results)
- 
- 
+            raise ValueError("No phone number")
+        card_bytes = _current_card_bytes(guest)
+        if not card_bytes:
+            raise ValueError("Could not retrieve or generate card image.")
+        return row_id, guest, phone, card_bytes
+
+    def send(prepared):
+        row_id, guest, phone, card_bytes = prepared
+        if not outbox.mark_sending(row_id, claims[row_id]):
+            raise ClaimLost(f"Outbox row {row_id} was released to another worker.")
+        return send_guest_card(
+            to=phone,
+            guest_name=guest.name or "Guest",
+            visual_id=guest.visual_id,
+            card_type=guest.card_type,
+            image_bytes=card_bytes,
+            filename=os.path.basename(variant_path(card_filename_from_guest(guest), "send")),
+        )
+
+    engine = SendEngine(send, prepare=prepare)
+    start = outbox.summary(campaign)
+    done = start["total"] - start["remaining"]
+    while True:
+        outcomes = []
+        for (row_id, guest_id), response, error in engine.run(claimed_rows()):
+            token = claims.pop(row_id, None)
+            if isinstance(error, ClaimLost):
+                continue
+            outcomes.append(_outbox_outcome(row_id, guest_id, token, response, error))
+            if len(outcomes) >= SEND_STATUS_BATCH:
+                done += outbox.complete(outcomes)
+                outcomes = []
+            stats = engine.stats()
+            ctx.progress(done, start["total"], f"Sent {stats['sent']}, failed {stats['failed']} · "
+                                               f"{stats['rate']} msg/s · {stats['concurrency']} in flight")
+        done += outbox.complete(outcomes)
+
+        due = outbox.next_due(campaign)
+        if due is None:
+            break
+        # Only rows waiting out a retry delay are left; wait for the next one.
+        ctx.progress(done, start["total"], f"Waiting to retry until {due:%H:%M:%S}", force=True)
+        time.sleep(max(0.0, min(SEND_RETRY_POLL, (due - datetime.now()).total_seconds())))
+
+    result = outbox.summary(campaign)
+    stats = engine.stats()
+    result.update(retries=stats["retries"], throttled=stats["throttled"])
+    ctx.progress(done, result["total"], force=True)
+    return result
+
+
+def _outbox_outcome(row_id, guest_id, token, response, error) -> dict:
+    """Map one SendEngine result onto an outbox.complete() entry."""
+    outcome = {"row_id": row_id, "guest_id": guest_id, "token": token}
+    if error is None:
+        messages = (response or {}).get("messages") or [{}]
+        return {**outcome, "message_id": messages[0].get("id")}
+    logging.error(f"Bulk send failed for guest {guest_id}: {error}")
+    return {**outcome, "error": str(error), "retryable": is_retryable(error)}
+
+
 # ----------------------------------------------------------------
-# Helper: generate card image bytes in memory (reuses generate logic)
+# Helper: generate card renditions in memory (shared CardRenderer)
 # ----------------------------------------------------------------
-def _generate_card_bytes(guest) -> bytes | None:
-    """Generate a guest card image in memory and return PNG bytes."""
-    template_path = os.path.join("static", "Card Template.jpg")
-    font_path = os.path.join("static", "fonts", "Roboto-Bold.ttf")
- 
-    if not os.path.exists(template_path) or not os.path.exists(font_path):
+def _generate_card_variants(guest) -> dict | None:
+    """Render a guest card once and return {variant: bytes} for every CARD_VARIANTS entry."""
+    if not os.path.exists(TEMPLATE_PATH) or not os.path.exists(FONT_PATH):
         return None
  
     try:
-        CARD_W, CARD_H = 1240, 1748
-        qr_data = download_from_supabase(QR_BUCKET, qr_filename_from_guest(guest))
-        qr_img = Image.open(BytesIO(qr_data)).resize((175, 175))
- 
-        img = Image.open(template_path).convert("RGB")
-        draw = ImageDraw.Draw(img)
- 
-        name_font = ImageFont.truetype(font_path, 50)
-        card_type_font = ImageFont.truetype(font_path, 35)
-        visual_id_font = ImageFont.truetype(font_path, 35)
- 
-        wrapped = textwrap.fill((guest.name or "").upper(), width=20)
-        lines = wrapped.split('\n')
-        line_h = name_font.getbbox("A")[3] + 10
-        start_y = 550 - (line_h * len(lines)) // 2
-        for i, line in enumerate(lines):
-            draw.text((550, start_y + i * line_h), line, font=name_font, fill="#000000")
- 
-        img.paste(qr_img, (750, CARD_H - 175 - 180))
-        draw.text((770, CARD_H - 45 - 355), (guest.card_type or "").upper(),
-                  font=card_type_font, fill="#CC3332")
- 
-        vis_text = f"NO. {guest.visual_id:04d}"
-        box = draw.textbbox((0, 0), vis_text, font=visual_id_font)
-        draw.text((CARD_W - (box[2]-box[0]) - 25, CARD_H - (box[3]-box[1]) - 75),
-                  vis_text, font=visual_id_font, fill="#CC3332")
- 
-        buf = BytesIO()
-        img.save(buf, format="PNG")
-        return buf.getvalue()
+        return get_card_renderer().render_variants({"name": guest.name, "card_type": guest.card_type,
+                                                    "visual_id": guest.visual_id, "qr_code_id": guest.qr_code_id})
  
     except Exception as e:
-        logging.error(f"_generate_card_bytes failed for {guest.name}: {e}")
+        logging.error(f"_generate_card_variants failed for {guest.name}: {e}")
+        return None
+
+
+def _current_card_bytes(guest, variant: str = "send") -> bytes | None:
+    """
+    One rendition of the guest's card (the WhatsApp JPEG by default): the
+    stored copy when its fingerprint is current, otherwise a fresh render whose
+    renditions are all uploaded and recorded.
+    """
+    fname = card_filename_from_guest(guest)
+    if not os.path.exists(TEMPLATE_PATH) or not os.path.exists(FONT_PATH):
         return None
+    fingerprint = card_fingerprint(guest)
+    with get_db_session() as db:
+        stored = db.get(CardRender, guest.id)
+        if stored and (stored.fingerprint, stored.filename) == (fingerprint, fname):
+            try:
+                return download_from_supabase(CARDS_BUCKET, variant_path(fname, variant))
+            except Exception as e:
+                logging.warning(f"Stored card for {guest.name} missing, re-rendering: {e}")
+
+        variants = _generate_card_variants(guest)
+        if not variants:
+            return None
+        for data_variant, data in variants.items():
+            upload_to_supabase(CARDS_BUCKET, variant_path(fname, data_variant), data,
+                               CARD_VARIANTS[data_variant]["content_type"])
+        save_fingerprints(db, [{"guest_id": guest.id, "fingerprint": fingerprint, "filename": fname}])
+        db.commit()
+        return variants[variant]
 
 
 if __name__ == "__main__":
@@ -0,0 +1,143 @@
+# attendance.py — live attendance counters pushed to the report dashboards
+import json
+import logging
+import queue
+import threading
+import time
+
+from models import get_db_session
+
+RECONCILE_INTERVAL = 5       # seconds between the shared catch-up query
+KEEPALIVE_INTERVAL = 15      # seconds between SSE comments on an idle stream
+SUBSCRIBER_BACKLOG = 100     # queued events per dashboard before it gets a fresh snapshot
+MAX_STREAMS = 4              # open streams per process; each holds a gunicorn thread (8 per worker)
+
+
+class AttendanceFeed:
+    """
+    Fan-out of report counters to every connected dashboard in this process.
+
+    Check-ins publish deltas straight from the request that made them. One
+    background thread per process re-reads the counters every few seconds
+    (only while someone is listening) to pick up changes made by the other
+    gunicorn worker or by admin edits, and publishes the difference.
+    Dashboards themselves never query the database.
+
+    Every open stream ties up a request thread, so past max_streams a
+    dashboard is told to poll instead, leaving threads for the scanners.
+    """
+
+    def __init__(self, loader, interval: float = RECONCILE_INTERVAL, max_streams: int = MAX_STREAMS):
+        self._loader = loader
+        self._interval = interval
+        self.max_streams = max_streams
+        self._streams = 0
+        self._counters = None
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._watcher = None
+
+    def _load(self) -> dict:
+        with get_db_session() as db:
+            return dict(self._loader(db))
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            if self._counters is not None:
+                return dict(self._counters)
+        counters = self._load()
+        with self._lock:
+            if self._counters is None:
+                self._counters = counters
+            return dict(self._counters)
+
+    def subscribe(self) -> queue.Queue:
+        q = queue.Queue(maxsize=SUBSCRIBER_BACKLOG)
+        with self._lock:
+            self._subscribers.add(q)
+            if self._watcher is None or not self._watcher.is_alive():
+                self._watcher = threading.Thread(target=self._watch, name="attendance-feed", daemon=True)
+                self._watcher.start()
+        return q
+
+    def unsubscribe(self, q: queue.Queue):
+        with self._lock:
+            self._subscribers.discard(q)
+
+    def publish(self, delta: dict):
+        """Apply counter deltas (e.g. {"entered_guests": 1}) and push them to every dashboard."""
+        delta = {k: v for k, v in delta.items() if v}
+        if not delta:
+            return
+        with self._lock:
+            if self._counters is None:
+                return  # nobody has a snapshot yet; the next load includes this change
+            for key, value in delta.items():
+                self._counters[key] = self._counters.get(key, 0) + value
+            subscribers = list(self._subscribers)
+        for q in subscribers:
+            self._offer(q, ("delta", delta))
+
+    def reconcile(self):
+        """Re-read the counters once and publish whatever changed since the last look."""
+        fresh = self._load()
+        with self._lock:
+            current = self._counters or {}
+            delta = {k: v - current.get(k, 0) for k, v in fresh.items() if v != current.get(k, 0)}
+            self._counters = fresh
+            subscribers = list(self._subscribers)
+        if delta:
+            for q in subscribers:
+                self._offer(q, ("delta", delta))
+
+    def _offer(self, q: queue.Queue, event):
+        try:
+            q.put_nowait(event)
+        except queue.Full:
+            # Slow dashboard: drop its backlog and let it resync from a snapshot.
+            with q.mutex:
+                q.queue.clear()
+            q.put_nowait(("snapshot", self.snapshot()))
+
+    def _watch(self):
+        while True:
+            time.sleep(self._interval)
+            with self._lock:
+                if not self._subscribers:
+                    # Counters go stale without the watcher; reload on the next subscribe.
+                    self._counters = None
+                    self._watcher = None
+                    return
+            try:
+                self.reconcile()
+            except Exception as e:
+                logging.warning(f"Attendance feed reconcile failed: {e}")
+
+    def stream(self):
+        """Generator of server-sent events for one dashboard connection."""
+        with self._lock:
+            full = self._streams >= self.max_streams
+            if not full:
+                self._streams += 1
+        if full:
+            # The page falls back to polling on this event.
+            yield _sse("busy", self.snapshot())
+            return
+        q = self.subscribe()
+        try:
+            yield _sse("snapshot", self.snapshot())
+            while True:
+                try:
+                    event, payload = q.get(timeout=KEEPALIVE_INTERVAL)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield _sse(event, payload)
+        finally:
+            self.unsubscribe(q)
+            with self._lock:
+                self._streams -= 1
+
+
+def _sse(event: str, payload: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
@@ -0,0 +1,103 @@
+# benchmarks/bench_cards.py — card rendering: per-card cost and process-pool throughput
+#
+#   python benchmarks/bench_cards.py            # 200 cards, 1..cpu_count workers
+#   python benchmarks/bench_cards.py 500        # custom card count
+#
+# Legacy timings leave out the per-card Supabase QR download the old path also paid.
+import os
+import statistics
+import sys
+import textwrap
+import time
+from io import BytesIO
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import qrcode
+from PIL import Image, ImageDraw, ImageFont
+
+from cards import CardRenderPool, CardRenderer, TEMPLATE_PATH, FONT_PATH
+
+
+def qr_png(data):
+    qr = qrcode.QRCode(version=1, error_correction=qrcode.constants.ERROR_CORRECT_H, box_size=10, border=4)
+    qr.add_data(data)
+    qr.make(fit=True)
+    buf = BytesIO()
+    qr.make_image(fill_color="black", back_color="white").save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def legacy_draw(spec):
+    """The old per-card path: template decoded, fonts loaded and the downloaded QR PNG decoded for every card."""
+    CARD_W, CARD_H = 1240, 1748
+    name_font = ImageFont.truetype(FONT_PATH, 50)
+    card_type_font = ImageFont.truetype(FONT_PATH, 35)
+    visual_id_font = ImageFont.truetype(FONT_PATH, 35)
+    qr_img = Image.open(BytesIO(spec["qr_png"])).resize((175, 175))
+    img = Image.open(TEMPLATE_PATH).convert("RGB")
+    draw = ImageDraw.Draw(img)
+    lines = textwrap.fill(spec["name"].upper(), width=20).split('\n')
+    line_h = name_font.getbbox("A")[3] + 10
+    start_y = 550 - (line_h * len(lines)) // 2
+    for i, line in enumerate(lines):
+        draw.text((550, start_y + i * line_h), line, font=name_font, fill="#000000")
+    img.paste(qr_img, (750, CARD_H - 175 - 180))
+    draw.text((770, CARD_H - 45 - 355), spec["card_type"].upper(), font=card_type_font, fill="#CC3332")
+    vis_text = f"NO. {spec['visual_id']:04d}"
+    box = draw.textbbox((0, 0), vis_text, font=visual_id_font)
+    draw.text((CARD_W - (box[2] - box[0]) - 25, CARD_H - (box[3] - box[1]) - 75),
+              vis_text, font=visual_id_font, fill="#CC3332")
+    return img
+
+
+def legacy_render(spec):
+    buf = BytesIO()
+    legacy_draw(spec).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def per_card(label, fn, specs):
+    samples = []
+    for _, spec in specs:
+        start = time.perf_counter()
+        fn(spec)
+        samples.append((time.perf_counter() - start) * 1000)
+    print(f"  {label:<26} median {statistics.median(samples):8.2f} ms")
+
+
+def main(n):
+    specs = [(i, {"name": f"Guest Number {i}", "card_type": "single", "visual_id": i,
+                  "qr_code_id": f"GUEST-{i:04d}", "qr_png": qr_png(f"GUEST-{i:04d}")}) for i in range(1, n + 1)]
+    cpus = os.cpu_count() or 1
+
+    renderer = CardRenderer()
+    sample = specs[:min(n, 30)]
+    print(f"Per card ({len(sample)} cards):")
+    per_card("legacy draw", legacy_draw, sample)
+    per_card("CardRenderer draw", lambda s: renderer.draw(s["name"], s["card_type"], s["visual_id"], s["qr_code_id"]), sample)
+    per_card("legacy draw + PNG", legacy_render, sample)
+    per_card("CardRenderer draw + PNG", renderer.render_spec, sample)
+
+    print(f"{n} cards, {cpus} CPU(s):")
+
+    start = time.perf_counter()
+    for _, spec in specs:
+        legacy_render(spec)
+    legacy = time.perf_counter() - start
+    print(f"  {'legacy serial':<16} {legacy:7.2f} s   {n / legacy:7.1f} cards/s")
+
+    workers = sorted({1, 2, 4, cpus} & set(range(1, cpus + 1)))
+    for w in workers:
+        start = time.perf_counter()
+        for _ in CardRenderPool(workers=w).render(specs):
+            pass
+        elapsed = time.perf_counter() - start
+        print(f"  {f'pool x{w}':<16} {elapsed:7.2f} s   {n / elapsed:7.1f} cards/s   "
+              f"speed-up {legacy / elapsed:4.1f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
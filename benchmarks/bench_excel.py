@@ -0,0 +1,118 @@
+# benchmarks/bench_excel.py — guest report export: in-memory openpyxl workbook vs the streamed write-only one
+#
+#   python benchmarks/bench_excel.py            # 50 000 guests in a file-backed SQLite database
+#   python benchmarks/bench_excel.py 200000
+#
+# Each export runs in its own process so peak RSS belongs to that export alone.
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from io import BytesIO
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from openpyxl import Workbook
+from openpyxl.formatting.rule import CellIsRule
+from openpyxl.styles import Font, PatternFill
+
+from exports import guest_report_xlsx
+from models import Guest, get_db_session, init_db
+from stats import guest_stats
+
+
+def legacy():
+    """The old download_excel body: every guest loaded, every cell set, widths from a pass over all cells."""
+    with get_db_session() as db:
+        stats = guest_stats(db)
+        guests = db.query(Guest).all()
+        wb = Workbook()
+        ws = wb.active
+        ws.title = "Guest Report"
+        ws["A1"] = "Guest Summary Report"
+        ws["A1"].font = Font(size=14, bold=True)
+        summary_data = [
+            ("Total Guests", stats["total_guests"]), ("Single Cards", stats["single_cards"]),
+            ("Double Cards", stats["double_cards"]), ("Family Cards", stats["family_cards"]),
+            ("Total Allowed by Family Cards", stats["total_family_allowed"]),
+            ("Guests Entered", stats["entered_guests"]), ("Guests Not Entered", stats["not_entered_guests"]),
+        ]
+        row = 3
+        for label, value in summary_data:
+            ws[f"A{row}"] = label
+            ws[f"B{row}"] = value
+            ws[f"A{row}"].font = Font(bold=True)
+            row += 1
+        table_start = row + 1
+        headers = ["ID", "Name", "Phone", "QR Code ID", "Has Entered", "Entry Time", "Visual ID", "Card Type",
+                   "Group Size"]
+        for col, header in enumerate(headers, start=1):
+            ws.cell(row=table_start, column=col, value=header).font = Font(bold=True)
+        for i, g in enumerate(guests, start=table_start + 1):
+            ws.cell(i, 1, g.id); ws.cell(i, 2, g.name); ws.cell(i, 3, g.phone)
+            ws.cell(i, 4, g.qr_code_id)
+            ws.cell(i, 5, "Entered" if g.has_entered else "Not Entered")
+            ws.cell(i, 6, g.entry_time.strftime('%Y-%m-%d %H:%M:%S') if g.entry_time else "")
+            ws.cell(i, 7, g.visual_id); ws.cell(i, 8, g.card_type); ws.cell(i, 9, g.group_size)
+        rng = f"E{table_start + 1}:E{table_start + len(guests)}"
+        ws.conditional_formatting.add(rng, CellIsRule(operator="equal", formula=['"Entered"'],
+            fill=PatternFill(start_color="C6EFCE", end_color="C6EFCE", fill_type="solid")))
+        ws.conditional_formatting.add(rng, CellIsRule(operator="equal", formula=['"Not Entered"'],
+            fill=PatternFill(start_color="FFC7CE", end_color="FFC7CE", fill_type="solid")))
+        for column in ws.columns:
+            max_length = max((len(str(cell.value)) for cell in column if cell.value), default=0)
+            ws.column_dimensions[column[0].column_letter].width = max_length + 2
+        output = BytesIO()
+        wb.save(output)
+        yield output.getvalue()
+
+
+def seed(db_path, n):
+    init_db(f"sqlite:///{db_path}")
+    with get_db_session() as db:
+        db.execute(Guest.__table__.insert(), [{
+            "name": f"Guest Number {i}", "phone": f"255712{i:06d}", "qr_code_id": f"GUEST-{i:06d}",
+            "visual_id": i, "card_type": "family" if i % 5 == 0 else "single", "group_size": 4 if i % 5 == 0 else 1,
+            "has_entered": i % 2 == 0, "entry_time": datetime(2026, 6, 1, 18, 30) if i % 2 == 0 else None,
+        } for i in range(1, n + 1)])
+        db.commit()
+
+
+def run(mode, db_path):
+    """Child process: export once, print seconds to first byte, total seconds, bytes, RSS before and peak RSS."""
+    init_db(f"sqlite:///{db_path}")
+    base_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    first, total = None, 0
+    for chunk in (legacy() if mode == "legacy" else guest_report_xlsx()):
+        if first is None:
+            first = time.perf_counter() - start
+        total += len(chunk)
+    elapsed = time.perf_counter() - start
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"{first:.3f} {elapsed:.3f} {total} {base_kb} {peak_kb}")
+
+
+def main(n):
+    with tempfile.TemporaryDirectory() as root:
+        db_path = os.path.join(root, "bench.db")
+        seed(db_path, n)
+        print(f"{n} guests:")
+        for mode in ("legacy", "streamed"):
+            out = subprocess.run([sys.executable, __file__, "--child", mode, db_path],
+                                 check=True, capture_output=True, text=True).stdout.split()
+            first, elapsed, size = float(out[0]), float(out[1]), int(out[2])
+            base_kb, peak_kb = int(out[3]), int(out[4])
+            print(f"  {mode:<9} first byte {first:6.2f} s   total {elapsed:6.2f} s   "
+                  f"peak RSS {peak_kb / 1024:6.1f} MB (+{(peak_kb - base_kb) / 1024:5.1f} MB for the export)   "
+                  f"{size / 2**20:4.1f} MB file")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        run(sys.argv[2], sys.argv[3])
+    else:
+        main(int(sys.argv[1]) if len(sys.argv) > 1 else 50000)
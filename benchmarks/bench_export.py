@@ -0,0 +1,54 @@
+# benchmarks/bench_export.py — CSV / Parquet guest export: time and peak RSS as the guest table grows
+#
+#   python benchmarks/bench_export.py                 # 10k, 50k and 200k guests
+#   python benchmarks/bench_export.py 1000 1000000
+#
+# Flat "+MB for the export" across sizes is the point: rows go from the cursor
+# to the output a batch at a time.
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from bench_excel import seed
+from exports import export_query, parquet_available, stream_csv, stream_parquet
+from models import init_db
+
+
+def run(fmt, db_path):
+    """Child process: export every guest once, print seconds, bytes, RSS before and peak RSS."""
+    init_db(f"sqlite:///{db_path}")
+    columns, stmt = export_query()
+    if fmt == "parquet":
+        import pyarrow.parquet  # noqa: F401 -- imported lazily by the export; keep it out of the measurement
+    base_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    total = sum(len(chunk) for chunk in (stream_csv if fmt == "csv" else stream_parquet)(columns, stmt))
+    elapsed = time.perf_counter() - start
+    print(f"{elapsed:.3f} {total} {base_kb} {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}")
+
+
+def main(sizes):
+    formats = ["csv"] + (["parquet"] if parquet_available() else [])
+    for n in sizes:
+        with tempfile.TemporaryDirectory() as root:
+            db_path = os.path.join(root, "bench.db")
+            seed(db_path, n)
+            print(f"{n} guests:")
+            for fmt in formats:
+                out = subprocess.run([sys.executable, __file__, "--child", fmt, db_path],
+                                     check=True, capture_output=True, text=True).stdout.split()
+                elapsed, size, base_kb, peak_kb = float(out[0]), int(out[1]), int(out[2]), int(out[3])
+                print(f"  {fmt:<8} {elapsed:6.2f} s   {n / elapsed:9.0f} rows/s   "
+                      f"+{(peak_kb - base_kb) / 1024:5.1f} MB for the export   {size / 2**20:6.1f} MB out")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        run(sys.argv[2], sys.argv[3])
+    else:
+        main([int(a) for a in sys.argv[1:]] or [10000, 50000, 200000])
@@ -0,0 +1,53 @@
+# benchmarks/bench_qr.py — QR PNG generation: qrcode + PIL vs the NumPy fast path
+#
+#   python benchmarks/bench_qr.py            # 2000 codes
+#   python benchmarks/bench_qr.py 10000      # custom count
+import os
+import sys
+import time
+from io import BytesIO
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import qrcode
+from PIL import Image
+
+from qr import qr_png, qr_png_batch
+
+
+def legacy_qr_bytes(data):
+    """The old generate_qr_bytes."""
+    qr = qrcode.QRCode(version=1, error_correction=qrcode.constants.ERROR_CORRECT_H, box_size=10, border=4)
+    qr.add_data(data)
+    qr.make(fit=True)
+    buf = BytesIO()
+    qr.make_image(fill_color="black", back_color="white").save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def legacy_card_qr(data):
+    """What the card path used to do: full-size PNG, decoded again and resized to 175 px."""
+    return Image.open(BytesIO(legacy_qr_bytes(data))).resize((175, 175))
+
+
+def timed(label, fn, n, baseline=None):
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    speedup = f"   {baseline / elapsed:5.1f}x" if baseline else ""
+    print(f"  {label:<28} {elapsed:7.2f} s   {elapsed / n * 1000:7.3f} ms/code{speedup}")
+    return elapsed
+
+
+def main(n):
+    ids = [f"GUEST-{i:04d}" for i in range(1, n + 1)]
+    print(f"{n} codes:")
+    base = timed("legacy PNG (box 10)", lambda: [legacy_qr_bytes(i) for i in ids], n)
+    timed("qr_png (box 10)", lambda: [qr_png(i) for i in ids], n, base)
+    timed("qr_png_batch (box 10)", lambda: qr_png_batch(ids), n, base)
+    card = timed("legacy card QR (175 px)", lambda: [legacy_card_qr(i) for i in ids], n)
+    timed("qr_png_batch (175 px)", lambda: qr_png_batch(ids, size=175), n, card)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
@@ -0,0 +1,86 @@
+# benchmarks/bench_search.py — per-keystroke latency of /search_guests, old vs indexed
+#
+#   python benchmarks/bench_search.py            # 10k and 100k guests
+#   python benchmarks/bench_search.py 5000       # custom sizes
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from models import Base, Guest
+from search import find_guests, ensure_search_index
+
+FIRST = ["Joan", "Amani", "Baraka", "Neema", "Juma", "Zawadi", "Peter", "Anna", "Godfrey", "Maria",
+         "Emanuel", "Glory", "Pascal", "Saumu", "Colman", "Daudi", "Bonita", "Steve", "Michael", "Omega"]
+LAST = ["Siriwa", "Kileo", "Chuwa", "Mushi", "Msuya", "Kyanula", "Chandika", "Rutatina", "Kibona", "Shayo",
+        "Mosha", "Sempamba", "Komba", "Liwewa", "Massawe", "Temba", "Kimbi", "Massele", "Matiko", "Mbando"]
+
+
+def build_db(path, n):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    rng = random.Random(n)
+    rows = [{
+        "name": f"{rng.choice(FIRST)} {rng.choice(LAST)} {rng.randint(1, 999)}",
+        "phone": f"07{rng.randint(10000000, 99999999)}",
+        "qr_code_id": f"GUEST-{i:06d}", "visual_id": i,
+        "card_type": "single", "group_size": 1, "checked_in_count": 0,
+    } for i in range(1, n + 1)]
+    with engine.begin() as conn:
+        conn.execute(insert(Guest), rows)
+    return engine
+
+
+def legacy_search(db, query):
+    """The pre-index /search_guests: unbounded ILIKE scan, whole table on empty input."""
+    q = db.query(Guest)
+    if query:
+        q = q.filter((Guest.name.ilike(f'%{query}%')) | (Guest.phone.ilike(f'%{query}%')))
+    return q.order_by(Guest.visual_id).all()
+
+
+def keystrokes(term):
+    return [term[:i] for i in range(1, len(term) + 1)]
+
+
+def time_typing(db, search, terms):
+    samples = []
+    for term in terms:
+        for prefix in keystrokes(term):
+            start = time.perf_counter()
+            search(db, prefix)
+            samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def report(label, samples):
+    samples = sorted(samples)
+    p95 = samples[int(len(samples) * 0.95) - 1]
+    print(f"  {label:<10} median {statistics.median(samples):8.2f} ms   p95 {p95:8.2f} ms   "
+          f"max {samples[-1]:8.2f} ms")
+
+
+def main(sizes):
+    terms = ["Joan Msuya", "Chuwa", "0712", "Godfrey Siriwa 12"]
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in sizes:
+            engine = build_db(os.path.join(tmp, f"guests_{n}.db"), n)
+            with sessionmaker(bind=engine)() as db:
+                start = time.perf_counter()
+                ensure_search_index(db)
+                print(f"{n:,} guests (index build {time.perf_counter() - start:.2f} s), "
+                      f"{sum(len(t) for t in terms)} keystrokes:")
+                report("legacy", time_typing(db, legacy_search, terms))
+                report("indexed", time_typing(db, find_guests, terms))
+            engine.dispose()
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [10_000, 100_000])
@@ -0,0 +1,51 @@
+# benchmarks/bench_send.py — bulk WhatsApp sending against the local mock Graph API: serial vs SendEngine
+#
+#   python benchmarks/bench_send.py                  # 300 cards, 80 ms per API call, 80 msg/s limit
+#   python benchmarks/bench_send.py 1000 0.15 250    # custom count, latency (s), server rate limit
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import whatsapp
+from mock_graph import MockGraphServer
+from models import init_db
+from sender import SendEngine
+
+CARD = b"\x89PNG" + os.urandom(200 * 1024)
+
+
+def send(n):
+    card = CARD + n.to_bytes(4, "big")      # every guest's card differs, so none comes from the media cache
+    return whatsapp.send_guest_card(f"255700{n:06d}", f"Guest {n}", n, "single", card, f"GUEST-{n:04d}.png")
+
+
+def main(n, latency, rate):
+    with tempfile.TemporaryDirectory() as folder, MockGraphServer(latency=latency, rate=rate) as server:
+        init_db(f"sqlite:///{os.path.join(folder, 'bench.db')}")
+        whatsapp.WHATSAPP_API_BASE = server.base_url
+        print(f"{n} cards, {latency * 1000:.0f} ms per call, server allows {rate:.0f} msg/s:")
+
+        sample = min(n, 50)
+        start = time.perf_counter()
+        for i in range(sample):
+            send(i)
+        serial = sample / (time.perf_counter() - start)
+        print(f"  {'serial':<12} {serial:7.1f} msg/s   (first {sample} cards)")
+
+        engine = SendEngine(send, rate=rate)
+        start = time.perf_counter()
+        sent = sum(1 for _, _, error in engine.run((i, i) for i in range(sample, sample + n)) if error is None)
+        elapsed = time.perf_counter() - start
+        stats = engine.stats()
+        print(f"  {'SendEngine':<12} {sent / elapsed:7.1f} msg/s   {sent}/{n} sent in {elapsed:.1f} s, "
+              f"{stats['retries']} retries, {server.rejected} rejected by the server, "
+              f"final concurrency {stats['concurrency']}   speed-up {sent / elapsed / serial:4.1f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 300,
+         float(sys.argv[2]) if len(sys.argv) > 2 else 0.08,
+         float(sys.argv[3]) if len(sys.argv) > 3 else 80)
@@ -0,0 +1,57 @@
+# benchmarks/bench_webhooks.py — status callbacks: one commit per callback vs the batched StatusBuffer
+#
+#   python benchmarks/bench_webhooks.py            # 2000 messages x sent/delivered/read, file-backed SQLite
+#   python benchmarks/bench_webhooks.py 10000
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import delete
+
+from models import MessageStatus, get_db_session, init_db
+from webhook_replay import synthetic_bodies
+from webhooks import StatusBuffer, parse_statuses
+
+
+def per_callback(statuses):
+    """The naive receiver: every callback is its own read-modify-commit."""
+    buffer = StatusBuffer()
+    buffer.autostart = False
+    for status in statuses:
+        buffer.add([status])
+        buffer.flush()
+
+
+def batched(statuses):
+    buffer = StatusBuffer()
+    buffer.autostart = False
+    for status in statuses:
+        buffer.add([status])
+    buffer.flush()
+
+
+def main(n):
+    statuses = [s for body in synthetic_bodies(n) for s in parse_statuses(json.loads(body))]
+    with tempfile.TemporaryDirectory() as root:
+        init_db(f"sqlite:///{os.path.join(root, 'bench.db')}")
+        print(f"{len(statuses)} callbacks for {n} messages, shuffled:")
+        for label, run in (("per-call", per_callback), ("batched", batched)):
+            with get_db_session() as db:
+                db.execute(delete(MessageStatus))
+                db.commit()
+            start = time.perf_counter()
+            run(statuses)
+            elapsed = time.perf_counter() - start
+            with get_db_session() as db:
+                rows = db.query(MessageStatus).count()
+                read = db.query(MessageStatus).filter_by(status="read").count()
+            print(f"  {label:<9} {elapsed:7.2f} s   {len(statuses) / elapsed:9.0f} callbacks/s   "
+                  f"{rows} rows, {read} read")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
@@ -0,0 +1,80 @@
+# benchmarks/bench_whatsapp_http.py — per-message latency over HTTPS: new connection per call, pooled session, cached media
+#
+#   python benchmarks/bench_whatsapp_http.py          # 200 messages (media upload + send each)
+#   python benchmarks/bench_whatsapp_http.py 500
+#
+# Needs the openssl CLI to make a throwaway self-signed certificate for the local stub.
+import os
+import ssl
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import requests
+
+import whatsapp
+from mock_graph import MockGraphServer
+from models import init_db
+
+CARD = b"\x89PNG" + os.urandom(200 * 1024)
+
+
+def self_signed(folder):
+    cert, key = os.path.join(folder, "cert.pem"), os.path.join(folder, "key.pem")
+    subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+                    "-keyout", key, "-out", cert, "-subj", "/CN=127.0.0.1",
+                    "-addext", "subjectAltName=IP:127.0.0.1"], check=True, capture_output=True)
+    return cert, key
+
+
+def send_once(n):
+    card = CARD + n.to_bytes(4, "big")      # a distinct card per guest
+    whatsapp.send_guest_card(f"255700{n:06d}", f"Guest {n}", n, "single", card, f"GUEST-{n:04d}.png")
+
+
+def measure(label, guests):
+    samples = []
+    for i in guests:
+        start = time.perf_counter()
+        send_once(i)
+        samples.append((time.perf_counter() - start) * 1000)
+    print(f"  {label:<24} median {statistics.median(samples):7.2f} ms   "
+          f"p95 {statistics.quantiles(samples, n=20)[-1]:7.2f} ms per message")
+    return statistics.median(samples)
+
+
+def main(n):
+    with tempfile.TemporaryDirectory() as folder:
+        init_db(f"sqlite:///{os.path.join(folder, 'bench.db')}")
+        cert, key = self_signed(folder)
+        os.environ["REQUESTS_CA_BUNDLE"] = cert
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(cert, key)
+
+        with MockGraphServer(ssl_context=context) as server:
+            whatsapp.WHATSAPP_API_BASE = server.base_url
+            print(f"{n} messages over HTTPS to a local stub:")
+
+            pooled_session = whatsapp.get_session
+            whatsapp.get_session = requests.Session      # old behaviour: fresh connection and handshake per call
+            before = server.connections
+            legacy = measure("new connection per call", range(n))
+            legacy_conns = server.connections - before
+
+            whatsapp.get_session = pooled_session
+            before = server.connections
+            pooled = measure("pooled session", range(n, 2 * n))
+            print(f"  connections opened: {legacy_conns} vs {server.connections - before}   "
+                  f"speed-up {legacy / pooled:4.1f}x")
+
+            uploads = len(server.media)
+            resend = measure("resend, cached media", range(n, 2 * n))
+            print(f"  uploads during resend: {len(server.media) - uploads}   speed-up {legacy / resend:4.1f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
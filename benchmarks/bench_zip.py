@@ -0,0 +1,77 @@
+# benchmarks/bench_zip.py — card zip export: in-memory serial zip vs the streamed, prefetched zip
+#
+#   python benchmarks/bench_zip.py              # 500 objects of 600 KB, 20 ms per fetch
+#   python benchmarks/bench_zip.py 2000 0.05    # custom count and per-fetch latency (s)
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import zipfile
+from io import BytesIO
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from storage import LocalStorage
+from zipstream import stream_zip
+
+OBJECT_SIZE = 600 * 1024     # about one rendered card PNG
+
+
+class SlowStorage(LocalStorage):
+    """LocalStorage with a fixed per-download delay standing in for the Supabase round trip."""
+
+    def __init__(self, root, latency, workers):
+        super().__init__(root, workers=workers)
+        self.latency = latency
+
+    def download(self, bucket, path):
+        time.sleep(self.latency)
+        return super().download(bucket, path)
+
+
+def legacy(store, paths):
+    """The old export: every object fetched one by one into a deflated BytesIO zip, then sent."""
+    buf = BytesIO()
+    with zipfile.ZipFile(buf, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for path in paths:
+            zf.writestr(path, store.download("cards", path))
+    yield buf.getvalue()
+
+
+def streamed(store, paths):
+    return stream_zip((p, d) for p, d, _ in store.download_many("cards", paths))
+
+
+def measure(label, chunks):
+    tracemalloc.start()
+    start = time.perf_counter()
+    first = None
+    total = 0
+    for chunk in chunks:
+        if first is None:
+            first = time.perf_counter() - start
+        total += len(chunk)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"  {label:<10} first byte {first:7.3f} s   total {elapsed:6.2f} s   "
+          f"peak memory {peak / 2**20:7.1f} MB   {total / 2**20:7.1f} MB sent")
+
+
+def main(n, latency):
+    with tempfile.TemporaryDirectory() as root:
+        store = SlowStorage(root, latency, workers=16)
+        paths = [f"GUEST-{i:04d}.png" for i in range(n)]
+        payload = os.urandom(OBJECT_SIZE)          # incompressible, like PNG data
+        for path in paths:
+            store.upload("cards", path, payload)
+
+        print(f"{n} objects x {OBJECT_SIZE // 1024} KB, {latency * 1000:.0f} ms per fetch:")
+        measure("legacy", legacy(store, paths))
+        measure("streamed", streamed(store, paths))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500,
+         float(sys.argv[2]) if len(sys.argv) > 2 else 0.02)
@@ -0,0 +1,266 @@
+# cards.py — invitation card rendering: one cached renderer per process, and a process pool for batches
+import functools
+import hashlib
+import multiprocessing
+import os
+import textwrap
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from io import BytesIO
+
+from PIL import Image, ImageDraw, ImageFont
+from sqlalchemy import delete, insert
+
+from models import CardRender
+from qr import qr_matrix, scale_matrix
+
+TEMPLATE_PATH = os.path.join("static", "Card Template.jpg")
+FONT_PATH = os.path.join("static", "fonts", "Roboto-Bold.ttf")
+
+RENDER_WORKERS = int(os.getenv("CARD_RENDER_WORKERS", "0")) or os.cpu_count() or 1
+IN_FLIGHT_PER_WORKER = 4     # queued cards per worker; keeps every worker busy without queueing the whole batch
+LAYOUT_VERSION = 3           # bump whenever a drawing or encoding change alters the stored files
+IN_CHUNK = 500
+
+CARD_W, CARD_H = 1240, 1748
+NAME_CENTER_Y = 550
+NAME_X = 550
+NAME_WRAP = 20
+QR_SIZE = 175
+QR_Y = CARD_H - QR_SIZE - 180
+QR_X = 750
+CARD_TYPE_Y = CARD_H - 45 - 355
+CARD_TYPE_X = 770
+VISUAL_ID_FONT_SIZE = 35
+VISUAL_ID_MARGIN_BOTTOM = 75
+VISUAL_ID_MARGIN_RIGHT = 25
+
+# Every render stores these renditions of the card. The print master keeps the
+# card's own filename; the others sit under a folder named after the variant.
+# WhatsApp image messages accept only JPEG and PNG, hence JPEG for "send". It
+# keeps full size: the QR is drawn in whole 6 px boxes per module (GUEST-NNNN is
+# version 1, 29 modules with the quiet zone, at QR_SIZE), and any downscale lands
+# module edges between pixels, so resampling greys them before JPEG adds its own noise.
+CARD_VARIANTS = {
+    "print": {"format": "PNG", "ext": "png", "content_type": "image/png", "width": CARD_W},
+    "send": {"format": "JPEG", "ext": "jpg", "content_type": "image/jpeg", "width": CARD_W, "quality": 80},
+    "thumb": {"format": "WEBP", "ext": "webp", "content_type": "image/webp", "width": 320, "quality": 75},
+}
+
+
+def variant_path(filename: str, variant: str) -> str:
+    """Storage key of one rendition: "GUEST-0001-X.png" -> "send/GUEST-0001-X.jpg"."""
+    if variant == "print":
+        return filename
+    return f"{variant}/{os.path.splitext(filename)[0]}.{CARD_VARIANTS[variant]['ext']}"
+
+
+def encode_variant(img: Image.Image, variant: str) -> bytes:
+    opts = CARD_VARIANTS[variant]
+    if img.width != opts["width"]:
+        img = img.resize((opts["width"], round(img.height * opts["width"] / img.width)), Image.LANCZOS)
+    buf = BytesIO()
+    if opts["format"] == "PNG":
+        img.save(buf, format="PNG")
+    elif opts["format"] == "JPEG":
+        img.save(buf, format="JPEG", quality=opts["quality"], optimize=True)
+    else:
+        img.save(buf, format=opts["format"], quality=opts["quality"])
+    return buf.getvalue()
+
+
+class CardRenderer:
+    """
+    Holds the decoded template, the loaded fonts and the fixed layout, so a
+    card costs one copy() of the template plus the per-guest drawing.
+    """
+
+    def __init__(self, template_path: str = TEMPLATE_PATH, font_path: str = FONT_PATH):
+        self.template_path = template_path
+        self.font_path = font_path
+        self.template = Image.open(template_path).convert("RGB")
+        self.name_font = ImageFont.truetype(font_path, 50)
+        self.card_type_font = ImageFont.truetype(font_path, 35)
+        self.visual_id_font = ImageFont.truetype(font_path, VISUAL_ID_FONT_SIZE)
+        self.name_line_h = self.name_font.getbbox("A")[3] + 10
+
+    @staticmethod
+    def qr_image(qr_code_id: str) -> Image.Image:
+        """The guest's QR drawn locally at card size; it is deterministic, so storage is never needed."""
+        if not qr_code_id:
+            raise ValueError("Guest has no QR code id.")
+        return Image.fromarray(~scale_matrix(qr_matrix(qr_code_id), size=QR_SIZE))
+
+    def draw(self, name, card_type, visual_id, qr_code_id: str) -> Image.Image:
+        qr_img = self.qr_image(qr_code_id)
+        img = self.template.copy()
+        draw = ImageDraw.Draw(img)
+
+        # Name
+        lines = textwrap.fill((name or "").upper(), width=NAME_WRAP).split('\n')
+        start_y = NAME_CENTER_Y - (self.name_line_h * len(lines)) // 2
+        for i, line in enumerate(lines):
+            draw.text((NAME_X, start_y + i * self.name_line_h), line, font=self.name_font, fill="#000000")
+
+        # QR
+        img.paste(qr_img, (QR_X, QR_Y))
+
+        # Card type
+        draw.text((CARD_TYPE_X, CARD_TYPE_Y), (card_type or "").upper(),
+                  font=self.card_type_font, fill="#CC3332")
+
+        # Visual ID
+        vis_text = f"NO. {visual_id:04d}"
+        box = draw.textbbox((0, 0), vis_text, font=self.visual_id_font)
+        draw.text((CARD_W - (box[2] - box[0]) - VISUAL_ID_MARGIN_RIGHT,
+                   CARD_H - (box[3] - box[1]) - VISUAL_ID_MARGIN_BOTTOM),
+                  vis_text, font=self.visual_id_font, fill="#CC3332")
+        return img
+
+    def render(self, name, card_type, visual_id, qr_code_id: str) -> bytes:
+        """PNG bytes of one card."""
+        buf = BytesIO()
+        self.draw(name, card_type, visual_id, qr_code_id).save(buf, format="PNG")
+        return buf.getvalue()
+
+    def render_spec(self, spec: dict) -> bytes:
+        return self.render(spec.get("name"), spec.get("card_type"), spec["visual_id"], spec.get("qr_code_id"))
+
+    def render_variants(self, spec: dict, variants=tuple(CARD_VARIANTS)) -> dict:
+        """{variant: bytes} of one card, drawn once and encoded per variant."""
+        img = self.draw(spec.get("name"), spec.get("card_type"), spec["visual_id"], spec.get("qr_code_id"))
+        return {variant: encode_variant(img, variant) for variant in variants}
+
+
+@functools.lru_cache(maxsize=8)
+def _file_digest(path: str, mtime_ns: int, size: int) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def assets_fingerprint(template_path: str = TEMPLATE_PATH, font_path: str = FONT_PATH) -> str:
+    """Hash of the template and font files; re-read only when a file's mtime or size changes."""
+    digests = []
+    for path in (template_path, font_path):
+        st = os.stat(path)
+        digests.append(_file_digest(os.path.abspath(path), st.st_mtime_ns, st.st_size))
+    return f"{LAYOUT_VERSION}:" + ":".join(digests)
+
+
+def card_fingerprint(guest, assets: str | None = None) -> str:
+    """sha256 over everything that affects a guest's card pixels."""
+    parts = [
+        assets or assets_fingerprint(), guest.name or "", guest.card_type or "",
+        str(guest.visual_id), guest.qr_code_id or "",
+    ]
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+def stored_fingerprints(db, guest_ids=None) -> dict:
+    """{guest_id: (fingerprint, filename)} for the cards already uploaded."""
+    q = db.query(CardRender.guest_id, CardRender.fingerprint, CardRender.filename)
+    if guest_ids is None:
+        return {gid: (fp, fname) for gid, fp, fname in q}
+    guest_ids = list(guest_ids)
+    found = {}
+    for i in range(0, len(guest_ids), IN_CHUNK):
+        chunk = guest_ids[i:i + IN_CHUNK]
+        found.update({gid: (fp, fname) for gid, fp, fname in q.filter(CardRender.guest_id.in_(chunk))})
+    return found
+
+
+def save_fingerprints(db, rows: list):
+    """Record uploaded cards: rows of {guest_id, fingerprint, filename}. The caller commits."""
+    if not rows:
+        return
+    ids = [r["guest_id"] for r in rows]
+    for i in range(0, len(ids), IN_CHUNK):
+        db.execute(delete(CardRender).where(CardRender.guest_id.in_(ids[i:i + IN_CHUNK])))
+    db.execute(insert(CardRender), rows)
+
+
+_renderer = None
+_renderer_lock = threading.Lock()
+
+
+def get_card_renderer(template_path: str = TEMPLATE_PATH, font_path: str = FONT_PATH) -> CardRenderer:
+    """The process-wide renderer, built on first use (and rebuilt if the paths change)."""
+    global _renderer
+    with _renderer_lock:
+        if _renderer is None or (_renderer.template_path, _renderer.font_path) != (template_path, font_path):
+            _renderer = CardRenderer(template_path, font_path)
+        return _renderer
+
+
+def render_card(spec: dict, variants=None):
+    """
+    Render {name, card_type, visual_id, qr_code_id} with this process's renderer
+    (pool entry point): PNG bytes, or {variant: bytes} when variants are given.
+    """
+    if variants:
+        return _renderer.render_variants(spec, variants)
+    return _renderer.render_spec(spec)
+
+
+class CardRenderPool:
+    """
+    Renders batches of cards on `workers` processes. Each worker builds its
+    CardRenderer once, and finished cards are yielded as they complete so the
+    caller can upload them while the rest are still drawing. With `variants`
+    each card comes back as {variant: bytes} instead of PNG bytes.
+    """
+
+    def __init__(self, workers: int = RENDER_WORKERS, template_path: str = TEMPLATE_PATH,
+                 font_path: str = FONT_PATH, variants=None):
+        self.workers = max(1, workers)
+        self.variants = tuple(variants) if variants else None
+        self.template_path = os.path.abspath(template_path)
+        self.font_path = os.path.abspath(font_path)
+
+    def render(self, specs):
+        """
+        specs: iterable of (key, spec). Yields (key, card, error) in completion
+        order; exactly one of card / error is None.
+        """
+        if self.workers == 1:
+            yield from self._render_inline(specs)
+            return
+
+        # spawn, not fork: the web process runs job and I/O threads, and forking
+        # a threaded process can copy a held lock into the child.
+        ctx = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(self.workers, mp_context=ctx, initializer=get_card_renderer,
+                                 initargs=(self.template_path, self.font_path)) as pool:
+            specs = iter(specs)
+            pending = {}
+            limit = self.workers * IN_FLIGHT_PER_WORKER
+            exhausted = False
+            while True:
+                while not exhausted and len(pending) < limit:
+                    item = next(specs, None)
+                    if item is None:
+                        exhausted = True
+                        break
+                    key, spec = item
+                    pending[pool.submit(render_card, spec, self.variants)] = key
+                if not pending:
+                    return
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    key = pending.pop(future)
+                    try:
+                        yield key, future.result(), None
+                    except Exception as e:
+                        yield key, None, e
+
+    def _render_inline(self, specs):
+        renderer = get_card_renderer(self.template_path, self.font_path)
+        for key, spec in specs:
+            try:
+                card = renderer.render_variants(spec, self.variants) if self.variants else renderer.render_spec(spec)
+                yield key, card, None
+            except Exception as e:
+                yield key, None, e
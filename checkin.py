@@ -0,0 +1,227 @@
+# checkin.py — process-local check-in index for the gate scanners
+import logging
+import threading
+from datetime import datetime
+
+from sqlalchemy import case, func, select, update
+
+from models import Guest, CheckinEvent
+
+
+class CheckinIndex:
+    """
+    Warm, in-memory view of the guests table keyed by qr_code_id.
+    Holds only what the gate needs, so a scan's lookup never touches the database.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _entry(visual_id, name, card_type, group_size, checked_in_count) -> dict:
+        return {
+            "visual_id": visual_id,
+            "name": name,
+            "card_type": card_type,
+            "group_size": group_size if group_size is not None else 1,
+            "checked_in_count": checked_in_count or 0,
+        }
+
+    def load(self, db):
+        """(Re)build the whole index from the guests table in a single query."""
+        rows = db.query(
+            Guest.qr_code_id, Guest.visual_id, Guest.name,
+            Guest.card_type, Guest.group_size, Guest.checked_in_count,
+        ).all()
+        entries = {row[0]: self._entry(*row[1:]) for row in rows}
+        with self._lock:
+            self._entries = entries
+        logging.info(f"Check-in index loaded with {len(entries)} guests.")
+
+    def get(self, qr_code_id: str) -> dict | None:
+        with self._lock:
+            entry = self._entries.get(qr_code_id)
+            return dict(entry) if entry else None
+
+    def refresh(self, db, qr_code_id: str) -> dict | None:
+        """Reload a single entry from the database (or drop it if the guest is gone)."""
+        guest = db.query(Guest).filter_by(qr_code_id=qr_code_id).first()
+        if not guest:
+            self.discard(qr_code_id)
+            return None
+        self.put(guest)
+        return self.get(qr_code_id)
+
+    def lookup(self, db, qr_code_id: str) -> dict | None:
+        """Return the cached entry, falling back to the database on a miss."""
+        entry = self.get(qr_code_id)
+        if entry is None:
+            entry = self.refresh(db, qr_code_id)
+        return entry
+
+    def manifest(self) -> dict:
+        """Compact qr_code_id -> [allowance, checked_in, visual_id, name, card_type] map for scanners."""
+        with self._lock:
+            return {
+                qr: [e["group_size"], e["checked_in_count"], e["visual_id"], e["name"], e["card_type"]]
+                for qr, e in self._entries.items()
+            }
+
+    def put(self, guest):
+        entry = self._entry(guest.visual_id, guest.name, guest.card_type,
+                            guest.group_size, guest.checked_in_count)
+        with self._lock:
+            self._entries[guest.qr_code_id] = entry
+
+    def set_count(self, qr_code_id: str, checked_in_count: int):
+        with self._lock:
+            entry = self._entries.get(qr_code_id)
+            if entry:
+                entry["checked_in_count"] = checked_in_count
+
+    def discard(self, qr_code_id: str):
+        with self._lock:
+            self._entries.pop(qr_code_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries = {}
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+checkin_index = CheckinIndex()
+
+
+def apply_checkin(db, qr_code_id: str, when: datetime | None = None) -> tuple[int, int] | None:
+    """
+    Atomically admit one entry: bump checked_in_count only while it is below
+    group_size and read back (checked_in_count, group_size) in the same round trip.
+    Returns None if the card is unknown or has no entries left. Does not commit.
+    """
+    current = func.coalesce(Guest.checked_in_count, 0)
+    now_full = current + 1 >= Guest.group_size
+    stmt = (
+        update(Guest)
+        .where(Guest.qr_code_id == qr_code_id, current < Guest.group_size)
+        .values(
+            checked_in_count=current + 1,
+            has_entered=case((now_full, True), else_=Guest.has_entered),
+            entry_time=case((now_full, when or datetime.now()), else_=Guest.entry_time),
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+    if db.get_bind().dialect.update_returning:
+        # PostgreSQL and SQLite >= 3.35: UPDATE ... RETURNING
+        row = db.execute(stmt.returning(Guest.checked_in_count, Guest.group_size)).first()
+    else:
+        # Older SQLite: the UPDATE holds the write lock until commit, so reading
+        # the row back inside the same transaction still sees exactly our increment.
+        row = None
+        if db.execute(stmt).rowcount == 1:
+            row = db.execute(
+                select(Guest.checked_in_count, Guest.group_size)
+                .where(Guest.qr_code_id == qr_code_id)
+            ).first()
+    return (row[0], row[1]) if row else None
+
+
+def record_checkin(db, qr_code_id: str) -> tuple[int, int] | None:
+    """Admit one entry and commit it straight away (the live /update_status path)."""
+    result = apply_checkin(db, qr_code_id)
+    db.commit()
+    return result
+
+
+def _parse_scanned_at(value) -> datetime | None:
+    """Accept the device's ISO timestamp (e.g. from Date.toISOString) as naive local time."""
+    if not value:
+        return None
+    try:
+        when = datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+    if when.tzinfo is not None:
+        when = when.astimezone().replace(tzinfo=None)
+    return when
+
+
+def apply_scan_batch(db, device_id: str, scans: list) -> list:
+    """
+    Apply a batch of offline scans from one device in a single transaction.
+    Scans already seen (by scan_id) are reported back as duplicates with their
+    original outcome, so a device can safely resend its whole queue.
+    """
+    scans = [s for s in scans if isinstance(s, dict) and s.get("scan_id") and s.get("qr_code_id")]
+    scan_ids = list(dict.fromkeys(s["scan_id"] for s in scans))
+    if not scans:
+        return []
+
+    seen = {
+        e.scan_id: e for e in
+        db.query(CheckinEvent).filter(CheckinEvent.scan_id.in_(scan_ids)).all()
+    }
+    guests = {
+        row.qr_code_id: row for row in
+        db.query(Guest.qr_code_id, Guest.visual_id, Guest.name, Guest.group_size)
+        .filter(Guest.qr_code_id.in_({s["qr_code_id"] for s in scans})).all()
+    }
+
+    results = {}
+    pending = []
+    for scan in scans:
+        if scan["scan_id"] in results:
+            continue
+        if scan["scan_id"] in seen:
+            event = seen[scan["scan_id"]]
+            results[scan["scan_id"]] = _scan_result(event, guests.get(event.qr_code_id), duplicate=True)
+        else:
+            results[scan["scan_id"]] = None
+            pending.append(scan)
+
+    # Earliest scans first, so entry_time and "who got the last seat" follow the door.
+    pending.sort(key=lambda s: _parse_scanned_at(s.get("scanned_at")) or datetime.max)
+    admitted = []
+    for scan in pending:
+        when = _parse_scanned_at(scan.get("scanned_at"))
+        guest = guests.get(scan["qr_code_id"])
+        result = apply_checkin(db, scan["qr_code_id"], when) if guest else None
+        if result:
+            status, count = "admitted", result[0]
+            admitted.append((scan["qr_code_id"], count))
+        else:
+            status, count = ("full" if guest else "not_found"), None
+        event = CheckinEvent(
+            scan_id=scan["scan_id"], device_id=device_id, qr_code_id=scan["qr_code_id"],
+            scanned_at=when, status=status, checked_in_count=count,
+        )
+        db.add(event)
+        results[scan["scan_id"]] = _scan_result(event, guest)
+
+    db.commit()
+
+    for qr_code_id, count in admitted:
+        checkin_index.set_count(qr_code_id, count)
+    return [results[scan_id] for scan_id in scan_ids]
+
+
+def _scan_result(event, guest, duplicate: bool = False) -> dict:
+    remaining = None
+    if event.status == "admitted" and guest:
+        remaining = guest.group_size - event.checked_in_count
+    elif event.status == "full":
+        remaining = 0
+    return {
+        "scan_id": event.scan_id,
+        "qr_code_id": event.qr_code_id,
+        "status": event.status,
+        "duplicate": duplicate,
+        "checked_in_count": event.checked_in_count,
+        "remaining_entries": remaining,
+        "name": guest.name if guest else None,
+        "visual_id": guest.visual_id if guest else None,
+    }
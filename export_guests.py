@@ -1,23 +1,52 @@
-import sqlite3
-import csv
+# export_guests.py — command-line guest export (CSV or Parquet), streamed from the database like /export/guests.*
+#
+#   python export_guests.py guests.csv
+#   python export_guests.py failed.csv --whatsapp failed --columns visual_id,name,phone,whatsapp_error
+#   DATABASE_URL=postgresql://... python export_guests.py guests.parquet --entered yes
+import argparse
+import os
+import sys
 
-def export_guests_to_csv(csv_file_path):
-    conn = sqlite3.connect('guests.db')
-    cursor = conn.cursor()
+from exports import DEFAULT_EXPORT_COLUMNS, EXPORT_COLUMNS, export_query, stream_csv, stream_parquet
+from models import init_db
 
-    cursor.execute('SELECT id, name, phone, qr_code_id, has_entered, qr_image_base64 FROM guests')
-    guests = cursor.fetchall()
 
-    with open(csv_file_path, 'w', newline='') as file:
-        writer = csv.writer(file)
-        # Write header
-        writer.writerow(['id', 'name', 'phone', 'qr_code_id', 'has_entered', 'qr_image_base64'])
-        # Write data
-        writer.writerows(guests)
+def database_url() -> str:
+    url = os.getenv("DATABASE_URL") or "sqlite:///./guests.db"
+    return url.replace("postgres://", "postgresql://", 1) if url.startswith("postgres://") else url
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Export guests to CSV or Parquet")
+    parser.add_argument("output", help="file to write; '-' for stdout. .parquet selects Parquet")
+    parser.add_argument("--format", choices=("csv", "parquet"), help="defaults to the output file's extension")
+    parser.add_argument("--columns", default=",".join(DEFAULT_EXPORT_COLUMNS),
+                        help=f"comma-separated, from: {', '.join(EXPORT_COLUMNS)}")
+    parser.add_argument("--entered", choices=("yes", "no"), default="")
+    parser.add_argument("--card-type", default="")
+    parser.add_argument("--whatsapp", choices=("sent", "failed", "pending"), default="")
+    parser.add_argument("-q", "--query", default="", help="name or phone contains")
+    args = parser.parse_args(argv)
+
+    fmt = args.format or ("parquet" if args.output.endswith(".parquet") else "csv")
+    init_db(database_url())
+    try:
+        columns, stmt = export_query([c.strip() for c in args.columns.split(",") if c.strip()],
+                                     entered=args.entered, card_type=args.card_type,
+                                     whatsapp=args.whatsapp, q=args.query)
+    except ValueError as e:
+        parser.error(str(e))
+
+    chunks = stream_csv(columns, stmt) if fmt == "csv" else stream_parquet(columns, stmt)
+    out = sys.stdout.buffer if args.output == "-" else open(args.output, "wb")
+    try:
+        for chunk in chunks:
+            out.write(chunk)
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+    return 0
 
-    conn.close()
-    print("✅ Guests exported successfully!")
 
-# Usage
 if __name__ == "__main__":
-    export_guests_to_csv('exported_guests_with_qr.csv')
+    sys.exit(main())
@@ -0,0 +1,322 @@
+# exports.py — streamed guest exports: the Excel report, and CSV / Parquet dumps with column and row filters
+import csv
+import queue
+import threading
+from datetime import datetime
+from io import StringIO
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.formatting.rule import CellIsRule
+from openpyxl.styles import Font, PatternFill
+from openpyxl.utils import get_column_letter
+from sqlalchemy import func, or_, select
+
+from models import Guest, get_db_session
+from stats import guest_stats
+
+XLSX_MIMETYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+CHUNK_SIZE = 64 * 1024       # bytes per response chunk
+QUEUE_CHUNKS = 8             # chunks the saver may run ahead of a slow client
+YIELD_PER = 1000             # guest rows fetched per round trip (server-side cursor on PostgreSQL)
+
+REPORT_HEADERS = ["ID", "Name", "Phone", "QR Code ID", "Has Entered", "Entry Time", "Visual ID", "Card Type",
+                  "Group Size"]
+ENTRY_TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Columns a CSV / Parquet export may ask for, in their default order
+EXPORT_COLUMNS = {
+    "id": Guest.id, "visual_id": Guest.visual_id, "name": Guest.name, "phone": Guest.phone,
+    "qr_code_id": Guest.qr_code_id, "qr_code_url": Guest.qr_code_url, "card_type": Guest.card_type,
+    "group_size": Guest.group_size, "has_entered": Guest.has_entered, "entry_time": Guest.entry_time,
+    "checked_in_count": Guest.checked_in_count, "whatsapp_sent": Guest.whatsapp_sent,
+    "whatsapp_sent_at": Guest.whatsapp_sent_at, "whatsapp_error": Guest.whatsapp_error,
+}
+DEFAULT_EXPORT_COLUMNS = ("visual_id", "name", "phone", "qr_code_id", "card_type", "group_size", "has_entered",
+                          "entry_time", "checked_in_count", "whatsapp_sent")
+EXPORT_MIMETYPES = {"csv": "text/csv; charset=utf-8", "parquet": "application/vnd.apache.parquet"}
+WHATSAPP_STATES = ("sent", "failed", "pending")
+
+_DONE = object()
+
+
+class _Abandoned(Exception):
+    """The client went away; stop writing the workbook."""
+
+
+class _QueueSink:
+    """Write-only file object for ZipFile: gathers output into CHUNK_SIZE pieces on a bounded queue."""
+
+    def __init__(self, chunks: queue.Queue, stop: threading.Event, chunk_size: int):
+        self.chunks = chunks
+        self.stop = stop
+        self.chunk_size = chunk_size
+        self.buffer = bytearray()
+        self.abandoned = False
+
+    def write(self, data) -> int:
+        if self.abandoned:      # ZipFile still writes its trailer when it is collected
+            return len(data)
+        self.buffer += data
+        if len(self.buffer) >= self.chunk_size:
+            self.flush()
+        return len(data)
+
+    def flush(self):
+        if self.buffer and not self.abandoned:
+            self.put(bytes(self.buffer))
+            self.buffer.clear()
+
+    def put(self, item):
+        while not self.stop.is_set():
+            try:
+                self.chunks.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+        self.abandoned = True
+        raise _Abandoned()
+
+
+def stream_workbook(wb: Workbook, chunk_size: int = CHUNK_SIZE):
+    """
+    Save `wb` on a helper thread and yield the .xlsx bytes as ZipFile writes
+    them, so nothing holds the whole file. Closing the generator early (the
+    client disconnected) stops the save.
+    """
+    chunks = queue.Queue(QUEUE_CHUNKS)
+    stop = threading.Event()
+    sink = _QueueSink(chunks, stop, chunk_size)
+
+    def save():
+        try:
+            wb.save(sink)
+            sink.flush()
+            sink.put(_DONE)
+        except _Abandoned:
+            pass
+        except Exception as e:
+            try:
+                sink.put(e)
+            except _Abandoned:
+                pass
+
+    thread = threading.Thread(target=save, name="xlsx-export", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = chunks.get()
+            if item is _DONE:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+
+def report_column_widths(db, summary_rows) -> list:
+    """
+    Width of every report column, from the header, the summary block and one
+    aggregate over the guests. Write-only sheets emit their column widths
+    before the first row, so they cannot be measured from the rows as they stream.
+    """
+    longest = lambda column: func.max(func.length(column))
+    row = db.execute(select(
+        func.max(Guest.id), longest(Guest.name), longest(Guest.phone), longest(Guest.qr_code_id),
+        func.count(Guest.entry_time), func.max(Guest.visual_id), longest(Guest.card_type), func.max(Guest.group_size),
+    )).one()
+    max_id, name, phone, qr_code_id, entry_times, max_visual_id, card_type, max_group = row
+    data = [
+        len(str(max_id or "")), name or 0, phone or 0, qr_code_id or 0, len("Not Entered"),
+        len(datetime(2000, 1, 1).strftime(ENTRY_TIME_FORMAT)) if entry_times else 0,
+        len(str(max_visual_id or "")), card_type or 0, len(str(max_group or "")),
+    ]
+    widths = [max(len(header), length) for header, length in zip(REPORT_HEADERS, data)]
+    widths[0] = max(widths[0], len("Guest Summary Report"), *(len(label) for label, _ in summary_rows))
+    widths[1] = max(widths[1], *(len(str(value)) for _, value in summary_rows))
+    return [w + 2 for w in widths]
+
+
+def guest_report_xlsx(yield_per: int = YIELD_PER, chunk_size: int = CHUNK_SIZE):
+    """
+    The guest report workbook as a stream of bytes. Guests are read in
+    batches of `yield_per` straight into a write-only sheet (spooled to a temp
+    file by openpyxl), so memory stays flat however long the list is.
+    """
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Guest Report")
+    bold = Font(bold=True)
+
+    def styled(value, font):
+        cell = WriteOnlyCell(ws, value=value)
+        cell.font = font
+        return cell
+
+    with get_db_session() as db:
+        stats = guest_stats(db)
+        summary_rows = [
+            ("Total Guests", stats["total_guests"]), ("Single Cards", stats["single_cards"]),
+            ("Double Cards", stats["double_cards"]), ("Family Cards", stats["family_cards"]),
+            ("Total Allowed by Family Cards", stats["total_family_allowed"]),
+            ("Guests Entered", stats["entered_guests"]), ("Guests Not Entered", stats["not_entered_guests"]),
+        ]
+        for i, width in enumerate(report_column_widths(db, summary_rows), start=1):
+            ws.column_dimensions[get_column_letter(i)].width = width
+
+        ws.append([styled("Guest Summary Report", Font(size=14, bold=True))])
+        ws.append([])
+        for label, value in summary_rows:
+            ws.append([styled(label, bold), value])
+        ws.append([])
+        ws.append([styled(header, bold) for header in REPORT_HEADERS])
+        first_data_row = len(summary_rows) + 5
+
+        guests = (select(Guest.id, Guest.name, Guest.phone, Guest.qr_code_id, Guest.has_entered, Guest.entry_time,
+                         Guest.visual_id, Guest.card_type, Guest.group_size)
+                  .order_by(Guest.id)
+                  .execution_options(yield_per=yield_per))
+        count = 0
+        for g in db.execute(guests):
+            ws.append([
+                g.id, g.name, g.phone, g.qr_code_id, "Entered" if g.has_entered else "Not Entered",
+                g.entry_time.strftime(ENTRY_TIME_FORMAT) if g.entry_time else "",
+                g.visual_id, g.card_type, g.group_size,
+            ])
+            count += 1
+
+    if count:
+        rng = f"E{first_data_row}:E{first_data_row + count - 1}"
+        ws.conditional_formatting.add(rng, CellIsRule(operator="equal", formula=['"Entered"'],
+            fill=PatternFill(start_color="C6EFCE", end_color="C6EFCE", fill_type="solid")))
+        ws.conditional_formatting.add(rng, CellIsRule(operator="equal", formula=['"Not Entered"'],
+            fill=PatternFill(start_color="FFC7CE", end_color="FFC7CE", fill_type="solid")))
+
+    yield from stream_workbook(wb, chunk_size)
+
+
+def export_query(columns=None, entered: str = "", card_type: str = "", whatsapp: str = "", q: str = ""):
+    """
+    SELECT for a guest export, ordered by id and fetched YIELD_PER rows at a
+    time. entered: yes|no, whatsapp: sent|failed|pending (as on the send
+    dashboard), q: name or phone substring. Raises ValueError on unknown
+    columns or filter values.
+    """
+    columns = list(columns or DEFAULT_EXPORT_COLUMNS)
+    unknown = [c for c in columns if c not in EXPORT_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown column(s): {', '.join(unknown)}. Available: {', '.join(EXPORT_COLUMNS)}")
+    stmt = select(*(EXPORT_COLUMNS[c] for c in columns))
+
+    entered = (entered or "").strip().lower()
+    if entered == "yes":
+        stmt = stmt.where(Guest.has_entered.is_(True))
+    elif entered == "no":
+        stmt = stmt.where(~Guest.has_entered.is_(True))
+    elif entered:
+        raise ValueError("entered must be yes or no")
+
+    card_type = (card_type or "").strip().lower()
+    if card_type:
+        stmt = stmt.where(func.lower(func.trim(Guest.card_type)) == card_type)
+
+    whatsapp = (whatsapp or "").strip().lower()
+    sent = Guest.whatsapp_sent.is_(True)
+    has_error = func.coalesce(Guest.whatsapp_error, "") != ""
+    if whatsapp == "sent":
+        stmt = stmt.where(sent)
+    elif whatsapp == "failed":
+        stmt = stmt.where(~sent, has_error)
+    elif whatsapp == "pending":
+        stmt = stmt.where(~sent, ~has_error)
+    elif whatsapp:
+        raise ValueError(f"whatsapp must be one of {', '.join(WHATSAPP_STATES)}")
+
+    q = (q or "").strip()
+    if q:
+        stmt = stmt.where(or_(Guest.name.ilike(f"%{q}%"), Guest.phone.ilike(f"%{q}%")))
+    return columns, stmt.order_by(Guest.id).execution_options(yield_per=YIELD_PER)
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, datetime):
+        return value.strftime(ENTRY_TIME_FORMAT)
+    return value
+
+
+def stream_csv(columns, stmt):
+    """CSV bytes: the header at once, then one chunk per YIELD_PER rows read from the cursor."""
+    buf = StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(columns)
+    yield buf.getvalue().encode("utf-8")
+    with get_db_session() as db:
+        for rows in db.execute(stmt).partitions():
+            buf.seek(0)
+            buf.truncate()
+            writer.writerows([_csv_value(v) for v in row] for row in rows)
+            yield buf.getvalue().encode("utf-8")
+
+
+def parquet_available() -> bool:
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class _ChunkSink:
+    """Append-only file object that hands back whatever was written since the last take()."""
+
+    closed = False
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.position = 0
+
+    def write(self, data) -> int:
+        self.buffer += data
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self):
+        pass
+
+    def take(self) -> bytes:
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+
+def stream_parquet(columns, stmt):
+    """
+    Parquet bytes, one zstd-compressed row group per YIELD_PER rows, so memory
+    holds a single batch. Needs pyarrow, which is optional (see parquet_available).
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    arrow_types = {int: pa.int64(), str: pa.string(), bool: pa.bool_(), datetime: pa.timestamp("us")}
+    schema = pa.schema([(c, arrow_types[EXPORT_COLUMNS[c].type.python_type]) for c in columns])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    try:
+        with get_db_session() as db:
+            for rows in db.execute(stmt).partitions():
+                writer.write_batch(pa.RecordBatch.from_arrays(
+                    [pa.array(values, type=field.type) for values, field in zip(zip(*rows), schema)],
+                    schema=schema,
+                ))
+                yield sink.take()
+    finally:
+        writer.close()
+    yield sink.take()
@@ -0,0 +1,100 @@
+# importer.py — bulk guest import from the uploaded CSV
+import csv
+import logging
+from io import StringIO
+
+from sqlalchemy import func, insert, text
+from sqlalchemy.exc import IntegrityError
+
+from models import Guest
+
+IN_CHUNK = 500          # phones per IN (...) lookup, well under every driver's parameter limit
+INSERT_RETRIES = 3      # another import may grab the same visual_id block first
+
+
+def _get_row(row, *keys):
+    for k in keys:
+        v = row.get(k) or row.get(k.lower()) or row.get(k.capitalize())
+        if v:
+            return v.strip()
+    return ""
+
+
+def _normalize(raw):
+    raw = (raw or "").strip().lower()
+    if raw in ["s", "single"]: return "single"
+    if raw in ["d", "double"]: return "double"
+    if raw in ["f", "family", "group"]: return "family"
+    return "single"
+
+
+def parse_guest_csv(content: str) -> tuple[list, int]:
+    """
+    Parse the whole upload into guest rows (name, phone, card_type, group_size).
+    Returns (rows, skipped) where skipped counts rows without a phone and
+    repeats of a phone earlier in the same file.
+    """
+    rows, seen, skipped = [], set(), 0
+    for row in csv.DictReader(StringIO(content)):
+        name = _get_row(row, "name", "Name")
+        phone = _get_row(row, "phone", "Phone")
+        if not phone or phone in seen:
+            skipped += 1
+            continue
+        seen.add(phone)
+
+        card_type = _normalize(_get_row(row, "Card Type", "card_type", "type"))
+        if card_type == "single":
+            group_size = 1
+        elif card_type == "double":
+            group_size = 2
+        else:
+            try:
+                group_size = max(1, int(_get_row(row, "Allowed", "allowed", "Size", "size", "Group Size", "group_size")))
+            except ValueError:
+                group_size = 1
+
+        rows.append({"name": name, "phone": phone, "card_type": card_type, "group_size": group_size})
+    return rows, skipped
+
+
+def existing_phones(db, phones) -> set:
+    phones = list(phones)
+    found = set()
+    for i in range(0, len(phones), IN_CHUNK):
+        chunk = phones[i:i + IN_CHUNK]
+        found.update(p for (p,) in db.query(Guest.phone).filter(Guest.phone.in_(chunk)))
+    return found
+
+
+def import_guests(db, rows: list) -> tuple[list, int]:
+    """
+    Insert new guests in bulk: one set-based duplicate check, one MAX(visual_id)
+    to reserve a contiguous block, one executemany INSERT, one commit.
+    QR codes are not generated here; callers hand the returned rows to a background stage.
+    Returns (inserted_rows, skipped_existing).
+    """
+    known = existing_phones(db, (r["phone"] for r in rows))
+    fresh = [r for r in rows if r["phone"] not in known]
+    if not fresh:
+        return [], len(rows)
+
+    for attempt in range(1, INSERT_RETRIES + 1):
+        try:
+            if db.get_bind().dialect.name == "postgresql":
+                # Serialise concurrent imports so two uploads never reserve the same block.
+                db.execute(text("SELECT pg_advisory_xact_lock(hashtext('guests.visual_id'))"))
+            start = (db.query(func.max(Guest.visual_id)).scalar() or 0) + 1
+            inserted = [
+                dict(r, visual_id=visual_id, qr_code_id=f"GUEST-{visual_id:04d}",
+                     qr_code_url="", checked_in_count=0)
+                for visual_id, r in enumerate(fresh, start=start)
+            ]
+            db.execute(insert(Guest), inserted)
+            db.commit()
+            return inserted, len(rows) - len(fresh)
+        except IntegrityError:
+            db.rollback()
+            if attempt == INSERT_RETRIES:
+                raise
+            logging.warning(f"visual_id block starting at {start} was taken; retrying import.")
@@ -0,0 +1,206 @@
+# jobs.py — persistent background job queue for long-running admin actions
+import json
+import logging
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update
+
+from models import Job, get_db_session
+
+POLL_INTERVAL = 1.0          # seconds an idle worker waits before looking for work again
+PROGRESS_EVERY = 0.5         # seconds between progress writes from a busy job
+STALE_AFTER = 600            # seconds without a heartbeat before a running job is requeued
+STALE_SWEEP_EVERY = STALE_AFTER / 4   # seconds between stale-job sweeps while workers are running
+MAX_ATTEMPTS = 3
+
+
+class JobContext:
+    """Handed to a job handler so it can report progress (throttled to a few writes a second)."""
+
+    def __init__(self, job_id: str, params: dict):
+        self.id = job_id
+        self.params = params
+        self._last_write = 0.0
+
+    def progress(self, done: int, total: int | None = None, message: str | None = None, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self._last_write < PROGRESS_EVERY:
+            return
+        self._last_write = now
+        values = {"progress": done, "heartbeat_at": datetime.now()}
+        if total is not None:
+            values["total"] = total
+        if message is not None:
+            values["message"] = message[:500]
+        with get_db_session() as db:
+            db.execute(update(Job).where(Job.id == self.id).values(**values))
+            db.commit()
+
+
+class JobQueue:
+    """
+    Jobs live in the `jobs` table, so they survive restarts and are shared by
+    every gunicorn worker; each process runs a small pool of threads that claim
+    and execute them. Routes enqueue and return immediately, and pages poll
+    /jobs/<id> for progress.
+    """
+
+    def __init__(self, workers: int = 2, poll_interval: float = POLL_INTERVAL):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.autostart = True
+        self._handlers = {}
+        self._threads = []
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._next_sweep = 0.0
+
+    def handler(self, kind: str):
+        """Register fn(ctx) -> result dict as the handler for a job kind."""
+        def register(fn):
+            self._handlers[kind] = fn
+            return fn
+        return register
+
+    # -- producer side -----------------------------------------------------
+
+    def enqueue(self, kind: str, **params) -> str:
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        job_id = uuid.uuid4().hex
+        with get_db_session() as db:
+            db.add(Job(id=job_id, kind=kind, status="queued", params=json.dumps(params),
+                       progress=0, total=0, attempts=0, created_at=datetime.now()))
+            db.commit()
+        self._ensure_started()
+        self._wake.set()
+        return job_id
+
+    def get(self, job_id: str) -> dict | None:
+        self._ensure_started()
+        with get_db_session() as db:
+            job = db.get(Job, job_id)
+            return job_to_dict(job) if job else None
+
+    def recent(self, limit: int = 10, active_only: bool = False) -> list:
+        self._ensure_started()
+        with get_db_session() as db:
+            q = db.query(Job)
+            if active_only:
+                q = q.filter(Job.status.in_(("queued", "running")))
+            return [job_to_dict(j) for j in q.order_by(Job.created_at.desc()).limit(limit)]
+
+    # -- consumer side -----------------------------------------------------
+
+    def claim(self) -> Job | None:
+        """Atomically move the oldest queued job to running; None if there is nothing to do."""
+        with get_db_session() as db:
+            while True:
+                job_id = db.execute(
+                    select(Job.id).where(Job.status == "queued").order_by(Job.created_at).limit(1)
+                ).scalar()
+                if not job_id:
+                    return None
+                now = datetime.now()
+                claimed = db.execute(
+                    update(Job)
+                    .where(Job.id == job_id, Job.status == "queued")
+                    .values(status="running", started_at=now, heartbeat_at=now, attempts=Job.attempts + 1)
+                ).rowcount
+                db.commit()
+                if claimed:
+                    job = db.get(Job, job_id)
+                    db.expunge(job)
+                    return job
+                # Another worker took it first; look again.
+
+    def run_one(self) -> bool:
+        job = self.claim()
+        if not job:
+            return False
+        ctx = JobContext(job.id, json.loads(job.params or "{}"))
+        values = {}
+        try:
+            result = self._handlers[job.kind](ctx)
+            values.update(status="done", result=json.dumps(result or {}), message="Done")
+        except Exception as e:
+            logging.error(f"Job {job.kind} {job.id} failed: {e}", exc_info=True)
+            values.update(status="failed", error=str(e)[:500], message="Failed")
+        values["finished_at"] = datetime.now()
+        with get_db_session() as db:
+            db.execute(update(Job).where(Job.id == job.id).values(**values))
+            db.commit()
+        return True
+
+    def run_pending(self):
+        """Drain the queue on the calling thread (tests and one-off scripts)."""
+        while self.run_one():
+            pass
+
+    def requeue_stale(self):
+        """Put back jobs whose worker died mid-run (no heartbeat for STALE_AFTER seconds)."""
+        cutoff = datetime.now() - timedelta(seconds=STALE_AFTER)
+        with get_db_session() as db:
+            stale = (Job.status == "running") & (Job.heartbeat_at < cutoff)
+            db.execute(update(Job).where(stale, Job.attempts >= MAX_ATTEMPTS)
+                       .values(status="failed", error="Worker stopped responding.", finished_at=datetime.now()))
+            requeued = db.execute(update(Job).where(stale).values(status="queued")).rowcount
+            db.commit()
+        if requeued:
+            logging.warning(f"Requeued {requeued} stale job(s).")
+
+    def _ensure_started(self):
+        if not self.autostart:
+            return
+        with self._lock:
+            self._threads = [t for t in self._threads if t.is_alive()]
+            if self._threads:
+                return
+            self._sweep_stale(force=True)
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _sweep_stale(self, force: bool = False):
+        """requeue_stale every STALE_SWEEP_EVERY seconds, not just at startup: a worker may die after we started."""
+        now = time.monotonic()
+        if not force and now < self._next_sweep:
+            return
+        self._next_sweep = now + STALE_SWEEP_EVERY
+        try:
+            self.requeue_stale()
+        except Exception as e:
+            logging.warning(f"Could not requeue stale jobs: {e}")
+
+    def _work(self):
+        while True:
+            self._sweep_stale()
+            try:
+                if self.run_one():
+                    continue
+            except Exception as e:
+                logging.warning(f"Job worker error: {e}")
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+
+def job_to_dict(job) -> dict:
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "progress": job.progress or 0,
+        "total": job.total or 0,
+        "message": job.message,
+        "error": job.error,
+        "result": json.loads(job.result) if job.result else None,
+        "created_at": job.created_at.isoformat(timespec="seconds") if job.created_at else None,
+        "finished_at": job.finished_at.isoformat(timespec="seconds") if job.finished_at else None,
+    }
+
+
+job_queue = JobQueue()
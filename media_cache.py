@@ -0,0 +1,73 @@
+# media_cache.py — reuse WhatsApp media ids for card images Meta already holds
+import hashlib
+import logging
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, update
+from sqlalchemy.exc import IntegrityError
+
+from models import WhatsAppMedia, get_db_session
+
+# Cloud API media stays retrievable for 30 days; stop reusing an id a day early.
+MEDIA_TTL = timedelta(days=float(os.getenv("WHATSAPP_MEDIA_TTL_DAYS", "29")))
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class MediaCache:
+    """
+    Media ids keyed by the sha256 of the uploaded bytes, kept in the
+    whatsapp_media table so every gunicorn worker shares them. Hits and
+    uploads are counted per row for the send dashboard.
+    """
+
+    def __init__(self, ttl: timedelta = MEDIA_TTL):
+        self.ttl = ttl
+
+    def lookup(self, digest: str) -> str | None:
+        """A still-valid media id for these bytes (counted as a hit), or None."""
+        with get_db_session() as db:
+            updated = db.execute(
+                update(WhatsAppMedia)
+                .where(WhatsAppMedia.content_hash == digest, WhatsAppMedia.expires_at > datetime.now())
+                .values(hits=WhatsAppMedia.hits + 1)
+            )
+            if not updated.rowcount:
+                return None
+            media_id = db.get(WhatsAppMedia, digest).media_id
+            db.commit()
+            return media_id
+
+    def store(self, digest: str, media_id: str):
+        now = datetime.now()
+        values = {"media_id": media_id, "uploaded_at": now, "expires_at": now + self.ttl}
+        with get_db_session() as db:
+            refresh = (update(WhatsAppMedia).where(WhatsAppMedia.content_hash == digest)
+                       .values(uploads=WhatsAppMedia.uploads + 1, **values))
+            if not db.execute(refresh).rowcount:
+                try:
+                    db.add(WhatsAppMedia(content_hash=digest, uploads=1, hits=0, **values))
+                    db.commit()
+                    return
+                except IntegrityError:      # another worker uploaded the same card meanwhile
+                    db.rollback()
+                    db.execute(refresh)
+            db.commit()
+
+    def forget(self, digest: str):
+        """Drop an id Meta no longer accepts."""
+        with get_db_session() as db:
+            db.query(WhatsAppMedia).filter(WhatsAppMedia.content_hash == digest).delete()
+            db.commit()
+        logging.info(f"Dropped stale WhatsApp media for {digest[:12]}")
+
+    def counts(self, db) -> dict:
+        hits, uploads = db.query(func.coalesce(func.sum(WhatsAppMedia.hits), 0),
+                                 func.coalesce(func.sum(WhatsAppMedia.uploads), 0)).one()
+        return {"hits": int(hits), "misses": int(uploads)}
+
+
+media_cache = MediaCache()
@@ -0,0 +1,138 @@
+# mock_graph.py — local stand-in for the WhatsApp Cloud (Graph) API, for tests and load runs
+#
+#   python mock_graph.py 8765 --latency 0.05 --rate 80
+#   WHATSAPP_API_BASE=http://127.0.0.1:8765/v19.0 gunicorn app:app
+import argparse
+import json
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_PATH = re.compile(r"^/[^/]+/(?P<phone_id>[^/]+)/(?P<endpoint>media|messages)$")
+
+
+class MockGraphServer:
+    """
+    Serves POST /<version>/<phone_id>/media and /messages in a background thread.
+    `latency` delays every response, `rate` answers 429 above that many
+    messages/s, and `fail_next` makes the next N calls return 500. With an
+    ssl.SSLContext it serves HTTPS; `connections` counts the TCP connections accepted.
+    """
+
+    def __init__(self, port: int = 0, latency: float = 0.0, rate: float | None = None, ssl_context=None):
+        self.latency = latency
+        self.rate = rate
+        self.fail_next = 0
+        self.media = {}          # media_id -> size in bytes
+        self.messages = []       # payloads accepted by /messages
+        self.rejected = 0
+        self.connections = 0
+        self._window = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._server.daemon_threads = True
+        self.scheme = "http"
+        if ssl_context is not None:
+            self._server.socket = ssl_context.wrap_socket(self._server.socket, server_side=True)
+            self.scheme = "https"
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"{self.scheme}://{host}:{port}/v19.0"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _over_rate(self) -> bool:
+        if self.rate is None:
+            return False
+        now = time.monotonic()
+        self._window = [t for t in self._window if t > now - 1.0]
+        if len(self._window) >= self.rate:
+            return True
+        self._window.append(now)
+        return False
+
+    def _respond(self, endpoint: str, body: bytes):
+        with self._lock:
+            if self.fail_next > 0:
+                self.fail_next -= 1
+                return 500, {"error": {"message": "Service temporarily unavailable", "code": 2}}
+            if endpoint == "messages" and self._over_rate():
+                self.rejected += 1
+                return 429, {"error": {"message": "Rate limit hit", "code": 130429}}
+            if endpoint == "media":
+                media_id = uuid.uuid4().hex
+                self.media[media_id] = len(body)
+                return 200, {"id": media_id}
+            payload = json.loads(body)
+            if payload.get("image", {}).get("id") not in self.media:
+                return 400, {"error": {"message": "Invalid media id", "code": 131053}}
+            self.messages.append(payload)
+            return 200, {"messaging_product": "whatsapp", "contacts": [{"wa_id": payload["to"]}],
+                         "messages": [{"id": f"wamid.{uuid.uuid4().hex}"}]}
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True      # headers and body go out as separate writes
+
+            def setup(self):
+                with server._lock:
+                    server.connections += 1
+                super().setup()
+
+            def do_POST(self):
+                match = _PATH.match(self.path)
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if server.latency:
+                    time.sleep(server.latency)
+                if not match:
+                    status, reply = 404, {"error": {"message": "Unknown path", "code": 100}}
+                else:
+                    status, reply = server._respond(match["endpoint"], body)
+                data = json.dumps(reply).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                if status == 429:
+                    self.send_header("Retry-After", "1")
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local mock of the WhatsApp Cloud API")
+    parser.add_argument("port", type=int, nargs="?", default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--rate", type=float, default=None, help="messages/s before answering 429")
+    args = parser.parse_args()
+    mock = MockGraphServer(args.port, args.latency, args.rate)
+    print(f"Mock Graph API on {mock.base_url}")
+    try:
+        mock._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, Column, Integer, String, Boolean, DateTime
+from sqlalchemy import create_engine, Column, Integer, String, Boolean, DateTime, Text, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from datetime import datetime
@@ -82,9 +82,119 @@ class Guest(Base):
         session.commit()
 
 
+class CheckinEvent(Base):
+    """One scan reported by a gate device; scan_id makes batch syncs idempotent."""
+    __tablename__ = 'checkin_events'
+
+    id = Column(Integer, primary_key=True)
+    scan_id = Column(String, unique=True, nullable=False)    # generated on the device
+    device_id = Column(String, nullable=True)
+    qr_code_id = Column(String, nullable=False, index=True)
+    scanned_at = Column(DateTime, nullable=True)
+    synced_at = Column(DateTime, default=datetime.now)
+    status = Column(String, nullable=False)                  # admitted / full / not_found
+    checked_in_count = Column(Integer, nullable=True)        # count after this scan, if admitted
+
+    def __repr__(self):
+        return (
+            f"<CheckinEvent(scan_id='{self.scan_id}', qr_code_id='{self.qr_code_id}', "
+            f"status='{self.status}')>"
+        )
+
+
+class Job(Base):
+    """A background task (card generation, bulk send, exports...) and its progress."""
+    __tablename__ = 'jobs'
+
+    id = Column(String, primary_key=True)                    # uuid4 hex
+    kind = Column(String, nullable=False)
+    status = Column(String, nullable=False, default='queued', index=True)  # queued / running / done / failed
+    params = Column(Text, nullable=True)                     # JSON
+    result = Column(Text, nullable=True)                     # JSON
+    progress = Column(Integer, default=0)
+    total = Column(Integer, default=0)
+    message = Column(String, nullable=True)
+    error = Column(String, nullable=True)
+    attempts = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.now)
+    started_at = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<Job(id='{self.id}', kind='{self.kind}', status='{self.status}', {self.progress}/{self.total})>"
+
+
+class CardRender(Base):
+    """Fingerprint of the card last uploaded for a guest, so unchanged cards are not redrawn."""
+    __tablename__ = 'card_renders'
+
+    guest_id = Column(Integer, primary_key=True)             # guests.id
+    fingerprint = Column(String(64), nullable=False)         # sha256 hex of everything that affects the pixels
+    filename = Column(String, nullable=False)                # object name in the cards bucket
+    rendered_at = Column(DateTime, default=datetime.now)
+
+    def __repr__(self):
+        return f"<CardRender(guest_id={self.guest_id}, fingerprint='{self.fingerprint[:12]}')>"
+
+
 def create_guest(session, **kwargs):
     guest = Guest(**kwargs)
     session.add(guest)
     session.commit()
     session.refresh(guest)
-    return guest
\ No newline at end of file
+    return guest
+
+class WhatsAppMedia(Base):
+    """A card image already uploaded to Meta, so resends reuse its media id instead of uploading again."""
+    __tablename__ = 'whatsapp_media'
+
+    content_hash = Column(String(64), primary_key=True)      # sha256 hex of the image bytes
+    media_id = Column(String, nullable=False)
+    uploaded_at = Column(DateTime, default=datetime.now)
+    expires_at = Column(DateTime, nullable=False)
+    uploads = Column(Integer, default=0)                     # cache misses: times these bytes were uploaded
+    hits = Column(Integer, default=0)                        # sends that reused media_id
+
+    def __repr__(self):
+        return f"<WhatsAppMedia(hash='{self.content_hash[:12]}', media_id='{self.media_id}', hits={self.hits})>"
+
+
+class SendOutbox(Base):
+    """One guest's card in a bulk-send campaign: the durable record of every send attempt."""
+    __tablename__ = 'send_outbox'
+    __table_args__ = (UniqueConstraint('campaign_id', 'guest_id', name='uq_outbox_campaign_guest'),)
+
+    id = Column(Integer, primary_key=True)
+    campaign_id = Column(String, nullable=False, index=True)
+    guest_id = Column(Integer, nullable=False, index=True)
+    status = Column(String, nullable=False, default='pending', index=True)  # pending / claimed / sending / sent / failed / unknown
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(DateTime, default=datetime.now)
+    claimed_by = Column(String, nullable=True)               # claim token of the worker holding the row
+    claimed_at = Column(DateTime, nullable=True)
+    message_id = Column(String, nullable=True)               # Meta wamid once accepted
+    error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.now)
+    sent_at = Column(DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<SendOutbox(campaign='{self.campaign_id}', guest_id={self.guest_id}, status='{self.status}')>"
+
+
+class MessageStatus(Base):
+    """Latest delivery state Meta reported for a sent message, from the status webhook."""
+    __tablename__ = 'message_statuses'
+
+    message_id = Column(String, primary_key=True)            # Meta wamid
+    status = Column(String, nullable=False)                  # sent / delivered / read / failed
+    recipient = Column(String, nullable=True)
+    sent_at = Column(DateTime, nullable=True)
+    delivered_at = Column(DateTime, nullable=True)
+    read_at = Column(DateTime, nullable=True)
+    failed_at = Column(DateTime, nullable=True)
+    error = Column(String, nullable=True)
+    updated_at = Column(DateTime, default=datetime.now)
+
+    def __repr__(self):
+        return f"<MessageStatus(message_id='{self.message_id}', status='{self.status}')>"
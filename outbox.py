@@ -0,0 +1,214 @@
+# outbox.py — durable per-guest send outbox: campaigns that resume where they stopped and never double-send
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import bindparam, case, func, select, update
+
+from models import Guest, SendOutbox, get_db_session
+
+CLAIM_BATCH = 20
+CLAIM_TIMEOUT = 300          # seconds before a claimed row whose worker vanished is looked at again
+MAX_ATTEMPTS = 3             # campaign-level tries, each already retried in-process by SendEngine
+RETRY_DELAY = 60             # seconds before a retryable failure is tried again, times the attempts so far
+ACTIVE = ("pending", "claimed", "sending")
+
+# Row lifecycle:
+#   pending -> claimed   claim(): handed to one worker, nothing sent yet
+#   claimed -> sending   mark_sending(): about to call Meta
+#   sending -> sent | failed | pending   complete(); pending again only for retryable
+#                                        errors, after RETRY_DELAY x attempts, up to MAX_ATTEMPTS
+# A stale `claimed` row goes back to pending. A stale `sending` row may already
+# have reached the guest, so it becomes `unknown` and is never sent again.
+
+
+class ClaimLost(Exception):
+    """The row was released to another worker before this one started sending it."""
+
+
+class Outbox:
+    def create_campaign(self, db, guest_ids, live=None) -> tuple:
+        """
+        Queue the guests in a new campaign, leaving out any already waiting in
+        an unfinished one. `live` is the set of campaigns a job is still working
+        on (None: treat every campaign as live). Unfinished rows of any other
+        campaign were orphaned by a job that failed, so the guests' rows move
+        into this campaign instead of keeping them out of every later send; a
+        row orphaned mid-send becomes `unknown`, as in recover().
+        Returns (campaign_id, rows queued). The caller commits.
+        """
+        wanted = list(dict.fromkeys(guest_ids))
+        wanted_set = set(wanted)
+        campaign_id = uuid.uuid4().hex
+        now = datetime.now()
+        busy, adopt, interrupted = set(), [], []
+        for row_id, gid, campaign, status in db.execute(
+                select(SendOutbox.id, SendOutbox.guest_id, SendOutbox.campaign_id, SendOutbox.status)
+                .where(SendOutbox.status.in_(ACTIVE))):
+            busy.add(gid)
+            if live is None or campaign in live:
+                continue
+            if status == "sending":
+                interrupted.append(row_id)
+            elif gid in wanted_set:
+                adopt.append(row_id)
+        if adopt:
+            db.execute(update(SendOutbox).where(SendOutbox.id.in_(adopt))
+                       .values(campaign_id=campaign_id, status="pending", claimed_by=None, next_attempt_at=now))
+        if interrupted:
+            db.execute(update(SendOutbox).where(SendOutbox.id.in_(interrupted))
+                       .values(status="unknown", claimed_by=None,
+                               error="Interrupted mid-send; not retried in case it was delivered."))
+        rows = [{"campaign_id": campaign_id, "guest_id": gid, "status": "pending", "attempts": 0,
+                 "next_attempt_at": now, "created_at": now}
+                for gid in wanted if gid not in busy]
+        if rows:
+            db.execute(SendOutbox.__table__.insert(), rows)
+        return campaign_id, len(rows) + len(adopt)
+
+    def claim(self, campaign_id: str, limit: int = CLAIM_BATCH) -> tuple:
+        """
+        Take up to `limit` due rows of the campaign for this caller: (claim token, [(row_id, guest_id)]).
+        PostgreSQL picks them with FOR UPDATE SKIP LOCKED, so concurrent claimers
+        never wait on each other. SQLite has one writer at a time, and the
+        status guard on the UPDATE gives each row to exactly one claimer.
+        """
+        token = uuid.uuid4().hex
+        now = datetime.now()
+        with get_db_session() as db:
+            due = (select(SendOutbox.id)
+                   .where(SendOutbox.campaign_id == campaign_id, SendOutbox.status == "pending",
+                          SendOutbox.next_attempt_at <= now)
+                   .order_by(SendOutbox.id).limit(limit))
+            if db.get_bind().dialect.name == "postgresql":
+                due = due.with_for_update(skip_locked=True)
+            ids = db.execute(due).scalars().all()
+            if not ids:
+                db.rollback()
+                return token, []
+            db.execute(update(SendOutbox)
+                       .where(SendOutbox.id.in_(ids), SendOutbox.status == "pending")
+                       .values(status="claimed", claimed_by=token, claimed_at=now))
+            db.commit()
+            claimed = db.execute(select(SendOutbox.id, SendOutbox.guest_id)
+                                 .where(SendOutbox.claimed_by == token, SendOutbox.status == "claimed")
+                                 .order_by(SendOutbox.id)).all()
+            return token, [tuple(row) for row in claimed]
+
+    def mark_sending(self, row_id: int, token: str) -> bool:
+        """
+        Mark the row as being sent just before calling Meta; False if it is no
+        longer ours. Only the first call per claim counts as an attempt, not
+        SendEngine's in-process retries.
+        """
+        with get_db_session() as db:
+            marked = db.execute(
+                update(SendOutbox)
+                .where(SendOutbox.id == row_id, SendOutbox.claimed_by == token,
+                       SendOutbox.status.in_(("claimed", "sending")))
+                .values(status="sending", claimed_at=datetime.now(),
+                        attempts=SendOutbox.attempts + case((SendOutbox.status == "claimed", 1), else_=0))
+            ).rowcount
+            db.commit()
+            return bool(marked)
+
+    def complete(self, outcomes: list) -> int:
+        """
+        Write a batch of outcomes and mirror them onto the guests' WhatsApp columns.
+        outcomes: dicts of row_id, guest_id, token (from claim) and either
+        message_id (sent) or error plus retryable. Rows no longer held under
+        that token are left alone. Returns how many rows reached a final status.
+        """
+        if not outcomes:
+            return 0
+        now = datetime.now()
+        table, guests = SendOutbox.__table__, Guest.__table__
+        by_status = {"sent": [], "failed": [], "pending": []}
+        with get_db_session() as db:
+            retryable = [o["row_id"] for o in outcomes if o.get("error") and o.get("retryable")]
+            attempts = dict(db.execute(select(SendOutbox.id, SendOutbox.attempts)
+                                       .where(SendOutbox.id.in_(retryable))).all()) if retryable else {}
+            for o in outcomes:
+                tries = attempts.get(o["row_id"]) or 1
+                if not o.get("error"):
+                    status = "sent"
+                elif o["row_id"] in attempts and tries < MAX_ATTEMPTS:
+                    status = "pending"
+                else:
+                    status = "failed"
+                by_status[status].append({
+                    "_id": o["row_id"], "_token": o["token"], "_guest": o["guest_id"],
+                    "message_id": o.get("message_id"),
+                    "error": (o.get("error") or "")[:500] or None,
+                    "retry_at": now + timedelta(seconds=RETRY_DELAY * tries),
+                })
+
+            row = update(table).where(table.c.id == bindparam("_id"), table.c.claimed_by == bindparam("_token"))
+
+            def guest(status, field):
+                # Only guests whose row the update above just wrote: a lost claim leaves them alone.
+                written = (select(table.c.id)
+                           .where(table.c.id == bindparam("_id"), table.c.status == status,
+                                  table.c[field].is_not_distinct_from(bindparam(field)))
+                           .exists())
+                return update(guests).where(guests.c.id == bindparam("_guest"), written)
+
+            conn = db.connection()
+            if by_status["sent"]:
+                conn.execute(row.values(status="sent", message_id=bindparam("message_id"), error=None,
+                                        sent_at=now, claimed_by=None), by_status["sent"])
+                conn.execute(guest("sent", "message_id")
+                             .values(whatsapp_sent=True, whatsapp_sent_at=now, whatsapp_error=None),
+                             by_status["sent"])
+            if by_status["failed"]:
+                conn.execute(row.values(status="failed", error=bindparam("error"), claimed_by=None),
+                             by_status["failed"])
+                conn.execute(guest("failed", "error").values(whatsapp_sent=False, whatsapp_error=bindparam("error")),
+                             by_status["failed"])
+            if by_status["pending"]:
+                conn.execute(row.values(status="pending", error=bindparam("error"),
+                                        next_attempt_at=bindparam("retry_at"), claimed_by=None),
+                             by_status["pending"])
+            db.commit()
+        return len(outcomes) - len(by_status["pending"])
+
+    def recover(self, campaign_id: str | None = None, timeout: float = CLAIM_TIMEOUT) -> dict:
+        """Release claims abandoned by a dead worker; returns {"released": n, "unknown": n}."""
+        cutoff = datetime.now() - timedelta(seconds=timeout)
+        scope = [SendOutbox.claimed_at < cutoff]
+        if campaign_id:
+            scope.append(SendOutbox.campaign_id == campaign_id)
+        with get_db_session() as db:
+            released = db.execute(update(SendOutbox).where(SendOutbox.status == "claimed", *scope)
+                                  .values(status="pending", claimed_by=None)).rowcount
+            unknown = db.execute(update(SendOutbox).where(SendOutbox.status == "sending", *scope)
+                                 .values(status="unknown", claimed_by=None,
+                                         error="Interrupted mid-send; not retried in case it was delivered.")).rowcount
+            db.commit()
+        return {"released": released, "unknown": unknown}
+
+    def next_due(self, campaign_id: str) -> datetime | None:
+        """When the campaign's next pending row becomes due; None if nothing is pending."""
+        with get_db_session() as db:
+            return db.execute(select(func.min(SendOutbox.next_attempt_at))
+                              .where(SendOutbox.campaign_id == campaign_id, SendOutbox.status == "pending")).scalar()
+
+    def summary(self, campaign_id: str) -> dict:
+        with get_db_session() as db:
+            counts = dict(db.execute(select(SendOutbox.status, func.count())
+                                     .where(SendOutbox.campaign_id == campaign_id)
+                                     .group_by(SendOutbox.status)).all())
+            errors = db.execute(select(Guest.name, SendOutbox.error)
+                                .join(Guest, Guest.id == SendOutbox.guest_id, isouter=True)
+                                .where(SendOutbox.campaign_id == campaign_id,
+                                       SendOutbox.status.in_(("failed", "unknown")))
+                                .order_by(SendOutbox.id)).all()
+        return {
+            "total": sum(counts.values()),
+            "sent": counts.get("sent", 0),
+            "failed": counts.get("failed", 0) + counts.get("unknown", 0),
+            "remaining": sum(counts.get(s, 0) for s in ACTIVE),
+            "errors": [{"name": name or "(deleted guest)", "error": error} for name, error in errors],
+        }
+
+
+outbox = Outbox()
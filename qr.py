@@ -0,0 +1,221 @@
+# qr.py — QR code PNGs built straight from the module matrix with NumPy (no PIL drawing)
+import functools
+import struct
+import zlib
+
+import numpy as np
+import qrcode
+from numpy.lib.stride_tricks import sliding_window_view
+from qrcode import util
+
+BORDER = 4
+BOX_SIZE = 10
+BATCH_CHUNK = 128      # codes scored together; bounds the (codes x 8 masks x windows) temporaries
+ERROR_CORRECTION = qrcode.constants.ERROR_CORRECT_H
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# 1:1:3:1:1 finder-like runs with four light modules on either side (ISO 18004 penalty rule 3)
+_FINDER_LIKE = np.array([
+    [1, 0, 1, 1, 1, 0, 1, 0, 0, 0, 0],
+    [0, 0, 0, 0, 1, 0, 1, 1, 1, 0, 1],
+], dtype=bool)
+
+
+class _Layout:
+    """Everything about a QR version that does not depend on the data, built once per version."""
+
+    def __init__(self, version: int):
+        n = version * 4 + 17
+        self.size = n
+        self.test_patterns = self._function_patterns(version, True, 0)
+        self.final_patterns = np.stack([self._function_patterns(version, False, k) for k in range(8)])
+
+        # Data modules are whatever the function patterns leave free, filled in
+        # qrcode's zig-zag order (pairs of columns, alternating up and down).
+        free = self._free_modules(version)
+        rows, cols = [], []
+        row, inc = n - 1, -1
+        for col in range(n - 1, 0, -2):
+            if col <= 6:
+                col -= 1
+            while True:
+                for c in (col, col - 1):
+                    if free[row][c]:
+                        rows.append(row)
+                        cols.append(c)
+                row += inc
+                if row < 0 or row >= n:
+                    row -= inc
+                    inc = -inc
+                    break
+        self.data_rows = np.array(rows)
+        self.data_cols = np.array(cols)
+
+        i, j = np.indices((n, n))
+        masks = np.stack([
+            (i + j) % 2 == 0,
+            i % 2 == 0,
+            j % 3 == 0,
+            (i + j) % 3 == 0,
+            (i // 2 + j // 3) % 2 == 0,
+            (i * j) % 2 + (i * j) % 3 == 0,
+            ((i * j) % 2 + (i * j) % 3) % 2 == 0,
+            ((i * j) % 3 + (i + j) % 2) % 2 == 0,
+        ])
+        data_area = np.zeros((n, n), dtype=bool)
+        data_area[self.data_rows, self.data_cols] = True
+        self.masks = masks & data_area
+
+    @staticmethod
+    def _blank(version: int):
+        qr = qrcode.QRCode(version=version, error_correction=ERROR_CORRECTION)
+        qr.modules_count = n = version * 4 + 17
+        qr.modules = [[None] * n for _ in range(n)]
+        qr.setup_position_probe_pattern(0, 0)
+        qr.setup_position_probe_pattern(n - 7, 0)
+        qr.setup_position_probe_pattern(0, n - 7)
+        qr.setup_position_adjust_pattern()
+        qr.setup_timing_pattern()
+        return qr
+
+    def _function_patterns(self, version: int, test: bool, mask: int) -> np.ndarray:
+        qr = self._blank(version)
+        qr.setup_type_info(test, mask)
+        if version >= 7:
+            qr.setup_type_number(test)
+        return np.array([[bool(m) for m in row] for row in qr.modules])
+
+    def _free_modules(self, version: int):
+        qr = self._blank(version)
+        qr.setup_type_info(True, 0)
+        if version >= 7:
+            qr.setup_type_number(True)
+        return [[m is None for m in row] for row in qr.modules]
+
+
+@functools.lru_cache(maxsize=None)
+def _layout(version: int) -> _Layout:
+    return _Layout(version)
+
+
+def _penalties(stack: np.ndarray) -> np.ndarray:
+    """qrcode's lost_point() for every matrix in a (k, n, n) stack at once."""
+    k, n, _ = stack.shape
+    lines = np.concatenate([stack, stack.transpose(0, 2, 1)], axis=1)     # rows then columns
+
+    # Rule 1: runs of five or more same-coloured modules score (length - 2).
+    starts = np.ones(lines.shape, dtype=bool)
+    starts[..., 1:] = lines[..., 1:] != lines[..., :-1]
+    run_ids = np.cumsum(starts.ravel()) - 1
+    lengths = np.bincount(run_ids)
+    owner = np.nonzero(starts.ravel())[0] // (2 * n * n)
+    rule1 = np.bincount(owner, weights=np.where(lengths >= 5, lengths - 2, 0), minlength=k)
+
+    # Rule 2: every same-coloured 2x2 block scores 3.
+    a, b = stack[:, :-1, :-1], stack[:, :-1, 1:]
+    c, d = stack[:, 1:, :-1], stack[:, 1:, 1:]
+    rule2 = 3 * ((a == b) & (a == c) & (a == d)).sum(axis=(1, 2))
+
+    # Rule 3: finder-like patterns in rows and columns score 40.
+    windows = sliding_window_view(lines, 11, axis=2)
+    hits = (windows[..., None, :] == _FINDER_LIKE).all(axis=-1).any(axis=-1)
+    rule3 = 40 * hits.sum(axis=(1, 2))
+
+    # Rule 4: 10 points per full 5% the dark ratio strays from 50%.
+    percent = stack.sum(axis=(1, 2)) / float(n * n)
+    rule4 = 10 * (np.abs(percent * 100 - 50) / 5).astype(int)
+
+    return rule1 + rule2 + rule3 + rule4
+
+
+def _encode(data: str) -> tuple:
+    """(version, placed unmasked data modules) for one payload."""
+    qr = qrcode.QRCode(error_correction=ERROR_CORRECTION)
+    qr.add_data(data)
+    version = qr.best_fit()
+    layout = _layout(version)
+    bits = np.unpackbits(np.array(util.create_data(version, ERROR_CORRECTION, qr.data_list), dtype=np.uint8))
+    placed = np.zeros((layout.size, layout.size), dtype=bool)
+    count = min(len(bits), len(layout.data_rows))
+    placed[layout.data_rows[:count], layout.data_cols[:count]] = bits[:count]
+    return version, placed
+
+
+def _with_border(matrix: np.ndarray, border: int) -> np.ndarray:
+    return np.pad(matrix, [(0, 0)] * (matrix.ndim - 2) + [(border, border)] * 2, constant_values=False)
+
+
+def _finish(layout: _Layout, placed: np.ndarray) -> np.ndarray:
+    """Apply all eight masks together and keep the one qrcode would choose."""
+    placed = np.asarray(placed)
+    candidates = placed[:, None] ^ layout.masks[None]                    # (codes, 8, n, n)
+    scores = _penalties((candidates | layout.test_patterns).reshape(-1, layout.size, layout.size))
+    best = scores.reshape(len(placed), 8).argmin(axis=1)                 # first minimum, as qrcode does
+    return candidates[np.arange(len(placed)), best] | layout.final_patterns[best]
+
+
+def qr_matrix(data: str, border: int = BORDER) -> np.ndarray:
+    """Boolean module matrix (True = dark) including the quiet zone, at ERROR_CORRECT_H."""
+    version, placed = _encode(data)
+    return _with_border(_finish(_layout(version), placed[None])[0], border)
+
+
+def qr_matrices(items, border: int = BORDER) -> list:
+    """qr_matrix for many payloads; codes of the same version share one mask-selection pass."""
+    encoded = [_encode(data) for data in items]
+    out = [None] * len(encoded)
+    by_version = {}
+    for i, (version, _) in enumerate(encoded):
+        by_version.setdefault(version, []).append(i)
+    for version, indices in by_version.items():
+        for start in range(0, len(indices), BATCH_CHUNK):
+            chunk = indices[start:start + BATCH_CHUNK]
+            finished = _finish(_layout(version), np.stack([encoded[i][1] for i in chunk]))
+            for i, matrix in zip(chunk, _with_border(finished, border)):
+                out[i] = matrix
+    return out
+
+
+def scale_matrix(matrix: np.ndarray, size: int | None = None, box_size: int = BOX_SIZE) -> np.ndarray:
+    """
+    Blow modules up to pixels. With `size`, use the largest whole box that fits
+    and pad the remainder with light quiet zone, so edges stay sharp without resampling.
+    Works on one matrix (n, n) or a stack (k, n, n).
+    """
+    n = matrix.shape[-1]
+    if size is not None:
+        box_size = max(1, size // n)
+    pixels = matrix.repeat(box_size, axis=-2).repeat(box_size, axis=-1)
+    if size is not None and pixels.shape[-1] != size:
+        extra = size - pixels.shape[-1]
+        before = extra // 2
+        pad = [(0, 0)] * (pixels.ndim - 2) + [(before, extra - before)] * 2
+        pixels = np.pad(pixels, pad, constant_values=False)
+    return pixels
+
+
+def _chunk(kind: bytes, body: bytes) -> bytes:
+    return struct.pack(">I", len(body)) + kind + body + struct.pack(">I", zlib.crc32(kind + body) & 0xFFFFFFFF)
+
+
+def encode_png_1bit(pixels: np.ndarray) -> bytes:
+    """Encode a boolean image (True = dark) as a 1-bit grayscale PNG."""
+    height, width = pixels.shape
+    rows = np.packbits(~pixels, axis=1)     # grayscale 1-bit: 0 is black, 1 is white
+    raw = np.hstack([np.zeros((height, 1), dtype=np.uint8), rows]).tobytes()   # filter byte 0 per row
+    return b"".join((
+        PNG_SIGNATURE,
+        _chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 1, 0, 0, 0, 0)),
+        _chunk(b"IDAT", zlib.compress(raw, 6)),
+        _chunk(b"IEND", b""),
+    ))
+
+
+def qr_png(data: str, size: int | None = None, box_size: int = BOX_SIZE) -> bytes:
+    """PNG bytes of one QR code, either `box_size` pixels per module or exactly `size` pixels square."""
+    return encode_png_1bit(scale_matrix(qr_matrix(data), size, box_size))
+
+
+def qr_png_batch(items, size: int | None = None, box_size: int = BOX_SIZE) -> list:
+    """PNG bytes for many QR codes in input order."""
+    return [encode_png_1bit(scale_matrix(m, size, box_size)) for m in qr_matrices(items)]
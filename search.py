@@ -0,0 +1,167 @@
+# search.py — indexed guest search for the dashboard search box
+import logging
+import re
+import threading
+import time
+import weakref
+
+from sqlalchemy import text, func, or_, case
+
+from models import Guest
+
+SEARCH_LIMIT = 25
+SEARCH_LIMIT_MAX = 100
+CACHE_TTL = 5          # seconds; the search box fires on every keystroke
+CACHE_SIZE = 256
+
+# SQLite has no regexp_replace, so phone digits are normalised with the usual separators.
+_SQLITE_DIGITS = "replace(replace(replace(replace(replace(replace(coalesce({col}, ''), ' ', ''), '-', ''), '+', ''), '(', ''), ')', ''), '.', '')"
+
+_SQLITE_SCHEMA = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS guest_search USING fts5(name, phone_digits, tokenize='trigram')",
+    f"""CREATE TRIGGER IF NOT EXISTS guests_search_ai AFTER INSERT ON guests BEGIN
+        INSERT INTO guest_search(rowid, name, phone_digits)
+        VALUES (new.id, new.name, {_SQLITE_DIGITS.format(col='new.phone')});
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS guests_search_ad AFTER DELETE ON guests BEGIN
+        DELETE FROM guest_search WHERE rowid = old.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS guests_search_au AFTER UPDATE OF name, phone ON guests BEGIN
+        DELETE FROM guest_search WHERE rowid = old.id;
+        INSERT INTO guest_search(rowid, name, phone_digits)
+        VALUES (new.id, new.name, {_SQLITE_DIGITS.format(col='new.phone')});
+    END""",
+]
+
+_POSTGRES_SCHEMA = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_guests_name_trgm ON guests USING gin (lower(name) gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_guests_phone_digits_trgm "
+    "ON guests USING gin ((regexp_replace(phone, '\\D', '', 'g')) gin_trgm_ops)",
+]
+
+_indexed = weakref.WeakKeyDictionary()    # engine -> whether the index could be built
+_indexed_lock = threading.Lock()
+
+
+def ensure_search_index(db) -> bool:
+    """Create the search index for this database once per engine (idempotent)."""
+    engine = db.get_bind()
+    with _indexed_lock:
+        if engine in _indexed:
+            return _indexed[engine]
+        dialect = engine.dialect.name
+        _indexed[engine] = dialect in ("sqlite", "postgresql")
+        try:
+            with engine.begin() as conn:
+                if dialect == "sqlite":
+                    for ddl in _SQLITE_SCHEMA:
+                        conn.exec_driver_sql(ddl)
+                    indexed = conn.exec_driver_sql("SELECT count(*) FROM guest_search").scalar()
+                    total = conn.exec_driver_sql("SELECT count(*) FROM guests").scalar()
+                    if indexed != total:
+                        conn.exec_driver_sql("DELETE FROM guest_search")
+                        conn.exec_driver_sql(
+                            "INSERT INTO guest_search(rowid, name, phone_digits) "
+                            f"SELECT id, name, {_SQLITE_DIGITS.format(col='phone')} FROM guests"
+                        )
+                elif dialect == "postgresql":
+                    for ddl in _POSTGRES_SCHEMA:
+                        conn.exec_driver_sql(ddl)
+        except Exception as e:
+            # Search still works without the index, just with a table scan.
+            logging.warning(f"Could not build guest search index on {dialect}: {e}")
+            _indexed[engine] = False
+        return _indexed[engine]
+
+
+def _digits(value: str) -> str:
+    """Digits of a phone query, minus a local leading 0 so 07.. also finds 2557.."""
+    digits = re.sub(r"\D", "", value or "")
+    return digits[1:] if digits.startswith("0") and len(digits) > 3 else digits
+
+
+def find_guests(db, query: str, limit: int = SEARCH_LIMIT) -> list:
+    """
+    Ranked guest search on name and (digit-normalised) phone.
+    Prefix matches on the name come first, then by relevance, then visual_id.
+    """
+    query = (query or "").strip()
+    if not query:
+        return []
+    indexed = ensure_search_index(db)
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite" and indexed:
+        return _search_sqlite(db, query, limit)
+    return _search_generic(db, query, limit, trigram=(dialect == "postgresql" and indexed))
+
+
+def _search_sqlite(db, query: str, limit: int) -> list:
+    digits = _digits(query)
+    terms = [t for t in re.split(r"\s+", query) if len(t) >= 3]
+    if len(digits) >= 3 and not any(c.isalpha() for c in query):
+        terms = [digits]    # looks like a phone number: match on normalised digits
+    if not terms:
+        # Trigram FTS needs 3+ characters; one or two letters only do a name-prefix lookup.
+        return (
+            db.query(Guest).filter(Guest.name.ilike(f"{query}%"))
+            .order_by(Guest.visual_id).limit(limit).all()
+        )
+
+    match = " AND ".join('"' + t.replace('"', '""') + '"' for t in terms)
+    stmt = text(
+        "SELECT guests.* FROM guest_search JOIN guests ON guests.id = guest_search.rowid "
+        "WHERE guest_search MATCH :match "
+        "ORDER BY (guests.name LIKE :prefix) DESC, guest_search.rank, guests.visual_id "
+        "LIMIT :limit"
+    )
+    return db.query(Guest).from_statement(stmt).params(
+        match=match, prefix=f"{query}%", limit=limit
+    ).all()
+
+
+def _search_generic(db, query: str, limit: int, trigram: bool) -> list:
+    name = func.lower(Guest.name)
+    pattern = f"%{query.lower()}%"
+    conditions = [name.like(pattern)]
+    digits = _digits(query)
+    if len(digits) >= 3:
+        phone_digits = func.regexp_replace(Guest.phone, r"\D", "", "g") if trigram else Guest.phone
+        conditions.append(phone_digits.like(f"%{digits}%"))
+
+    order = [case((name.like(f"{query.lower()}%"), 0), else_=1)]
+    if trigram:
+        order.append(func.similarity(name, query.lower()).desc())
+    order.append(Guest.visual_id)
+    return db.query(Guest).filter(or_(*conditions)).order_by(*order).limit(limit).all()
+
+
+class SearchCache:
+    """Short-lived per-database cache of serialised results, keyed by (query, limit)."""
+
+    def __init__(self, ttl: float = CACHE_TTL, size: int = CACHE_SIZE):
+        self._ttl = ttl
+        self._size = size
+        self._entries = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def get(self, engine, key):
+        with self._lock:
+            hit = self._entries.get(engine, {}).get(key)
+        if hit and hit[0] > time.monotonic():
+            return hit[1]
+        return None
+
+    def put(self, engine, key, value):
+        with self._lock:
+            entries = self._entries.setdefault(engine, {})
+            if len(entries) >= self._size:
+                entries.clear()
+            entries[key] = (time.monotonic() + self._ttl, value)
+
+    def clear(self):
+        with self._lock:
+            self._entries = weakref.WeakKeyDictionary()
+
+
+search_cache = SearchCache()
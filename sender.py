@@ -0,0 +1,225 @@
+# sender.py — concurrent WhatsApp sending: token-bucket rate limit, retry with backoff, adaptive concurrency
+import logging
+import os
+import random
+import statistics
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+
+from whatsapp import graph_error_code
+
+SEND_RATE = float(os.getenv("WHATSAPP_SEND_RATE", "80"))     # messages/s per business number (Cloud API default)
+SEND_WORKERS = int(os.getenv("WHATSAPP_SEND_WORKERS", "16"))
+MIN_WORKERS = 2
+MAX_RETRIES = 4
+BACKOFF_BASE = 1.0           # seconds before the first retry; doubles per attempt
+BACKOFF_MAX = 60.0
+LATENCY_WINDOW = 20          # calls per concurrency adjustment
+LATENCY_TOLERANCE = 2.0      # shrink when typical latency exceeds the best seen by this factor
+RATE_WINDOW = 10.0           # seconds of completions behind the live throughput figure
+
+# Graph API error codes meaning "slow down", whatever the HTTP status they arrive with
+THROTTLE_CODES = {4, 80007, 130429}
+
+
+class TokenBucket:
+    """`rate` tokens a second, up to `burst` saved; pause() stops issuing tokens while the API asks us to wait."""
+
+    def __init__(self, rate: float, burst: float | None = None, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self.tokens = self.capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = self.clock()
+                if now >= self.updated:
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1 - 1e-9:      # tolerate float drift in the refill
+                        self.tokens -= 1
+                        return
+                    delay = (1 - self.tokens) / self.rate
+                else:
+                    delay = self.updated - now      # paused
+            self.sleep(delay)
+
+    def pause(self, seconds: float):
+        with self._lock:
+            self.tokens = 0
+            self.updated = max(self.updated, self.clock() + seconds)
+
+
+class AdaptiveConcurrency:
+    """
+    Caps calls in flight between `low` and `high`: one more after each window of
+    healthy calls, half as many when latency climbs well past the best window
+    seen or the API throttles us.
+    """
+
+    def __init__(self, low: int, high: int, window: int = LATENCY_WINDOW, tolerance: float = LATENCY_TOLERANCE):
+        self.low = max(1, min(low, high))
+        self.high = max(1, high)
+        self.limit = self.low
+        self.window = window
+        self.tolerance = tolerance
+        self.best = None
+        self.in_flight = 0
+        self._samples = []
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= self.limit:
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self, latency: float | None = None, throttled: bool = False):
+        with self._cond:
+            self.in_flight -= 1
+            if throttled:
+                self._shrink()
+            elif latency is not None:
+                self._samples.append(latency)
+                if len(self._samples) >= self.window:
+                    typical = statistics.median(self._samples)
+                    self._samples = []
+                    if self.best is not None and typical > self.best * self.tolerance:
+                        self._shrink()
+                    else:
+                        self.best = typical if self.best is None else min(self.best, typical)
+                        self.limit = min(self.high, self.limit + 1)
+            self._cond.notify_all()
+
+    def _shrink(self):
+        self.limit = max(self.low, self.limit // 2)
+        self._samples = []
+
+
+def retry_delay(error: Exception, attempt: int) -> tuple:
+    """(seconds to wait, throttled?) before retrying, or (None, False) when the error is final."""
+    throttled = False
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        response = error.response
+        throttled = response.status_code == 429 or graph_error_code(response) in THROTTLE_CODES
+        if not throttled and response.status_code < 500:
+            return None, False
+        retry_after = response.headers.get("Retry-After")
+        if retry_after:
+            try:
+                return min(BACKOFF_MAX, float(retry_after)), throttled
+            except ValueError:
+                pass
+    elif not isinstance(error, requests.ConnectionError):
+        return None, False      # includes ReadTimeout: the message may already have gone out
+    return min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1.0), throttled
+
+
+def is_retryable(error: Exception) -> bool:
+    return retry_delay(error, 0)[0] is not None
+
+
+class SendEngine:
+    """
+    Runs send(payload) for a stream of payloads on a worker pool. Every call
+    takes a token from the bucket, retryable failures (429, 5xx, failed
+    connections) back off and try again, and the number of calls in flight follows
+    observed latency. prepare(payload), if given, runs first in the same worker
+    (e.g. fetching the card) without holding a token.
+    """
+
+    def __init__(self, send, prepare=None, rate: float = SEND_RATE, burst: float | None = None,
+                 workers: int = SEND_WORKERS, min_workers: int = MIN_WORKERS,
+                 max_retries: int = MAX_RETRIES, sleep=time.sleep):
+        self.send = send
+        self.prepare = prepare
+        self.workers = max(1, workers)
+        self.max_retries = max_retries
+        self.sleep = sleep
+        self.bucket = TokenBucket(rate, burst, sleep=sleep)
+        self.concurrency = AdaptiveConcurrency(min_workers, self.workers)
+        self.counts = {"sent": 0, "failed": 0, "retries": 0, "throttled": 0}
+        self._completions = deque()
+        self._lock = threading.Lock()
+        self._started = None
+
+    def run(self, items):
+        """items: iterable of (key, payload). Yields (key, result, error) in completion order."""
+        self._started = time.monotonic()
+        with ThreadPoolExecutor(self.workers, thread_name_prefix="send") as pool:
+            items = iter(items)
+            pending = {}
+            exhausted = False
+            while True:
+                while not exhausted and len(pending) < self.workers * 2:
+                    item = next(items, None)
+                    if item is None:
+                        exhausted = True
+                        break
+                    key, payload = item
+                    pending[pool.submit(self._deliver, payload)] = key
+                if not pending:
+                    return
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    key = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        self._record("failed")
+                        yield key, None, e
+                    else:
+                        self._record("sent")
+                        yield key, result, None
+
+    def _deliver(self, payload):
+        if self.prepare:
+            payload = self.prepare(payload)
+        for attempt in range(self.max_retries + 1):
+            self.concurrency.acquire()
+            self.bucket.acquire()
+            start = time.monotonic()
+            latency, throttled = None, False
+            try:
+                result = self.send(payload)
+                latency = time.monotonic() - start
+                return result
+            except Exception as e:
+                delay, throttled = retry_delay(e, attempt)
+                if delay is None or attempt == self.max_retries:
+                    raise
+                if throttled:
+                    self.bucket.pause(delay)
+                with self._lock:
+                    self.counts["retries"] += 1
+                    self.counts["throttled"] += throttled
+                logging.info(f"Send attempt {attempt + 1} failed ({e}); retrying in {delay:.1f}s")
+            finally:
+                self.concurrency.release(latency, throttled)
+            self.sleep(delay)
+
+    def _record(self, outcome: str):
+        now = time.monotonic()
+        with self._lock:
+            self.counts[outcome] += 1
+            self._completions.append(now)
+            while self._completions and self._completions[0] < now - RATE_WINDOW:
+                self._completions.popleft()
+
+    def stats(self) -> dict:
+        """Counts so far, recent messages/s and the current concurrency limit."""
+        now = time.monotonic()
+        with self._lock:
+            recent = [t for t in self._completions if t >= now - RATE_WINDOW]
+            span = min(RATE_WINDOW, now - self._started) if self._started else 0
+            rate = len(recent) / span if span > 0 else 0.0
+            return {**self.counts, "rate": round(rate, 1), "concurrency": self.concurrency.limit}
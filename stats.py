@@ -0,0 +1,47 @@
+# stats.py — guest totals shared by the report, Excel export and send dashboard
+from sqlalchemy import case, func
+
+from models import Guest
+
+
+def guest_stats(db) -> dict:
+    """
+    Every summary number the admin pages show, computed in one aggregate query
+    over the guests table instead of a COUNT(*) per figure or a Python pass per row.
+    """
+    card_type = func.lower(func.trim(func.coalesce(Guest.card_type, "")))
+    entered = Guest.has_entered.is_(True)
+    sent = Guest.whatsapp_sent.is_(True)
+    failed = ~sent & (func.coalesce(Guest.whatsapp_error, "") != "")   # IS NOT true also covers NULL
+
+    def count_if(condition):
+        return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+    row = db.query(
+        func.count(Guest.id),
+        count_if(card_type == "single"),
+        count_if(card_type == "double"),
+        count_if(card_type == "family"),
+        func.coalesce(func.sum(case((card_type == "family", Guest.group_size), else_=0)), 0),
+        count_if(entered),
+        func.coalesce(func.sum(Guest.checked_in_count), 0),
+        count_if(sent),
+        count_if(failed),
+    ).one()
+
+    total, single, double, family, family_allowed, entered_count, checked_in, sent_count, failed_count = (
+        int(v or 0) for v in row
+    )
+    return {
+        "total_guests": total,
+        "single_cards": single,
+        "double_cards": double,
+        "family_cards": family,
+        "total_family_allowed": family_allowed,
+        "entered_guests": entered_count,
+        "not_entered_guests": total - entered_count,
+        "checked_in_people": checked_in,
+        "whatsapp_sent": sent_count,
+        "whatsapp_failed": failed_count,
+        "whatsapp_pending": total - sent_count,
+    }
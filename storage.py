@@ -0,0 +1,191 @@
+# storage.py — object storage for QR codes and cards: Supabase over pooled HTTP, or a local folder
+import logging
+import os
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+import requests
+from requests.adapters import HTTPAdapter
+
+STORAGE_WORKERS = int(os.getenv("STORAGE_WORKERS", "16"))
+DELETE_BATCH = 1000        # paths per remove request (Supabase's per-call limit)
+REQUEST_TIMEOUT = 30
+
+
+class Storage:
+    """
+    Single-object primitives (upload / download / delete) plus batch helpers
+    that run them on a shared, bounded thread pool. Subclasses provide the
+    primitives and public_url().
+    """
+
+    def __init__(self, workers: int = STORAGE_WORKERS):
+        self.workers = workers
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    # -- primitives ----------------------------------------------------------
+
+    def public_url(self, bucket: str, path: str) -> str:
+        raise NotImplementedError
+
+    def upload(self, bucket: str, path: str, data: bytes, content_type: str = "image/png") -> str:
+        raise NotImplementedError
+
+    def download(self, bucket: str, path: str) -> bytes:
+        raise NotImplementedError
+
+    def delete(self, bucket: str, paths: list) -> list:
+        """Remove paths in one request; returns the paths that existed and were removed."""
+        raise NotImplementedError
+
+    # -- batches -------------------------------------------------------------
+
+    def upload_many(self, bucket: str, items):
+        """
+        items: iterable of (path, data) or (path, data, content_type), consumed lazily.
+        Yields (path, public_url, error) in input order; one of url / error is None.
+        """
+        upload = lambda path, data, content_type="image/png": self.upload(bucket, path, data, content_type)
+        for args, url, error in self._map(upload, items):
+            yield args[0], url, error
+
+    def download_many(self, bucket: str, paths):
+        """
+        Yield (path, data, error) in input order while keeping at most
+        2 x workers downloads in flight, so memory stays bounded for any count.
+        """
+        for (path,), data, error in self._map(lambda path: self.download(bucket, path), ((p,) for p in paths)):
+            yield path, data, error
+
+    def delete_many(self, bucket: str, paths, batch: int = DELETE_BATCH) -> dict:
+        """
+        Delete in large batches run concurrently.
+        Returns {"deleted": [...], "missing": [...], "failed": [{"path", "error"}]}.
+        """
+        paths = list(dict.fromkeys(p for p in paths if p))
+        batches = [(paths[i:i + batch],) for i in range(0, len(paths), batch)]
+        report = {"deleted": [], "missing": [], "failed": []}
+        for (chunk,), removed, error in self._map(lambda chunk: self.delete(bucket, chunk), batches):
+            if error:
+                report["failed"].extend({"path": p, "error": str(error)} for p in chunk)
+                continue
+            removed = set(removed)
+            report["deleted"].extend(p for p in chunk if p in removed)
+            report["missing"].extend(p for p in chunk if p not in removed)
+        return report
+
+    def _executor(self) -> ThreadPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="storage")
+            return self._pool
+
+    def _map(self, fn, arg_tuples):
+        """Run fn(*args) on the pool with a bounded window; yield (args, result, error) in input order."""
+        pool = self._executor()
+        window = deque()
+        limit = self.workers * 2
+
+        def settle(args, future):
+            try:
+                return args, future.result(), None
+            except Exception as e:
+                return args, None, e
+
+        for args in arg_tuples:
+            args = tuple(args)
+            window.append((args, pool.submit(fn, *args)))
+            if len(window) >= limit:
+                yield settle(*window.popleft())
+        while window:
+            yield settle(*window.popleft())
+
+
+class SupabaseStorage(Storage):
+    """Supabase Storage REST API over one keep-alive session shared by all worker threads."""
+
+    def __init__(self, url: str, key: str, workers: int = STORAGE_WORKERS):
+        super().__init__(workers)
+        self.base = url.rstrip("/") + "/storage/v1"
+        self.session = requests.Session()
+        self.session.headers.update({"Authorization": f"Bearer {key}", "apikey": key})
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def _object_url(self, bucket: str, path: str) -> str:
+        return f"{self.base}/object/{quote(bucket)}/{quote(path, safe='/')}"
+
+    def public_url(self, bucket: str, path: str) -> str:
+        return f"{self.base}/object/public/{quote(bucket)}/{quote(path, safe='/')}"
+
+    def upload(self, bucket: str, path: str, data: bytes, content_type: str = "image/png") -> str:
+        res = self.session.post(self._object_url(bucket, path), data=data, timeout=REQUEST_TIMEOUT,
+                                headers={"Content-Type": content_type, "x-upsert": "true"})
+        res.raise_for_status()
+        return self.public_url(bucket, path)
+
+    def download(self, bucket: str, path: str) -> bytes:
+        res = self.session.get(self._object_url(bucket, path), timeout=REQUEST_TIMEOUT)
+        res.raise_for_status()
+        return res.content
+
+    def delete(self, bucket: str, paths: list) -> list:
+        res = self.session.delete(f"{self.base}/object/{quote(bucket)}", json={"prefixes": list(paths)},
+                                  timeout=REQUEST_TIMEOUT)
+        res.raise_for_status()
+        return [obj.get("name") for obj in res.json() or []]
+
+
+class LocalStorage(Storage):
+    """Buckets as folders under `root`; the stand-in backend for tests and offline development."""
+
+    def __init__(self, root: str, base_url: str = "/local_storage", workers: int = 4):
+        super().__init__(workers)
+        self.root = os.path.abspath(root)
+        self.base_url = base_url.rstrip("/")
+
+    def path_for(self, bucket: str, path: str) -> str:
+        full = os.path.abspath(os.path.join(self.root, bucket, path))
+        if not full.startswith(os.path.join(self.root, bucket) + os.sep):
+            raise ValueError(f"Invalid object path: {path}")
+        return full
+
+    def public_url(self, bucket: str, path: str) -> str:
+        return f"{self.base_url}/{quote(bucket)}/{quote(path, safe='/')}"
+
+    def upload(self, bucket: str, path: str, data: bytes, content_type: str = "image/png") -> str:
+        target = self.path_for(bucket, path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(target))
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, target)
+        return self.public_url(bucket, path)
+
+    def download(self, bucket: str, path: str) -> bytes:
+        with open(self.path_for(bucket, path), "rb") as f:
+            return f.read()
+
+    def delete(self, bucket: str, paths: list) -> list:
+        removed = []
+        for path in paths:
+            try:
+                os.remove(self.path_for(bucket, path))
+                removed.append(path)
+            except FileNotFoundError:
+                pass
+        return removed
+
+
+def create_storage(supabase_url: str | None, supabase_key: str | None, local_dir: str | None = None):
+    if supabase_url and supabase_key:
+        return SupabaseStorage(supabase_url, supabase_key)
+    if local_dir:
+        logging.info(f"Using local object storage in {local_dir}.")
+        return LocalStorage(local_dir)
+    return None
@@ -12,8 +12,8 @@ project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 sys.path.insert(0, project_root)
 
 # --- APPLICATION IMPORTS AFTER PATH IS SET ---
-# Import 'app' from app_web.py
-from app_web import app
+# Import 'app' from app.py
+from app import app
 
 # Import database components directly that you need by name
 # OR, import the models module itself if you want to reference its globals via models.
@@ -25,6 +25,14 @@ import models # <--- THIS IS THE CRITICAL NEW/MISSED LINE
 # as these aren't directly modified as global variables in the fixture.
 from models import Base, Guest, init_db
 
+# Background jobs run inline via job_queue.run_pending() in tests, never on worker threads.
+from jobs import job_queue
+job_queue.autostart = False
+
+# Webhook statuses stay buffered until a test calls status_buffer.flush().
+from webhooks import status_buffer
+status_buffer.autostart = False
+
 # --- Fixture for SQLAlchemy Database Session ---
 @pytest.fixture(scope='function')
 def db_session():
@@ -70,4 +78,38 @@ def client(db_session):
         init_db(app) # This will initialize models._engine and models._SessionLocal using app.config
 
         with app.test_client() as client:
-            yield client
\ No newline at end of file
+            yield client
+
+# --- Fixture for a logged-in Flask Test Client ---
+@pytest.fixture
+def auth_client(client):
+    from checkin import checkin_index
+
+    # The check-in index is process-wide; start every test from the fresh test DB.
+    checkin_index.clear()
+    with client.session_transaction() as sess:
+        sess['logged_in'] = True
+    yield client
+    checkin_index.clear()
+
+
+# --- Fixture: file-backed object storage in place of Supabase ---
+@pytest.fixture
+def local_storage(tmp_path, monkeypatch):
+    import app as app_module
+    from storage import LocalStorage
+
+    store = LocalStorage(str(tmp_path / "storage"))
+    monkeypatch.setattr(app_module, "storage", store)
+    return store
+
+
+# --- Fixture: file-backed database for code that queries from worker threads ---
+@pytest.fixture
+def shared_db(tmp_path):
+    # In-memory SQLite gives every thread its own empty database.
+    original = models._engine, models._SessionLocal
+    init_db(f"sqlite:///{tmp_path / 'shared.db'}")
+    yield
+    models._engine.dispose()
+    models._engine, models._SessionLocal = original
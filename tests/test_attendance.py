@@ -0,0 +1,68 @@
+import json
+from attendance import AttendanceFeed
+from models import Guest, get_db_session
+
+
+def make_feed(counts):
+    # The loader ignores the session; tests drive the "database" through `counts`.
+    return AttendanceFeed(lambda db: counts, interval=3600)
+
+
+def test_publish_fans_out_deltas(db_session):
+    counts = {"entered_guests": 0, "not_entered_guests": 3}
+    feed = make_feed(counts)
+    first, second = feed.subscribe(), feed.subscribe()
+    assert feed.snapshot() == counts
+
+    feed.publish({"entered_guests": 1, "not_entered_guests": -1})
+
+    for q in (first, second):
+        assert q.get_nowait() == ("delta", {"entered_guests": 1, "not_entered_guests": -1})
+    assert feed.snapshot() == {"entered_guests": 1, "not_entered_guests": 2}
+
+
+def test_reconcile_publishes_only_changes(db_session):
+    counts = {"total_guests": 3, "entered_guests": 0}
+    feed = make_feed(counts)
+    q = feed.subscribe()
+    feed.snapshot()
+
+    counts["entered_guests"] = 2   # e.g. check-ins handled by the other worker
+    feed.reconcile()
+    assert q.get_nowait() == ("delta", {"entered_guests": 2})
+    assert q.empty()
+
+
+def test_slow_dashboard_gets_a_fresh_snapshot(db_session):
+    feed = make_feed({"entered_guests": 0})
+    q = feed.subscribe()
+    feed.snapshot()
+    for _ in range(q.maxsize + 5):
+        feed.publish({"entered_guests": 1})
+
+    assert q.qsize() == 5     # the snapshot plus the four deltas after it
+    assert q.get_nowait()[0] == "snapshot"
+
+
+def test_report_stream_starts_with_snapshot(auth_client):
+    with get_db_session() as db:
+        db.add(Guest(name="A", phone="1", qr_code_id="GUEST-0001", card_type="single", group_size=1))
+        db.commit()
+
+    response = auth_client.get('/guest_report_stream', buffered=False)
+    assert response.mimetype == 'text/event-stream'
+    first = next(response.response).decode()
+    response.close()
+
+    event, data = first.strip().split("\n")
+    assert event == "event: snapshot"
+    assert json.loads(data[len("data: "):])["total_guests"] == 1
+
+
+def test_streams_past_the_cap_are_told_to_poll(db_session):
+    feed = AttendanceFeed(lambda db: {"entered_guests": 4}, interval=3600, max_streams=1)
+    live = feed.stream()
+    assert next(live).startswith("event: snapshot")
+    assert list(feed.stream()) == ['event: busy\ndata: {"entered_guests": 4}\n\n']
+    live.close()
+    assert next(feed.stream()).startswith("event: snapshot")
@@ -0,0 +1,174 @@
+from io import BytesIO
+from unittest.mock import patch
+from PIL import Image
+import app as app_module
+import numpy as np
+from cards import (CardRenderPool, CardRenderer, get_card_renderer, card_fingerprint, variant_path,
+                   CARD_VARIANTS, CARD_W, CARD_H, QR_SIZE, QR_X, QR_Y)
+from qr import qr_matrix
+from app import generate_qr_bytes
+from models import Guest, get_db_session
+
+
+def spec(visual_id, name="Joan Msuya", qr=True):
+    return {"name": name, "card_type": "single", "visual_id": visual_id,
+            "qr_code_id": f"GUEST-{visual_id:04d}" if qr else None}
+
+
+def test_renderer_draws_on_a_copy_of_the_template():
+    renderer = CardRenderer()
+    before = renderer.template.tobytes()
+    img = Image.open(BytesIO(renderer.render_spec(spec(7))))
+    assert img.format == "PNG"
+    assert img.size == (CARD_W, CARD_H)
+    assert renderer.template.tobytes() == before
+
+
+def test_card_qr_is_drawn_locally_and_scannable_size():
+    qr_img = CardRenderer.qr_image("GUEST-0001")
+    assert qr_img.size == (175, 175)
+    legacy = Image.open(BytesIO(generate_qr_bytes("GUEST-0001"))).convert("L").resize((175, 175), Image.NEAREST)
+    matching = sum(a == b for a, b in zip(qr_img.convert("L").getdata(), legacy.getdata()))
+    assert matching / (175 * 175) > 0.95
+
+
+def test_renderer_is_built_once_per_process():
+    assert get_card_renderer() is get_card_renderer()
+
+
+def test_pool_renders_every_card_and_reports_failures():
+    specs = [(i, spec(i, qr=(i != 3))) for i in range(1, 6)]
+    results = {key: (png, error) for key, png, error in CardRenderPool(workers=2).render(specs)}
+
+    assert sorted(results) == [1, 2, 3, 4, 5]
+    assert results[3][0] is None and "QR" in str(results[3][1])
+    assert all(results[k][0].startswith(b"\x89PNG") for k in (1, 2, 4, 5))
+
+
+def test_inline_pool_matches_worker_output():
+    specs = [(1, spec(1))]
+    inline = next(CardRenderPool(workers=1).render(specs))[1]
+    pooled = next(CardRenderPool(workers=2).render(specs))[1]
+    assert inline == pooled
+
+
+def test_download_card_by_id_uses_shared_renderer(auth_client):
+    with get_db_session() as db:
+        db.add(Guest(name="Joan Msuya", phone="0712345678", qr_code_id="GUEST-0001",
+                     visual_id=1, card_type="single", group_size=1))
+        db.commit()
+    with patch.object(app_module, "download_from_supabase") as download:
+        res = auth_client.get('/download_card_by_id/1')
+    assert res.status_code == 200
+    download.assert_not_called()
+    assert res.data == get_card_renderer().render_spec(spec(1))
+
+
+def test_fingerprint_tracks_card_inputs():
+    guest = Guest(name="Joan Msuya", card_type="single", visual_id=1, qr_code_id="GUEST-0001")
+    before = card_fingerprint(guest)
+    assert card_fingerprint(guest) == before
+    guest.card_type = "double"
+    assert card_fingerprint(guest) != before
+    assert card_fingerprint(guest, assets="other-template") != card_fingerprint(guest)
+
+
+def test_regeneration_only_touches_changed_cards(auth_client, local_storage):
+    from jobs import job_queue
+    with get_db_session() as db:
+        for i in range(1, 4):
+            db.add(Guest(name=f"Guest {i}", phone=f"07000000{i:02d}", qr_code_id=f"GUEST-{i:04d}",
+                         qr_code_url="https://x/qr.png", visual_id=i, card_type="single", group_size=1))
+        db.commit()
+
+    def generate():
+        with patch.object(local_storage, "download") as download, \
+                patch.object(local_storage, "upload", wraps=local_storage.upload) as upload, \
+                patch.object(app_module, "CardRenderPool", lambda **kw: CardRenderPool(workers=1, **kw)):
+            auth_client.get('/generate_guest_cards')
+            job_queue.run_pending()
+        download.assert_not_called()
+        return sorted(c.args[1] for c in upload.call_args_list)
+
+    assert len(generate()) == 3 * len(CARD_VARIANTS)
+    assert generate() == []
+
+    with get_db_session() as db:
+        db.query(Guest).filter_by(visual_id=2).one().name = "Renamed"
+        db.commit()
+    assert generate() == ["GUEST-0002-RENAMED.png", "send/GUEST-0002-RENAMED.jpg", "thumb/GUEST-0002-RENAMED.webp"]
+    job = auth_client.get('/jobs').get_json()["jobs"][0]
+    assert (job["result"]["generated"], job["result"]["unchanged"]) == (1, 2)
+
+
+def test_guest_without_a_number_is_skipped_not_fatal(auth_client, local_storage):
+    from jobs import job_queue
+    with get_db_session() as db:
+        db.add_all([Guest(name="Numbered", phone="0700000001", qr_code_id="GUEST-0001", visual_id=1,
+                          card_type="single", group_size=1),
+                    Guest(name="Unnumbered", phone="0700000002", qr_code_id="GUEST-0002", visual_id=None,
+                          card_type="single", group_size=1)])
+        db.commit()
+    with patch.object(app_module, "CardRenderPool", lambda **kw: CardRenderPool(workers=1, **kw)):
+        auth_client.get('/generate_guest_cards')
+        job_queue.run_pending()
+    job = auth_client.get('/jobs').get_json()["jobs"][0]
+    assert job["status"] == "done"
+    assert (job["result"]["generated"], job["result"]["skipped"]) == (1, ["Unnumbered"])
+
+
+def read_qr_modules(image, modules):
+    """Threshold the centre pixel of every module (quiet zone included) of the card's QR."""
+    gray = np.asarray(image.convert("L"), dtype=float)
+    pitch = QR_SIZE // modules                       # scale_matrix's whole-pixel box ...
+    pad = (QR_SIZE - pitch * modules) // 2           # ... centred in the QR_SIZE square
+    centres = pad + np.arange(modules) * pitch + pitch // 2
+    return gray[np.ix_(QR_Y + centres, QR_X + centres)] < 128
+
+
+def test_variants_are_smaller_and_keep_the_qr_readable():
+    variants = CardRenderer().render_variants(spec(7))
+    assert set(variants) == set(CARD_VARIANTS)
+    send = Image.open(BytesIO(variants["send"]))
+    thumb = Image.open(BytesIO(variants["thumb"]))
+    assert (send.format, send.size) == ("JPEG", (CARD_W, CARD_H))
+    assert (thumb.format, thumb.width) == ("WEBP", CARD_VARIANTS["thumb"]["width"])
+    assert len(variants["send"]) * 5 < len(variants["print"])
+    assert len(variants["thumb"]) * 40 < len(variants["print"])
+
+    # Every module of the QR must come back exactly from the JPEG that guests receive.
+    expected = qr_matrix("GUEST-0007")
+    for image in (Image.open(BytesIO(variants["print"])), send):
+        assert (read_qr_modules(image, len(expected)) == expected).all()
+
+
+def test_variant_paths_are_predictable():
+    assert variant_path("GUEST-0001-JOAN.png", "print") == "GUEST-0001-JOAN.png"
+    assert variant_path("GUEST-0001-JOAN.png", "send") == "send/GUEST-0001-JOAN.jpg"
+    assert variant_path("GUEST-0001-JOAN.png", "thumb") == "thumb/GUEST-0001-JOAN.webp"
+
+
+def test_pool_returns_every_variant_when_asked():
+    (key, card, error), = CardRenderPool(workers=1, variants=CARD_VARIANTS).render([(1, spec(1))])
+    assert error is None and set(card) == set(CARD_VARIANTS)
+    assert card["print"] == get_card_renderer().render_spec(spec(1))
+
+
+def test_send_dashboard_shows_thumbnails_of_current_cards(auth_client, local_storage):
+    from jobs import job_queue
+    with get_db_session() as db:
+        db.add(Guest(name="Joan Msuya", phone="0712345678", qr_code_id="GUEST-0001", qr_code_url="x",
+                     visual_id=1, card_type="single", group_size=1))
+        db.commit()
+    assert b"thumb/" not in auth_client.get('/send_cards').data
+    with patch.object(app_module, "CardRenderPool", lambda **kw: CardRenderPool(workers=1, **kw)):
+        auth_client.get('/generate_guest_cards')
+        job_queue.run_pending()
+    page = auth_client.get('/send_cards').data.decode()
+    assert local_storage.public_url(app_module.CARDS_BUCKET, "thumb/GUEST-0001-JOAN_MSUYA.webp") in page
+
+    with get_db_session() as db:
+        db.add(Guest(name="No Number", phone="0712345679", qr_code_id="GUEST-0002", visual_id=None,
+                     card_type="single", group_size=1))
+        db.commit()
+    assert auth_client.get('/send_cards').status_code == 200
@@ -0,0 +1,151 @@
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from models import Base, Guest, get_db_session
+from checkin import checkin_index, record_checkin
+
+
+def add_guest(qr_code_id, group_size=1, card_type='single', **kwargs):
+    with get_db_session() as db:
+        guest = Guest(name=kwargs.pop('name', 'Gate Guest'), phone=kwargs.pop('phone', qr_code_id),
+                      qr_code_id=qr_code_id, visual_id=kwargs.pop('visual_id', None),
+                      card_type=card_type, group_size=group_size, checked_in_count=0, **kwargs)
+        db.add(guest)
+        db.commit()
+
+
+def scan(client, qr_code_id):
+    return client.post('/update_status', json={'qr_code_id': qr_code_id}).get_json()
+
+
+def test_index_preload_serves_lookups(auth_client):
+    add_guest('GUEST-0001', group_size=2, card_type='double', visual_id=1)
+    with get_db_session() as db:
+        checkin_index.load(db)
+
+    entry = checkin_index.get('GUEST-0001')
+    assert entry == {"visual_id": 1, "name": "Gate Guest", "card_type": "double",
+                     "group_size": 2, "checked_in_count": 0}
+
+
+def test_scan_writes_back_increment(auth_client):
+    add_guest('GUEST-0002', group_size=2, card_type='double', visual_id=2)
+
+    first = scan(auth_client, 'GUEST-0002')
+    assert first['success'] is True
+    assert first['guest']['remaining_entries'] == 1
+    assert checkin_index.get('GUEST-0002')['checked_in_count'] == 1
+
+    second = scan(auth_client, 'GUEST-0002')
+    assert second['guest']['remaining_entries'] == 0
+
+    third = scan(auth_client, 'GUEST-0002')
+    assert third['success'] is False
+    assert third['already_entered'] is True
+
+    with get_db_session() as db:
+        guest = db.query(Guest).filter_by(qr_code_id='GUEST-0002').one()
+        assert guest.checked_in_count == 2
+        assert guest.has_entered is True
+        assert guest.entry_time is not None
+
+
+def test_stale_full_entry_is_rechecked_against_db(auth_client):
+    add_guest('GUEST-0003', visual_id=3)
+    scan(auth_client, 'GUEST-0003')
+
+    # Simulate another process resetting the card behind this worker's back.
+    with get_db_session() as db:
+        db.query(Guest).filter_by(qr_code_id='GUEST-0003').update({Guest.checked_in_count: 0})
+        db.commit()
+
+    assert scan(auth_client, 'GUEST-0003')['success'] is True
+
+
+def test_unknown_and_deleted_guests(auth_client):
+    assert scan(auth_client, 'NOPE')['message'] == "Guest not found."
+
+    add_guest('GUEST-0004', visual_id=4)
+    with get_db_session() as db:
+        guest_id = db.query(Guest.id).filter_by(qr_code_id='GUEST-0004').scalar()
+        checkin_index.load(db)
+
+    auth_client.get(f'/delete_guest/{guest_id}')
+    assert checkin_index.get('GUEST-0004') is None
+    assert scan(auth_client, 'GUEST-0004')['message'] == "Guest not found."
+
+
+@pytest.mark.parametrize("returning", [True, False])
+def test_parallel_scans_on_family_card_are_exact(tmp_path, returning):
+    # Two engines on one database file stand in for the two gunicorn workers.
+    uri = f"sqlite:///{tmp_path / 'gate.db'}"
+    engines = [create_engine(uri, connect_args={"check_same_thread": False, "timeout": 60})
+               for _ in range(2)]
+    Base.metadata.create_all(engines[0])
+    for engine in engines:
+        engine.connect().close()  # let the dialect initialise before forcing the code path
+        engine.dialect.update_returning = returning
+    makers = [sessionmaker(autocommit=False, autoflush=False, bind=e) for e in engines]
+
+    group_size, scans = 150, 3000
+    with makers[0]() as db:
+        db.add(Guest(name="Big Family", phone="255700000000", qr_code_id="GUEST-FAM",
+                     card_type="family", group_size=group_size, checked_in_count=0))
+        db.commit()
+
+    def one_scan(i):
+        with makers[i % 2]() as db:
+            return record_checkin(db, "GUEST-FAM")
+
+    with ThreadPoolExecutor(max_workers=32) as pool:
+        results = list(pool.map(one_scan, range(scans)))
+
+    admitted = [r for r in results if r is not None]
+    assert len(admitted) == group_size
+    assert sorted(count for count, _ in admitted) == list(range(1, group_size + 1))
+
+    with makers[1]() as db:
+        guest = db.query(Guest).filter_by(qr_code_id="GUEST-FAM").one()
+        assert guest.checked_in_count == group_size
+        assert guest.has_entered is True
+        assert guest.entry_time is not None
+
+    for engine in engines:
+        engine.dispose()
+
+
+def test_manifest_lists_allowances(auth_client):
+    add_guest('GUEST-0005', group_size=4, card_type='family', visual_id=5, name='The Mushis')
+    data = auth_client.get('/checkin_manifest').get_json()
+    assert data['guests'] == {'GUEST-0005': [4, 0, 5, 'The Mushis', 'family']}
+
+
+def test_batch_sync_is_idempotent(auth_client):
+    add_guest('GUEST-0006', group_size=2, card_type='double', visual_id=6)
+    with get_db_session() as db:
+        checkin_index.load(db)
+    scans = [
+        {'scan_id': 'a', 'qr_code_id': 'GUEST-0006', 'scanned_at': '2026-10-17T18:00:00Z'},
+        {'scan_id': 'b', 'qr_code_id': 'GUEST-0006', 'scanned_at': '2026-10-17T18:00:05Z'},
+        {'scan_id': 'c', 'qr_code_id': 'GUEST-0006', 'scanned_at': '2026-10-17T18:00:09Z'},
+        {'scan_id': 'd', 'qr_code_id': 'UNKNOWN', 'scanned_at': '2026-10-17T18:00:10Z'},
+    ]
+    first = auth_client.post('/sync_checkins', json={'device_id': 'gate-1', 'scans': scans}).get_json()
+    assert first['success'] is True
+    assert first['admitted'] == 2
+    assert [r['status'] for r in first['results']] == ['admitted', 'admitted', 'full', 'not_found']
+    assert [r['remaining_entries'] for r in first['results'][:3]] == [1, 0, 0]
+    assert first['counts'] == {'GUEST-0006': 2}
+
+    # The device lost the response and resends its whole queue.
+    again = auth_client.post('/sync_checkins', json={'device_id': 'gate-1', 'scans': scans}).get_json()
+    assert again['admitted'] == 0
+    assert all(r['duplicate'] for r in again['results'])
+    assert [r['status'] for r in again['results']] == ['admitted', 'admitted', 'full', 'not_found']
+
+    with get_db_session() as db:
+        guest = db.query(Guest).filter_by(qr_code_id='GUEST-0006').one()
+        assert guest.checked_in_count == 2
+        assert guest.has_entered is True
+    assert checkin_index.get('GUEST-0006')['checked_in_count'] == 2
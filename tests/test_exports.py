@@ -0,0 +1,141 @@
+import csv
+import io
+import threading
+from datetime import datetime
+from io import BytesIO
+import pytest
+from openpyxl import Workbook, load_workbook
+from exports import guest_report_xlsx, stream_workbook
+from models import Guest, get_db_session
+
+
+def add_guests(n):
+    with get_db_session() as db:
+        db.add_all(Guest(name=f"Guest {i}", phone=f"07123{i:05d}", qr_code_id=f"GUEST-{i:04d}", visual_id=i,
+                         card_type="family" if i % 3 == 0 else "single", group_size=4 if i % 3 == 0 else 1,
+                         has_entered=(i % 2 == 0), entry_time=datetime(2026, 6, 1, 18, 30) if i % 2 == 0 else None)
+                   for i in range(1, n + 1))
+        db.commit()
+
+
+def test_excel_report_layout_and_rows(auth_client):
+    add_guests(25)
+    res = auth_client.get('/download_excel')
+    assert res.status_code == 200
+    assert res.is_streamed
+    assert "guest_report.xlsx" in res.headers["Content-Disposition"]
+
+    ws = load_workbook(BytesIO(res.data))["Guest Report"]
+    assert ws["A1"].value == "Guest Summary Report" and ws["A1"].font.b
+    assert (ws["A3"].value, ws["B3"].value) == ("Total Guests", 25)
+    assert (ws["A9"].value, ws["B9"].value) == ("Guests Not Entered", 13)
+    assert [c.value for c in ws[11]] == ["ID", "Name", "Phone", "QR Code ID", "Has Entered", "Entry Time",
+                                         "Visual ID", "Card Type", "Group Size"]
+    rows = list(ws.iter_rows(min_row=12, values_only=True))
+    assert len(rows) == 25
+    assert rows[1][1:] == ("Guest 2", "0712300002", "GUEST-0002", "Entered", "2026-06-01 18:30:00", 2, "single", 1)
+    assert rows[2][4:6] == ("Not Entered", None)
+
+    assert ws.column_dimensions["A"].width == len("Total Allowed by Family Cards") + 2
+    assert ws.column_dimensions["F"].width == len("2026-06-01 18:30:00") + 2
+    assert [str(r.sqref) for r in ws.conditional_formatting] == ["E12:E36"]
+
+
+def test_excel_report_streams_in_batches(client):
+    add_guests(7)
+    chunks = list(guest_report_xlsx(yield_per=2, chunk_size=1024))
+    assert len(chunks) > 1
+    ws = load_workbook(BytesIO(b"".join(chunks))).active
+    assert [r[0] for r in ws.iter_rows(min_row=12, values_only=True)] == list(range(1, 8))
+
+
+def test_empty_guest_list_still_exports(client):
+    ws = load_workbook(BytesIO(b"".join(guest_report_xlsx()))).active
+    assert ws["B3"].value == 0
+    assert ws.max_row == 11
+
+
+def test_closing_the_stream_stops_the_save():
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Big")
+    for i in range(20000):
+        ws.append([i, f"row {i}", "x" * 40])
+    stream = stream_workbook(wb, chunk_size=1024)
+    next(stream)
+    stream.close()
+    assert not any(t.name == "xlsx-export" for t in threading.enumerate())
+
+
+def export(client, query="", fmt="csv", **headers):
+    return client.get(f"/export/guests.{fmt}{query}", headers=headers)
+
+
+def csv_rows(res):
+    return list(csv.reader(io.StringIO(res.data.decode())))
+
+
+def test_csv_export_filters_and_columns(auth_client):
+    add_guests(12)
+    with get_db_session() as db:
+        guest = db.query(Guest).filter_by(visual_id=5).one()
+        guest.whatsapp_error = "Invalid number"
+        db.query(Guest).filter_by(visual_id=6).one().whatsapp_sent = True
+        db.commit()
+
+    res = export(auth_client)
+    assert res.status_code == 200 and res.is_streamed
+    rows = csv_rows(res)
+    assert rows[0][:3] == ["visual_id", "name", "phone"]
+    assert len(rows) == 13
+    assert rows[2][rows[0].index("has_entered")] == "true"
+    assert rows[2][rows[0].index("entry_time")] == "2026-06-01 18:30:00"
+
+    rows = csv_rows(export(auth_client, "?entered=yes&card_type=family&columns=visual_id,name"))
+    assert rows == [["visual_id", "name"], ["6", "Guest 6"], ["12", "Guest 12"]]
+    assert csv_rows(export(auth_client, "?whatsapp=failed&columns=visual_id,whatsapp_error"))[1:] == \
+        [["5", "Invalid number"]]
+    assert [r[0] for r in csv_rows(export(auth_client, "?whatsapp=sent&columns=visual_id"))[1:]] == ["6"]
+    assert len(csv_rows(export(auth_client, "?whatsapp=pending"))) == 11
+
+
+def test_export_rejects_bad_requests(auth_client):
+    assert export(auth_client, "?columns=name,password").status_code == 400
+    assert export(auth_client, "?entered=maybe").status_code == 400
+    assert export(auth_client, fmt="xml").status_code == 404
+
+
+def test_export_needs_login_or_token(client, monkeypatch):
+    import app as app_module
+    add_guests(2)
+    assert export(client).status_code == 302
+    monkeypatch.setattr(app_module, "EXPORT_API_TOKEN", "s3cret")
+    assert export(client, Authorization="Bearer wrong").status_code == 401
+    res = export(client, "?columns=visual_id", Authorization="Bearer s3cret")
+    assert res.status_code == 200 and csv_rows(res) == [["visual_id"], ["1"], ["2"]]
+
+
+def test_parquet_export_is_streamed_in_row_groups(auth_client, monkeypatch):
+    pq = pytest.importorskip("pyarrow.parquet")
+    import exports
+    add_guests(9)
+    monkeypatch.setattr(exports, "YIELD_PER", 4)
+    columns, stmt = exports.export_query(["id", "name", "has_entered", "entry_time"], entered="no")
+    chunks = list(exports.stream_parquet(columns, stmt))
+    parquet = pq.ParquetFile(io.BytesIO(b"".join(chunks)))
+    table = parquet.read()
+    assert table.column_names == ["id", "name", "has_entered", "entry_time"]
+    assert table.column("name").to_pylist() == ["Guest 1", "Guest 3", "Guest 5", "Guest 7", "Guest 9"]
+    assert len(chunks) > 2
+
+    res = export(auth_client, "?card_type=family", fmt="parquet")
+    assert res.status_code == 200
+    assert pq.read_table(io.BytesIO(res.data)).column("visual_id").to_pylist() == [3, 6, 9]
+
+
+def test_cli_export(shared_db, tmp_path, monkeypatch):
+    import export_guests
+    add_guests(4)
+    monkeypatch.setattr(export_guests, "init_db", lambda url: None)      # keep the test database
+    out = tmp_path / "guests.csv"
+    assert export_guests.main([str(out), "--entered", "no", "--columns", "visual_id,name"]) == 0
+    assert out.read_text().splitlines() == ["visual_id,name", "1,Guest 1", "3,Guest 3"]
@@ -0,0 +1,69 @@
+import base64
+from models import Guest, get_db_session
+
+
+def seed(n=7):
+    names = ["Zawadi", "Amani", "Baraka", "Amani", "Neema", "Juma", "Amani"]
+    with get_db_session() as db:
+        for i in range(n):
+            db.add(Guest(name=names[i % len(names)], phone=f"07{i:08d}", qr_code_id=f"GUEST-{i + 1:04d}",
+                         visual_id=i + 1, card_type="family" if i % 3 == 0 else "single",
+                         group_size=3 if i % 3 == 0 else 1, has_entered=(i % 2 == 0)))
+        db.commit()
+
+
+def walk(client, **params):
+    """Follow next_cursor until the listing is exhausted; return visual_ids in order."""
+    seen, cursor = [], None
+    while True:
+        args = dict(params, limit=3)
+        if cursor:
+            args["cursor"] = cursor
+        data = client.get('/guests_page', query_string=args).get_json()
+        seen += [g["visual_id"] for g in data["guests"]]
+        cursor = data["next_cursor"]
+        if not cursor:
+            return seen
+
+
+def test_keyset_pages_by_visual_id(auth_client):
+    seed()
+    assert walk(auth_client) == [1, 2, 3, 4, 5, 6, 7]
+    assert walk(auth_client, order="desc") == [7, 6, 5, 4, 3, 2, 1]
+
+
+def test_keyset_pages_by_name_with_ties(auth_client):
+    seed()
+    # Three "Amani" rows straddle a page boundary; visual_id breaks the tie.
+    assert walk(auth_client, sort="name") == [2, 4, 7, 3, 6, 5, 1]
+    assert walk(auth_client, sort="name", order="desc") == [1, 5, 6, 3, 7, 4, 2]
+
+
+def test_filters(auth_client):
+    seed()
+    assert walk(auth_client, card_type="family") == [1, 4, 7]
+    assert walk(auth_client, entered="no") == [2, 4, 6]
+    assert walk(auth_client, q="amani") == [2, 4, 7]
+
+
+def test_backfill_visual_ids_in_one_statement(auth_client):
+    with get_db_session() as db:
+        db.add_all([
+            Guest(name="A", phone="1", qr_code_id="QA", visual_id=5),
+            Guest(name="B", phone="2", qr_code_id="QB"),
+            Guest(name="C", phone="3", qr_code_id="QC"),
+        ])
+        db.commit()
+
+    assert auth_client.get('/').status_code == 200
+
+    with get_db_session() as db:
+        ids = dict(db.query(Guest.qr_code_id, Guest.visual_id).all())
+    assert ids == {"QA": 5, "QB": 6, "QC": 7}
+
+
+def test_malformed_cursor_is_rejected(auth_client):
+    seed()
+    for cursor in ("not-base64!", base64.urlsafe_b64encode(b"[1]").decode(),
+                   base64.urlsafe_b64encode(b'{"a": 1}').decode()):
+        assert auth_client.get('/guests_page', query_string={"cursor": cursor}).status_code == 400
@@ -0,0 +1,64 @@
+import io
+import app as app_module
+from jobs import job_queue
+from models import Guest, get_db_session
+from importer import parse_guest_csv, import_guests
+
+CSV = """Name,Phone,Card Type,Allowed
+Joan Msuya,0712345678,single,
+Mr & Mrs Chuwa,0754111222,d,
+The Kileos,0655000111,family,6
+No Phone,,single,
+Joan Again,0712345678,single,
+Existing Guest,0700000000,s,
+"""
+
+
+def test_parse_guest_csv():
+    rows, skipped = parse_guest_csv(CSV)
+    assert skipped == 2   # missing phone + repeated phone
+    assert [(r["name"], r["card_type"], r["group_size"]) for r in rows] == [
+        ("Joan Msuya", "single", 1), ("Mr & Mrs Chuwa", "double", 2),
+        ("The Kileos", "family", 6), ("Existing Guest", "single", 1),
+    ]
+
+
+def test_import_reserves_contiguous_visual_ids(db_session):
+    db_session.add(Guest(name="Existing Guest", phone="0700000000", qr_code_id="GUEST-0007", visual_id=7))
+    db_session.commit()
+
+    rows, _ = parse_guest_csv(CSV)
+    inserted, skipped = import_guests(db_session, rows)
+
+    assert skipped == 1
+    assert [(r["visual_id"], r["qr_code_id"]) for r in inserted] == [
+        (8, "GUEST-0008"), (9, "GUEST-0009"), (10, "GUEST-0010")]
+    assert db_session.query(Guest).count() == 4
+
+
+def test_upload_returns_before_qr_stage(auth_client, local_storage):
+    response = auth_client.post('/upload_csv', data={'file': (io.BytesIO(CSV.encode()), 'guests.csv')},
+                                content_type='multipart/form-data', follow_redirects=False)
+    assert response.status_code == 302
+
+    with get_db_session() as db:
+        assert db.query(Guest).filter(Guest.qr_code_url == "").count() == 4
+
+    job_queue.run_pending()
+
+    with get_db_session() as db:
+        urls = dict(db.query(Guest.qr_code_id, Guest.qr_code_url).all())
+    assert urls["GUEST-0001"] == f"/local_storage/{app_module.QR_BUCKET}/GUEST-0001-JOAN_MSUYA.png"
+    assert local_storage.download(app_module.QR_BUCKET, "GUEST-0001-JOAN_MSUYA.png").startswith(b"\x89PNG")
+    assert all(urls.values())
+    job = auth_client.get('/jobs').get_json()["jobs"][0]
+    assert (job["kind"], job["result"]) == ("publish_qr", {"published": 4, "failed": []})
+
+
+def test_qr_stage_failure_is_recorded(auth_client, monkeypatch):
+    monkeypatch.setattr(app_module, "storage", None)
+    auth_client.post('/upload_csv', data={'file': (io.BytesIO(CSV.encode()), 'guests.csv')},
+                     content_type='multipart/form-data')
+    job_queue.run_pending()
+    job = auth_client.get('/jobs').get_json()["jobs"][0]
+    assert (job["kind"], job["status"]) == ("publish_qr", "failed")
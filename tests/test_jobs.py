@@ -0,0 +1,75 @@
+import pytest
+from jobs import JobQueue
+from models import Job
+
+
+@pytest.fixture
+def queue(db_session):
+    q = JobQueue()
+    q.autostart = False
+    return q
+
+
+def test_job_runs_and_reports_progress(queue):
+    @queue.handler("count")
+    def count(ctx):
+        for i in range(ctx.params["n"]):
+            ctx.progress(i, ctx.params["n"], force=True)
+        return {"counted": ctx.params["n"]}
+
+    job_id = queue.enqueue("count", n=3)
+    assert queue.get(job_id)["status"] == "queued"
+
+    queue.run_pending()
+    job = queue.get(job_id)
+    assert job["status"] == "done"
+    assert job["result"] == {"counted": 3}
+    assert (job["progress"], job["total"]) == (2, 3)
+    assert job["finished_at"]
+
+
+def test_failed_job_keeps_error(queue):
+    @queue.handler("boom")
+    def boom(ctx):
+        raise ValueError("no cards")
+
+    job_id = queue.enqueue("boom")
+    queue.run_pending()
+    job = queue.get(job_id)
+    assert job["status"] == "failed"
+    assert job["error"] == "no cards"
+
+
+def test_claim_takes_each_job_once(queue):
+    queue.handler("noop")(lambda ctx: {})
+    ids = {queue.enqueue("noop") for _ in range(3)}
+    claimed = [queue.claim() for _ in range(4)]
+    assert {j.id for j in claimed[:3]} == ids
+    assert claimed[3] is None
+
+
+def test_stale_running_job_is_requeued(queue, db_session):
+    queue.handler("noop")(lambda ctx: {})
+    job_id = queue.enqueue("noop")
+    queue.claim()
+    job = db_session.get(Job, job_id)
+    job.heartbeat_at = job.heartbeat_at.replace(year=2000)
+    db_session.commit()
+
+    queue.requeue_stale()
+    assert queue.get(job_id)["status"] == "queued"
+
+
+def test_workers_keep_sweeping_for_stale_jobs(queue, monkeypatch):
+    sweeps = []
+    monkeypatch.setattr(queue, "requeue_stale", lambda: sweeps.append(1))
+    queue._sweep_stale()
+    queue._sweep_stale()
+    assert len(sweeps) == 1
+    queue._next_sweep = 0.0          # STALE_SWEEP_EVERY later
+    queue._sweep_stale()
+    assert len(sweeps) == 2
+
+
+def test_unknown_job_is_404(auth_client):
+    assert auth_client.get('/jobs/nope').status_code == 404
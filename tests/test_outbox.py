@@ -0,0 +1,143 @@
+import threading
+import pytest
+import outbox as outbox_module
+import sender
+import whatsapp
+from jobs import job_queue
+from mock_graph import MockGraphServer
+from models import Guest, SendOutbox, get_db_session
+from outbox import outbox
+
+
+@pytest.fixture
+def graph(shared_db, monkeypatch):
+    monkeypatch.setattr(sender, "BACKOFF_BASE", 0.01)
+    monkeypatch.setattr(outbox_module, "RETRY_DELAY", 0)
+    with MockGraphServer() as server:
+        monkeypatch.setattr(whatsapp, "WHATSAPP_API_BASE", server.base_url)
+        yield server
+
+
+def add_guests(n):
+    with get_db_session() as db:
+        db.add_all(Guest(name=f"Guest {i}", phone=f"07123456{i:02d}", qr_code_id=f"GUEST-{i:04d}",
+                         qr_code_url="x", visual_id=i) for i in range(1, n + 1))
+        db.commit()
+        return [g.id for g in db.query(Guest).order_by(Guest.id)]
+
+
+def campaign_for(guest_ids):
+    with get_db_session() as db:
+        campaign, _ = outbox.create_campaign(db, guest_ids)
+        db.commit()
+    return campaign
+
+
+def rows(campaign):
+    with get_db_session() as db:
+        return {r.guest_id: (r.status, r.attempts, r.message_id)
+                for r in db.query(SendOutbox).filter_by(campaign_id=campaign)}
+
+
+def test_concurrent_claimers_never_share_a_row(shared_db):
+    campaign = campaign_for(add_guests(60))
+    taken, lock = [], threading.Lock()
+
+    def worker():
+        while True:
+            _, claimed = outbox.claim(campaign, limit=7)
+            if not claimed:
+                return
+            with lock:
+                taken.extend(row_id for row_id, _ in claimed)
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(taken) == len(set(taken)) == 60
+
+
+def test_guests_already_queued_are_not_queued_twice(shared_db):
+    ids = add_guests(3)
+    campaign_for(ids[:2])
+    with get_db_session() as db:
+        _, queued = outbox.create_campaign(db, ids)
+    assert queued == 1
+
+
+def test_rows_of_a_dead_campaign_move_to_the_next_one(shared_db):
+    ids = add_guests(4)
+    dead = campaign_for(ids[:3])
+    token, claimed = outbox.claim(dead, limit=2)
+    outbox.mark_sending(claimed[0][0], token)
+
+    with get_db_session() as db:
+        campaign, queued = outbox.create_campaign(db, ids, live={"some-other-campaign"})
+        db.commit()
+    assert queued == 3
+    assert rows(campaign) == {ids[1]: ("pending", 0, None), ids[2]: ("pending", 0, None),
+                              ids[3]: ("pending", 0, None)}
+    assert rows(dead) == {ids[0]: ("unknown", 1, None)}
+
+    with get_db_session() as db:
+        _, queued = outbox.create_campaign(db, ids, live={campaign})
+    assert queued == 1               # only the unknown one, as after recover()
+
+
+def test_stale_claim_cannot_overwrite_a_delivered_guest(shared_db):
+    guest_id, = add_guests(1)
+    campaign = campaign_for([guest_id])
+    stale, [(row_id, _)] = outbox.claim(campaign)
+    outbox.mark_sending(row_id, stale)
+
+    # The first worker stalls; its row is released, re-claimed and delivered by another.
+    with get_db_session() as db:
+        db.query(SendOutbox).filter_by(id=row_id).update({"status": "pending", "claimed_by": None})
+        db.commit()
+    token, _ = outbox.claim(campaign)
+    outbox.complete([{"row_id": row_id, "guest_id": guest_id, "token": token, "message_id": "wamid.1"}])
+
+    outbox.complete([{"row_id": row_id, "guest_id": guest_id, "token": stale, "error": "timeout"}])
+    with get_db_session() as db:
+        guest = db.get(Guest, guest_id)
+        assert (guest.whatsapp_sent, guest.whatsapp_error) == (True, None)
+    assert rows(campaign) == {guest_id: ("sent", 1, "wamid.1")}
+
+
+def test_campaign_resumes_without_resending(auth_client, graph, monkeypatch):
+    import app as app_module
+    monkeypatch.setattr(app_module, "_current_card_bytes", lambda guest: guest.name.encode())
+    ids = add_guests(5)
+    campaign = campaign_for(ids)
+
+    # A worker claims two rows, starts sending one, then dies.
+    token, claimed = outbox.claim(campaign, limit=2)
+    outbox.mark_sending(claimed[0][0], token)
+    assert outbox.recover(campaign, timeout=0) == {"released": 1, "unknown": 1}
+
+    job_id = job_queue.enqueue("send_cards_bulk", campaign=campaign)
+    job_queue.run_pending()
+
+    state = rows(campaign)
+    assert state[ids[0]][0] == "unknown"
+    assert all(state[g][0] == "sent" and state[g][2].startswith("wamid.") for g in ids[1:])
+    assert sorted(m["to"] for m in graph.messages) == [f"2557123456{i:02d}" for i in range(2, 6)]
+    result = job_queue.get(job_id)["result"]
+    assert (result["total"], result["sent"], result["failed"], result["remaining"]) == (5, 4, 1, 0)
+
+
+def test_retryable_failure_is_retried_by_the_campaign(auth_client, graph, monkeypatch):
+    import app as app_module
+    monkeypatch.setattr(app_module, "_current_card_bytes", lambda guest: b"card")
+    [guest_id] = add_guests(1)
+    campaign = campaign_for([guest_id])
+    graph.fail_next = sender.MAX_RETRIES + 1      # outlasts SendEngine's own retries once
+
+    job_queue.enqueue("send_cards_bulk", campaign=campaign)
+    job_queue.run_pending()
+
+    status, attempts, message_id = rows(campaign)[guest_id]
+    assert (status, attempts) == ("sent", 2) and message_id
+    assert len(graph.messages) == 1
@@ -0,0 +1,52 @@
+from io import BytesIO
+import numpy as np
+import qrcode
+from PIL import Image
+from qr import qr_matrix, qr_matrices, qr_png, qr_png_batch
+
+
+def legacy_png(data):
+    qr = qrcode.QRCode(version=1, error_correction=qrcode.constants.ERROR_CORRECT_H, box_size=10, border=4)
+    qr.add_data(data)
+    qr.make(fit=True)
+    buf = BytesIO()
+    qr.make_image(fill_color="black", back_color="white").save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def pixels(png):
+    return np.asarray(Image.open(BytesIO(png)).convert("L"))
+
+
+def test_fast_path_matches_pil_rendering():
+    for data in ("GUEST-0001", "GUEST-9999", "https://example.com/" + "x" * 60):
+        img = Image.open(BytesIO(qr_png(data)))
+        assert img.mode == "1"
+        assert np.array_equal(pixels(qr_png(data)), pixels(legacy_png(data)))
+
+
+def test_mask_choice_matches_qrcode_for_every_version_range():
+    # short guest ids (v2), longer payloads, and v7+ codes that carry version info
+    items = [f"GUEST-{i:04d}" for i in range(40)] + ["wedding-" * k for k in (3, 12, 30, 60)]
+    for data, matrix in zip(items, qr_matrices(items)):
+        qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_H, border=4)
+        qr.add_data(data)
+        qr.make(fit=True)
+        assert np.array_equal(matrix, np.asarray(qr.get_matrix(), dtype=bool)), data
+    assert qr_matrix(items[-1]).shape[0] > 7 * 4 + 17
+
+
+def test_target_size_is_exact_and_unblurred():
+    png = qr_png("GUEST-0001", size=175)
+    values = pixels(png)
+    assert values.shape == (175, 175)
+    assert set(np.unique(values)) <= {0, 255}
+    # whole-pixel boxes: 29 modules at 6 px, the remaining 1 px is quiet zone
+    assert values[:, 0].min() == 255
+
+
+def test_batch_keeps_order_across_versions():
+    items = ["GUEST-0001", "y" * 80, "GUEST-0002"]
+    batch = qr_png_batch(items, size=175)
+    assert batch == [qr_png(item, size=175) for item in items]
+    assert qr_matrix(items[1]).shape != qr_matrix(items[0]).shape
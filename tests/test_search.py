@@ -0,0 +1,63 @@
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from models import Base, Guest, get_db_session
+from search import find_guests, ensure_search_index
+
+
+def seed():
+    with get_db_session() as db:
+        db.add_all([
+            Guest(name="Joan Msuya", phone="0712 345 678", qr_code_id="Q1", visual_id=1),
+            Guest(name="Mr & Mrs Chuwa", phone="255754111222", qr_code_id="Q2", visual_id=2),
+            Guest(name="Anna Joanes", phone="0655000111", qr_code_id="Q3", visual_id=3),
+            Guest(name="Peter Chuwa", phone="+255 712 999 000", qr_code_id="Q4", visual_id=4),
+        ])
+        db.commit()
+
+
+def names(client, q, **params):
+    response = client.get('/search_guests', query_string=dict(params, q=q))
+    return [g["name"] for g in response.get_json()]
+
+
+def test_empty_query_returns_nothing(auth_client):
+    seed()
+    assert names(auth_client, "") == []
+
+
+def test_name_search_ranks_prefix_first(auth_client):
+    seed()
+    assert names(auth_client, "joan") == ["Joan Msuya", "Anna Joanes"]
+    assert len(names(auth_client, "chuwa", limit=1)) == 1
+    assert names(auth_client, "jo") == ["Joan Msuya"]   # too short for trigrams: prefix only
+
+
+def test_phone_search_uses_normalised_digits(auth_client):
+    seed()
+    assert names(auth_client, "0712-345") == ["Joan Msuya"]
+    assert names(auth_client, "712") == ["Joan Msuya", "Peter Chuwa"]
+
+
+def test_index_follows_inserts_updates_and_deletes(auth_client):
+    seed()
+    assert names(auth_client, "msuya") == ["Joan Msuya"]
+    with get_db_session() as db:
+        guest = db.query(Guest).filter_by(qr_code_id="Q1").one()
+        guest.name = "Joan Kileo"
+        db.add(Guest(name="Baraka Msuya", phone="0700000000", qr_code_id="Q5", visual_id=5))
+        db.query(Guest).filter_by(qr_code_id="Q4").delete()
+        db.commit()
+
+        assert [g.name for g in find_guests(db, "msuya")] == ["Baraka Msuya"]
+        assert [g.name for g in find_guests(db, "chuwa")] == ["Mr & Mrs Chuwa"]
+
+
+def test_falls_back_without_fts(monkeypatch):
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with sessionmaker(bind=engine)() as db:
+        db.add(Guest(name="Joan Msuya", phone="0712345678", qr_code_id="Q1", visual_id=1))
+        db.commit()
+        monkeypatch.setattr("search._SQLITE_SCHEMA", ["CREATE VIRTUAL TABLE x USING no_such_module(a)"])
+        assert ensure_search_index(db) is False
+        assert [g.name for g in find_guests(db, "msuya")] == ["Joan Msuya"]
@@ -0,0 +1,122 @@
+import pytest
+import requests
+import app as app_module
+import sender
+import whatsapp
+from jobs import job_queue
+from mock_graph import MockGraphServer
+from media_cache import media_cache
+from models import Guest, get_db_session
+from sender import AdaptiveConcurrency, SendEngine, TokenBucket, retry_delay
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def graph(shared_db, monkeypatch):
+    monkeypatch.setattr(sender, "BACKOFF_BASE", 0.01)
+    with MockGraphServer() as server:
+        monkeypatch.setattr(whatsapp, "WHATSAPP_API_BASE", server.base_url)
+        yield server
+
+
+def test_token_bucket_paces_to_rate_and_pauses():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=10, burst=2, clock=clock, sleep=clock.sleep)
+    for _ in range(12):
+        bucket.acquire()
+    assert clock.now == pytest.approx(1.0)       # 2 from the burst, then 10 a second
+
+    bucket.pause(5)
+    bucket.acquire()
+    assert clock.now == pytest.approx(6.1)
+
+
+def test_adaptive_concurrency_grows_then_halves_on_slowdown():
+    limiter = AdaptiveConcurrency(2, 16, window=4)
+    for latency in [0.1] * 12:
+        limiter.acquire()
+        limiter.release(latency)
+    assert limiter.limit == 5
+    for _ in range(4):
+        limiter.acquire()
+        limiter.release(0.5)
+    assert limiter.limit == 2
+    limiter.acquire()
+    limiter.release(throttled=True)
+    assert limiter.limit == 2
+
+
+def test_retry_delay_classifies_errors():
+    def http_error(status, body=b"{}", headers=None):
+        response = requests.Response()
+        response.status_code, response._content = status, body
+        response.headers.update(headers or {})
+        return requests.HTTPError(response=response)
+
+    assert retry_delay(http_error(429, headers={"Retry-After": "3"}), 0) == (3.0, True)
+    assert retry_delay(http_error(400, b'{"error": {"code": 130429}}'), 0)[1] is True
+    assert retry_delay(http_error(503), 0)[0] > 0
+    assert retry_delay(http_error(400, b'{"error": {"code": 131053}}'), 0) == (None, False)
+    assert retry_delay(ValueError("no card"), 0) == (None, False)
+
+
+def test_engine_retries_server_errors_against_mock_graph(graph):
+    graph.fail_next = 3
+    engine = SendEngine(lambda n: whatsapp.send_guest_card(f"2557000000{n:02d}", "Guest", n, "single", b"png", "c.png"),
+                        rate=200, workers=4)
+    results = list(engine.run((n, n) for n in range(20)))
+    assert sorted(key for key, _, error in results if error is None) == list(range(20))
+    assert len(graph.messages) == 20
+    assert engine.stats()["retries"] == 3
+
+
+def test_bulk_send_job_records_results_in_batches(auth_client, graph, monkeypatch):
+    for name, phone in (("Joan", "0712345678"), ("Baraka", "0712345679"), ("Nophone", "")):
+        with get_db_session() as db:
+            n = db.query(Guest).count() + 1
+            db.add(Guest(name=name, phone=phone, qr_code_id=f"GUEST-{n:04d}", qr_code_url="x", visual_id=n))
+            db.commit()
+    monkeypatch.setattr(app_module, "_current_card_bytes",
+                        lambda guest: None if guest.name == "Baraka" else b"png")
+
+    job_id = auth_client.post('/send_cards_bulk', json={}).get_json()["job_id"]
+    job_queue.run_pending()
+
+    result = auth_client.get(f'/jobs/{job_id}').get_json()["result"]
+    assert (result["total"], result["sent"], result["failed"]) == (3, 1, 2)
+    assert graph.messages[0]["to"] == "255712345678"
+    with get_db_session() as db:
+        rows = {g.name: (g.whatsapp_sent, g.whatsapp_error) for g in db.query(Guest)}
+    assert rows["Joan"] == (True, None)
+    assert rows["Baraka"] == (False, "Could not retrieve or generate card image.")
+    assert rows["Nophone"][0] is False
+
+
+def test_whatsapp_calls_share_one_keep_alive_connection(graph):
+    for n in range(5):
+        whatsapp.send_guest_card(f"2557000000{n:02d}", "Guest", n, "single", b"png", "c.png")
+    assert len(graph.messages) == 5
+    assert graph.connections == 1
+
+
+def test_resend_reuses_cached_media_id(graph):
+    for to in ("255700000001", "255700000002"):
+        whatsapp.send_guest_card(to, "Guest", 1, "single", b"same card", "c.png")
+    whatsapp.send_guest_card("255700000003", "Guest", 2, "single", b"other card", "d.png")
+    assert len(graph.media) == 2 and len(graph.messages) == 3
+    with get_db_session() as db:
+        assert media_cache.counts(db) == {"hits": 1, "misses": 2}
+
+    graph.media.clear()          # Meta has dropped the media: re-upload once and send
+    whatsapp.send_guest_card("255700000004", "Guest", 1, "single", b"same card", "c.png")
+    assert len(graph.media) == 1 and len(graph.messages) == 4
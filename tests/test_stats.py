@@ -0,0 +1,36 @@
+from models import Guest
+from stats import guest_stats
+
+
+def test_guest_stats_single_pass(db_session):
+    db_session.add_all([
+        Guest(name="A", phone="1", qr_code_id="Q1", card_type="single", group_size=1,
+              checked_in_count=1, has_entered=True, whatsapp_sent=True),
+        Guest(name="B", phone="2", qr_code_id="Q2", card_type="double", group_size=2,
+              checked_in_count=1, whatsapp_sent=False, whatsapp_error="HTTP 400"),
+        Guest(name="C", phone="3", qr_code_id="Q3", card_type=" Family ", group_size=5,
+              checked_in_count=0, whatsapp_sent=None),
+        Guest(name="D", phone="4", qr_code_id="Q4", card_type="family", group_size=3,
+              checked_in_count=3, has_entered=True, whatsapp_sent=True, whatsapp_error="old"),
+    ])
+    db_session.commit()
+
+    assert guest_stats(db_session) == {
+        "total_guests": 4,
+        "single_cards": 1,
+        "double_cards": 1,
+        "family_cards": 2,
+        "total_family_allowed": 8,
+        "entered_guests": 2,
+        "not_entered_guests": 2,
+        "checked_in_people": 5,
+        "whatsapp_sent": 2,
+        "whatsapp_failed": 1,
+        "whatsapp_pending": 2,
+    }
+
+
+def test_guest_stats_empty_table(db_session):
+    stats = guest_stats(db_session)
+    assert stats["total_guests"] == 0
+    assert stats["total_family_allowed"] == 0
@@ -0,0 +1,110 @@
+import pytest
+from unittest.mock import MagicMock
+import app as app_module
+from jobs import job_queue
+from models import Guest, get_db_session
+from storage import LocalStorage, SupabaseStorage
+
+
+@pytest.fixture
+def store(tmp_path):
+    return LocalStorage(str(tmp_path), workers=3)
+
+
+def test_upload_many_and_download_many_keep_input_order(store):
+    items = [(f"GUEST-{i:04d}.png", f"png-{i}".encode()) for i in range(20)]
+    uploaded = list(store.upload_many("cards", items))
+    assert [path for path, _, _ in uploaded] == [path for path, _ in items]
+    assert all(error is None for _, _, error in uploaded)
+    assert uploaded[0][1] == "/local_storage/cards/GUEST-0000.png"
+
+    paths = [path for path, _ in items] + ["missing.png"]
+    downloaded = list(store.download_many("cards", paths))
+    assert [(p, d) for p, d, _ in downloaded[:-1]] == items
+    path, data, error = downloaded[-1]
+    assert path == "missing.png" and data is None and isinstance(error, FileNotFoundError)
+
+
+def test_delete_many_reports_each_path(store):
+    for name in ("a.png", "b.png", "c.png"):
+        store.upload("qr", name, b"x")
+    report = store.delete_many("qr", ["a.png", "b.png", "gone.png", "a.png"], batch=2)
+    assert sorted(report["deleted"]) == ["a.png", "b.png"]
+    assert report["missing"] == ["gone.png"]
+    assert report["failed"] == []
+    assert store.download("qr", "c.png") == b"x"
+
+
+def test_delete_many_marks_failed_batches(store, monkeypatch):
+    def delete(bucket, paths):
+        if "bad.png" in paths:
+            raise RuntimeError("503")
+        return list(paths)
+    monkeypatch.setattr(store, "delete", delete)
+    report = store.delete_many("qr", ["ok.png", "bad.png", "fine.png"], batch=1)
+    assert sorted(report["deleted"]) == ["fine.png", "ok.png"]
+    assert report["failed"] == [{"path": "bad.png", "error": "503"}]
+
+
+def test_local_storage_rejects_paths_outside_bucket(store):
+    with pytest.raises(ValueError):
+        store.upload("cards", "../escape.png", b"x")
+
+
+def test_supabase_storage_reuses_one_session():
+    store = SupabaseStorage("https://proj.supabase.co/", "key", workers=4)
+    store.session = MagicMock()
+    store.session.delete.return_value.json.return_value = [{"name": "a b.png"}]
+
+    url = store.upload("cards", "a b.png", b"png")
+    assert url == "https://proj.supabase.co/storage/v1/object/public/cards/a%20b.png"
+    args, kwargs = store.session.post.call_args
+    assert args[0] == "https://proj.supabase.co/storage/v1/object/cards/a%20b.png"
+    assert kwargs["headers"]["x-upsert"] == "true"
+
+    report = store.delete_many("cards", ["a b.png", "c.png"])
+    assert report["deleted"] == ["a b.png"] and report["missing"] == ["c.png"]
+    assert store.session.delete.call_args.kwargs["json"] == {"prefixes": ["a b.png", "c.png"]}
+
+
+def test_clear_all_data_returns_before_storage_purge(auth_client, local_storage, monkeypatch):
+    for name, phone in (("Joan", "0712345678"), ("Baraka", "0712345679")):
+        auth_client.post('/add_guest', data={"name": name, "phone": phone, "card_type": "single"})
+    for card in ("GUEST-0001-JOAN.png", "GUEST-0002-BARAKA.png"):
+        local_storage.upload(app_module.CARDS_BUCKET, card, b"png")
+
+    assert auth_client.get('/clear_all_data').status_code == 302
+    with get_db_session() as db:
+        assert db.query(Guest).count() == 0
+    assert local_storage.download(app_module.CARDS_BUCKET, "GUEST-0001-JOAN.png") == b"png"
+
+    # Joan is re-added before the purge runs: her freshly uploaded files must survive it
+    auth_client.post('/add_guest', data={"name": "Joan", "phone": "0712345678", "card_type": "single"})
+    real_delete = local_storage.delete
+
+    def delete(bucket, paths):
+        if bucket == app_module.QR_BUCKET:
+            raise OSError("503")
+        return real_delete(bucket, paths)
+    monkeypatch.setattr(local_storage, "delete", delete)
+    job_queue.run_pending()
+
+    job = auth_client.get('/jobs').get_json()["jobs"][0]
+    assert job["kind"] == "purge_files" and job["status"] == "done"
+    assert job["result"]["deleted"] == 1
+    assert job["result"]["failed"] == [
+        {"bucket": app_module.QR_BUCKET, "path": "GUEST-0002-BARAKA.png", "error": "503"}]
+    assert local_storage.download(app_module.CARDS_BUCKET, "GUEST-0001-JOAN.png") == b"png"
+    with pytest.raises(FileNotFoundError):
+        local_storage.download(app_module.CARDS_BUCKET, "GUEST-0002-BARAKA.png")
+
+
+def test_guest_without_a_number_can_be_cleared(auth_client, local_storage):
+    with get_db_session() as db:
+        db.add(Guest(name="No Number", phone="0712345670", qr_code_id="GUEST-X", visual_id=None))
+        db.commit()
+    assert auth_client.get('/clear_all_data').status_code == 302
+    job_queue.run_pending()
+    with get_db_session() as db:
+        assert db.query(Guest).count() == 0
+    assert auth_client.get('/jobs').get_json()["jobs"][0]["status"] == "done"
@@ -0,0 +1,113 @@
+import json
+import pytest
+import app as app_module
+from models import Guest, MessageStatus, SendOutbox, get_db_session
+from webhook_replay import sign, synthetic_bodies
+from webhooks import delivery_counts, parse_statuses, status_buffer, verify_signature
+
+SECRET = "test-app-secret"
+
+
+@pytest.fixture(autouse=True)
+def empty_buffer():
+    # The buffer is process-wide; never let one test's statuses reach another's database.
+    with status_buffer._lock:
+        status_buffer._pending.clear()
+    yield
+
+
+def callback(wamid, status, timestamp, **extra):
+    return {"object": "whatsapp_business_account", "entry": [{"id": "1", "changes": [{"field": "messages", "value": {
+        "statuses": [{"id": wamid, "status": status, "timestamp": str(timestamp), "recipient_id": "255700000001",
+                      **extra}]}}]}]}
+
+
+def post(client, payload, secret=SECRET):
+    body = json.dumps(payload).encode()
+    return client.post("/whatsapp/webhook", data=body, content_type="application/json",
+                       headers={"X-Hub-Signature-256": sign(body, secret)})
+
+
+def test_verify_signature():
+    body = b'{"entry": []}'
+    assert verify_signature(body, sign(body, SECRET), SECRET)
+    assert not verify_signature(body + b" ", sign(body, SECRET), SECRET)
+    assert not verify_signature(body, sign(body, "other"), SECRET)
+    assert not verify_signature(body, None, SECRET)
+    assert not verify_signature(body, sign(body, SECRET), None)
+
+
+def test_subscription_handshake(client, monkeypatch):
+    monkeypatch.setattr(app_module, "WHATSAPP_VERIFY_TOKEN", "tok")
+    ok = client.get("/whatsapp/webhook?hub.mode=subscribe&hub.verify_token=tok&hub.challenge=42")
+    assert ok.status_code == 200 and ok.data == b"42"
+    assert client.get("/whatsapp/webhook?hub.mode=subscribe&hub.verify_token=bad&hub.challenge=42").status_code == 403
+
+
+def test_bad_signature_is_rejected_and_not_buffered(client, monkeypatch):
+    monkeypatch.setattr(app_module, "WHATSAPP_APP_SECRET", SECRET)
+    assert post(client, callback("wamid.x", "read", 1), secret="wrong").status_code == 403
+    assert status_buffer.pending() == 0
+
+
+def test_burst_collapses_into_one_row_per_message(client, monkeypatch):
+    monkeypatch.setattr(app_module, "WHATSAPP_APP_SECRET", SECRET)
+    # Out of order, with duplicates: the row must still end up "read".
+    for status, ts in [("read", 1_700_000_030), ("sent", 1_700_000_010), ("delivered", 1_700_000_020),
+                       ("delivered", 1_700_000_025), ("sent", 1_700_000_010)]:
+        assert post(client, callback("wamid.a", status, ts), secret=SECRET).status_code == 200
+    assert post(client, callback("wamid.b", "sent", 1_700_000_000)).status_code == 200
+
+    assert status_buffer.pending() == 6
+    assert status_buffer.flush() == 2
+    # A late "delivered" never moves a read message back down.
+    status_buffer.add(parse_statuses(callback("wamid.a", "delivered", 1_700_000_040)))
+    status_buffer.flush()
+
+    with get_db_session() as db:
+        rows = {r.message_id: r for r in db.query(MessageStatus)}
+        assert set(rows) == {"wamid.a", "wamid.b"}
+        a = rows["wamid.a"]
+        assert a.status == "read"
+        assert a.sent_at.timestamp() == 1_700_000_010
+        assert a.delivered_at.timestamp() == 1_700_000_020
+        assert a.read_at.timestamp() == 1_700_000_030
+        assert rows["wamid.b"].status == "sent"
+
+
+def test_failed_status_keeps_error(client):
+    status_buffer.add(parse_statuses(callback("wamid.f", "failed", 1_700_000_000,
+                                              errors=[{"code": 131026, "title": "Message undeliverable"}])))
+    status_buffer.flush()
+    with get_db_session() as db:
+        row = db.get(MessageStatus, "wamid.f")
+        assert row.status == "failed" and row.error == "Message undeliverable"
+
+
+def test_delivery_counts_follow_outbox_messages(client):
+    with get_db_session() as db:
+        db.add_all([Guest(name="A", qr_code_id="GUEST-0001", visual_id=1),
+                    Guest(name="B", qr_code_id="GUEST-0002", visual_id=2)])
+        db.flush()
+        ids = [g.id for g in db.query(Guest).order_by(Guest.id)]
+        db.add_all([SendOutbox(campaign_id="c", guest_id=ids[0], status="sent", message_id="wamid.1"),
+                    SendOutbox(campaign_id="c", guest_id=ids[1], status="sent", message_id="wamid.2")])
+        db.commit()
+    status_buffer.add(parse_statuses(callback("wamid.1", "read", 1_700_000_000)))
+    status_buffer.add(parse_statuses(callback("wamid.2", "delivered", 1_700_000_000)))
+    status_buffer.add(parse_statuses(callback("wamid.unrelated", "read", 1_700_000_000)))
+    status_buffer.flush()
+    with get_db_session() as db:
+        assert delivery_counts(db) == {"delivered": 2, "read": 1}
+
+
+def test_synthetic_replay_bodies_are_accepted(client, monkeypatch):
+    monkeypatch.setattr(app_module, "WHATSAPP_APP_SECRET", SECRET)
+    bodies = synthetic_bodies(20)
+    for body in bodies:
+        response = client.post("/whatsapp/webhook", data=body, content_type="application/json",
+                               headers={"X-Hub-Signature-256": sign(body, SECRET)})
+        assert response.status_code == 200
+    assert status_buffer.flush() == 20
+    with get_db_session() as db:
+        assert {r.status for r in db.query(MessageStatus)} == {"read"}
@@ -0,0 +1,36 @@
+import io
+import zipfile
+import app as app_module
+from models import Guest, get_db_session
+from zipstream import stream_zip
+
+
+def test_stream_zip_yields_per_entry_and_stores_uncompressed():
+    entries = [(f"GUEST-{i:04d}.png", bytes([i]) * 1000) for i in range(3)]
+    pieces = list(stream_zip(iter(entries)))
+    assert len(pieces) == 4                         # one per entry, then the central directory
+    with zipfile.ZipFile(io.BytesIO(b"".join(pieces))) as zf:
+        assert zf.testzip() is None
+        assert [(i.filename, i.compress_type) for i in zf.infolist()] == [
+            (name, zipfile.ZIP_STORED) for name, _ in entries]
+        assert zf.read("GUEST-0002.png") == entries[2][1]
+
+
+def test_download_all_cards_streams_and_lists_missing(auth_client, local_storage):
+    for name, phone in (("Joan", "0712345678"), ("Baraka", "0712345679")):
+        auth_client.post('/add_guest', data={"name": name, "phone": phone, "card_type": "single"})
+    local_storage.upload(app_module.CARDS_BUCKET, "GUEST-0001-JOAN.png", b"png")
+    with get_db_session() as db:
+        db.add(Guest(name="No Number", phone="0712345670", qr_code_id="GUEST-X", visual_id=None))
+        db.commit()
+
+    res = auth_client.get('/download_all_cards')
+    assert res.status_code == 200 and res.is_streamed
+    assert res.headers["Content-Disposition"] == "attachment; filename=invitation_cards.zip"
+    with zipfile.ZipFile(io.BytesIO(res.get_data())) as zf:
+        assert zf.namelist() == ["GUEST-0001-JOAN.png", "MISSING.txt"]
+        assert zf.read("MISSING.txt") == b"GUEST-0002-BARAKA.png\n"
+
+
+def test_zip_without_guests_redirects(auth_client, local_storage):
+    assert auth_client.get('/zip_qr_codes_web').status_code == 302
@@ -0,0 +1,100 @@
+# webhook_replay.py — replay WhatsApp status callbacks against /whatsapp/webhook for load testing
+#
+#   WHATSAPP_WEBHOOK_RECORD=callbacks.jsonl gunicorn app:app       # record real callbacks
+#   python webhook_replay.py http://127.0.0.1:8000 --file callbacks.jsonl --secret $WHATSAPP_APP_SECRET
+#   python webhook_replay.py http://127.0.0.1:8000 --synthetic 5000 --secret s3cret
+import argparse
+import hashlib
+import hmac
+import json
+import random
+import statistics
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+
+def synthetic_bodies(messages: int, shuffle: bool = True) -> list:
+    """sent, delivered and read callbacks for `messages` made-up message ids, optionally out of order."""
+    now = int(time.time())
+    bodies = []
+    for i in range(messages):
+        wamid = f"wamid.replay{uuid.uuid4().hex}"
+        for step, status in enumerate(("sent", "delivered", "read")):
+            bodies.append(json.dumps({
+                "object": "whatsapp_business_account",
+                "entry": [{"id": "replay", "changes": [{"field": "messages", "value": {
+                    "messaging_product": "whatsapp",
+                    "statuses": [{"id": wamid, "status": status, "timestamp": str(now + step),
+                                  "recipient_id": f"2557{i:08d}"}],
+                }}]}],
+            }).encode())
+    if shuffle:
+        random.shuffle(bodies)
+    return bodies
+
+
+def recorded_bodies(path: str) -> list:
+    with open(path, "rb") as f:
+        return [line.rstrip(b"\n") for line in f if line.strip()]
+
+
+def sign(body: bytes, secret: str) -> str:
+    return "sha256=" + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+def replay(url: str, bodies: list, secret: str, concurrency: int = 16) -> dict:
+    """POST every body, signed, from `concurrency` threads. Returns counts and latency figures."""
+    local = threading.local()
+    latencies, failures = [], []
+    lock = threading.Lock()
+
+    def post(body):
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        start = time.perf_counter()
+        try:
+            status = local.session.post(url, data=body, timeout=10, headers={
+                "Content-Type": "application/json", "X-Hub-Signature-256": sign(body, secret)}).status_code
+        except requests.RequestException as e:
+            status = str(e)
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            if status != 200:
+                failures.append(status)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(post, bodies))
+    total = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "requests": len(bodies),
+        "failed": len(failures),
+        "seconds": round(total, 2),
+        "per_second": round(len(bodies) / total, 1) if total else 0.0,
+        "p50_ms": round(statistics.median(latencies) * 1000, 1) if latencies else 0.0,
+        "p99_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 1) if latencies else 0.0,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay WhatsApp status callbacks against the webhook")
+    parser.add_argument("base_url", help="app address, e.g. http://127.0.0.1:8000")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--file", help="JSONL of raw callback bodies (see WHATSAPP_WEBHOOK_RECORD)")
+    source.add_argument("--synthetic", type=int, metavar="N", help="generate sent/delivered/read for N messages")
+    parser.add_argument("--secret", required=True, help="WHATSAPP_APP_SECRET of the app under test")
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    bodies = recorded_bodies(args.file) if args.file else synthetic_bodies(args.synthetic)
+    result = replay(args.base_url.rstrip("/") + "/whatsapp/webhook", bodies, args.secret, args.concurrency)
+    print(f"{result['requests']} callbacks in {result['seconds']} s: {result['per_second']} req/s, "
+          f"p50 {result['p50_ms']} ms, p99 {result['p99_ms']} ms, {result['failed']} failed")
+    sys.exit(1 if result["failed"] else 0)
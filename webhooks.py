@@ -0,0 +1,186 @@
+# webhooks.py — WhatsApp delivery-status callbacks: signature check, in-memory buffer, batched writes
+import hashlib
+import hmac
+import logging
+import threading
+from datetime import datetime
+
+from sqlalchemy import bindparam, distinct, func, select, update
+from sqlalchemy.exc import IntegrityError
+
+from models import MessageStatus, SendOutbox, get_db_session
+
+FLUSH_SIZE = 500             # buffered statuses that trigger an early flush
+FLUSH_INTERVAL = 1.0         # seconds between flushes otherwise
+IN_CHUNK = 500
+
+# Callbacks can arrive out of order; a message never moves back down this scale.
+STATUS_RANK = {"sent": 1, "delivered": 2, "read": 3, "failed": 4}
+_STAMP = {"sent": "sent_at", "delivered": "delivered_at", "read": "read_at", "failed": "failed_at"}
+
+
+def verify_signature(body: bytes, header: str | None, app_secret: str | None) -> bool:
+    """Check Meta's X-Hub-Signature-256 header (sha256=HMAC of the raw body with the app secret)."""
+    if not app_secret or not header or not header.startswith("sha256="):
+        return False
+    expected = hmac.new(app_secret.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, header[len("sha256="):])
+
+
+def parse_statuses(payload: dict) -> list:
+    """Flatten entry[].changes[].value.statuses[] into {message_id, status, at, recipient, error} dicts."""
+    found = []
+    for entry in payload.get("entry") or []:
+        for change in entry.get("changes") or []:
+            for st in (change.get("value") or {}).get("statuses") or []:
+                if st.get("status") not in STATUS_RANK or not st.get("id"):
+                    continue
+                try:
+                    at = datetime.fromtimestamp(int(st.get("timestamp")))
+                except (TypeError, ValueError):
+                    at = datetime.now()
+                errors = st.get("errors") or [{}]
+                found.append({
+                    "message_id": st["id"], "status": st["status"], "at": at,
+                    "recipient": st.get("recipient_id"),
+                    "error": (errors[0].get("title") or errors[0].get("message") or None) if st.get("errors") else None,
+                })
+    return found
+
+
+def _state(status: dict) -> dict:
+    """One parsed callback as a message state."""
+    return {"status": status["status"], _STAMP[status["status"]]: status["at"],
+            "recipient": status.get("recipient"), "error": status.get("error")}
+
+
+def _combine(a: dict, b: dict) -> dict:
+    """Merge two states of one message: the highest status wins and each timestamp keeps its earliest."""
+    merged = {"status": max(a.get("status"), b.get("status"), key=lambda s: STATUS_RANK.get(s, 0))}
+    for stamp in _STAMP.values():
+        times = [t for t in (a.get(stamp), b.get(stamp)) if t is not None]
+        merged[stamp] = min(times) if times else None
+    if merged["read_at"] and not merged["delivered_at"]:
+        merged["delivered_at"] = merged["read_at"]      # Meta may skip "delivered" once a message is read
+    merged["recipient"] = b.get("recipient") or a.get("recipient")
+    merged["error"] = b.get("error") or a.get("error")
+    return merged
+
+
+class StatusBuffer:
+    """
+    Collects parsed callbacks in memory and writes them in batches from one
+    background thread per process: every FLUSH_INTERVAL seconds, or as soon as
+    FLUSH_SIZE are waiting. A burst of callbacks for the same message
+    collapses into a single row write.
+    """
+
+    def __init__(self, flush_size: int = FLUSH_SIZE, interval: float = FLUSH_INTERVAL):
+        self.flush_size = flush_size
+        self.interval = interval
+        self.autostart = True
+        self._pending = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def add(self, statuses: list):
+        if not statuses:
+            return
+        with self._lock:
+            self._pending.extend(statuses)
+            full = len(self._pending) >= self.flush_size
+        self._ensure_started()
+        if full:
+            self._wake.set()
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self) -> int:
+        """Write everything buffered so far; returns the number of messages updated."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+            merged = {}
+            for status in batch:
+                merged[status["message_id"]] = _combine(merged.get(status["message_id"], {}), _state(status))
+            try:
+                self._write(merged)
+            except Exception as e:
+                logging.error(f"Could not store {len(batch)} WhatsApp statuses, will retry: {e}")
+                with self._lock:
+                    self._pending[:0] = batch
+                return 0
+            return len(merged)
+
+    def _write(self, merged: dict):
+        ids = list(merged)
+        for attempt in range(2):
+            try:
+                with get_db_session() as db:
+                    for i in range(0, len(ids), IN_CHUNK):
+                        self._write_chunk(db, {mid: merged[mid] for mid in ids[i:i + IN_CHUNK]})
+                    db.commit()
+                return
+            except IntegrityError:
+                if attempt:
+                    raise
+                # Another worker inserted one of these messages first; merge into its row instead.
+
+    def _write_chunk(self, db, chunk: dict):
+        columns = ("status", "recipient", "sent_at", "delivered_at", "read_at", "failed_at", "error")
+        existing = {row.message_id: {c: getattr(row, c) for c in columns}
+                    for row in db.execute(select(MessageStatus).where(MessageStatus.message_id.in_(chunk))).scalars()}
+        now = datetime.now()
+        updates, inserts = [], []
+        for message_id, state in chunk.items():
+            if message_id in existing:
+                state = _combine(existing[message_id], state)
+                updates.append({"_id": message_id, "updated_at": now, **{c: state[c] for c in columns}})
+            else:
+                inserts.append({"message_id": message_id, "updated_at": now, **{c: state[c] for c in columns}})
+        if inserts:
+            db.execute(MessageStatus.__table__.insert(), inserts)
+        if updates:
+            table = MessageStatus.__table__
+            db.connection().execute(
+                update(table).where(table.c.message_id == bindparam("_id"))
+                .values(**{c: bindparam(c) for c in columns + ("updated_at",)}),
+                updates,
+            )
+
+    def _ensure_started(self):
+        if not self.autostart:
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="status-buffer", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logging.warning(f"Status buffer flush error: {e}")
+
+
+def delivery_counts(db) -> dict:
+    """Guests whose bulk-sent card Meta reported as delivered / read."""
+    def guests_with(column):
+        return db.execute(
+            select(func.count(distinct(SendOutbox.guest_id)))
+            .join(MessageStatus, MessageStatus.message_id == SendOutbox.message_id)
+            .where(column.isnot(None))
+        ).scalar() or 0
+    return {"delivered": guests_with(MessageStatus.delivered_at), "read": guests_with(MessageStatus.read_at)}
+
+
+status_buffer = StatusBuffer()
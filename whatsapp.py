@@ -1,12 +1,57 @@
 # whatsapp.py — Meta Cloud API helper for sending guest cards
 import os
+import mimetypes
 import requests
 import logging
+import threading
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from media_cache import content_hash, media_cache
 
 WHATSAPP_ACCESS_TOKEN = os.getenv("WHATSAPP_ACCESS_TOKEN")
 WHATSAPP_PHONE_NUMBER_ID = os.getenv("WHATSAPP_PHONE_NUMBER_ID")
 WHATSAPP_API_VERSION = "v19.0"
-WHATSAPP_API_BASE = f"https://graph.facebook.com/{WHATSAPP_API_VERSION}"
+WHATSAPP_API_BASE = os.getenv("WHATSAPP_API_BASE", f"https://graph.facebook.com/{WHATSAPP_API_VERSION}")
+
+POOL_SIZE = int(os.getenv("WHATSAPP_SEND_WORKERS", "16"))   # one kept-alive connection per bulk-send worker
+CONNECT_TIMEOUT = 5
+MEDIA_TIMEOUT = 60       # read timeout for the card upload
+MESSAGE_TIMEOUT = 30
+
+# Graph error codes for a media id Meta no longer knows (expired or purged)
+STALE_MEDIA_CODES = {100, 131052, 131053}
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """
+    The process-wide keep-alive session, shared by every thread. Only
+    connection failures are retried here: nothing reached the server, so a
+    POST is safe to repeat. HTTP errors (429/5xx) are left to the caller,
+    because a retried message POST could reach the guest twice.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            retry = Retry(total=3, connect=3, read=0, status=0, other=0, backoff_factor=0.5,
+                          allowed_methods=None, raise_on_status=False)
+            adapter = HTTPAdapter(pool_connections=2, pool_maxsize=POOL_SIZE, max_retries=retry)
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+        return _session
+
+
+def graph_error_code(response) -> int | None:
+    """The `error.code` of a Graph API error response, if it has one."""
+    try:
+        return (response.json().get("error") or {}).get("code")
+    except ValueError:
+        return None
 
 
 def _headers():
@@ -28,7 +73,8 @@ def upload_media(image_bytes: bytes, filename: str, mime_type: str = "image/png"
         "messaging_product": "whatsapp",
         "type": mime_type,
     }
-    response = requests.post(url, headers=_headers(), files=files, data=data)
+    response = get_session().post(url, headers=_headers(), files=files, data=data,
+                                  timeout=(CONNECT_TIMEOUT, MEDIA_TIMEOUT))
     response.raise_for_status()
     result = response.json()
     media_id = result.get("id")
@@ -55,7 +101,8 @@ def send_image_message(to: str, media_id: str, caption: str) -> dict:
             "caption": caption,
         },
     }
-    response = requests.post(url, headers=_headers(), json=payload)
+    response = get_session().post(url, headers=_headers(), json=payload,
+                                  timeout=(CONNECT_TIMEOUT, MESSAGE_TIMEOUT))
     response.raise_for_status()
     return response.json()
 
@@ -63,10 +110,16 @@ def send_image_message(to: str, media_id: str, caption: str) -> dict:
 def send_guest_card(to: str, guest_name: str, visual_id: int,
                     card_type: str, image_bytes: bytes, filename: str) -> dict:
     """
-    Full flow: upload image then send to guest.
+    Full flow: upload image (unless Meta already holds these exact bytes) then send to guest.
     Returns the API response dict.
     """
-    media_id = upload_media(image_bytes, filename)
+    mime_type = mimetypes.guess_type(filename)[0] or "image/png"
+    digest = content_hash(image_bytes)
+    media_id = media_cache.lookup(digest)
+    cached = media_id is not None
+    if not cached:
+        media_id = upload_media(image_bytes, filename, mime_type)
+        media_cache.store(digest, media_id)
 
     card_type_label = (card_type or "single").title()
     caption = (
@@ -78,4 +131,12 @@ def send_guest_card(to: str, guest_name: str, visual_id: int,
         f"We look forward to celebrating with you!"
     )
 
-    return send_image_message(to, media_id, caption)
\ No newline at end of file
+    try:
+        return send_image_message(to, media_id, caption)
+    except requests.HTTPError as e:
+        if not cached or e.response is None or graph_error_code(e.response) not in STALE_MEDIA_CODES:
+            raise
+        media_cache.forget(digest)
+        media_id = upload_media(image_bytes, filename, mime_type)
+        media_cache.store(digest, media_id)
+        return send_image_message(to, media_id, caption)
\ No newline at end of file
@@ -0,0 +1,38 @@
+# zipstream.py — ZIP archives produced entry by entry, for streaming HTTP responses
+import time
+import zipfile
+
+
+class _Sink:
+    """Write-only file object with no tell(), so zipfile writes data descriptors instead of seeking back."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def stream_zip(entries, compression: int = zipfile.ZIP_STORED):
+    """
+    entries: iterable of (name, bytes), consumed lazily.
+    Yields the archive in pieces as each entry is written, so only one entry is
+    held at a time. PNGs are already deflated, hence ZIP_STORED by default.
+    """
+    sink = _Sink()
+    with zipfile.ZipFile(sink, "w", compression) as zf:
+        for name, data in entries:
+            info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+            info.compress_type = compression
+            zf.writestr(info, data)
+            yield sink.drain()
+    yield sink.drain()      # central directory